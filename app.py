@@ -1,141 +1,155 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from flask_socketio import SocketIO, emit, join_room
 import os
 import cv2
 import tempfile
 import shutil
+import uuid
+from contextlib import closing
 
 from detection import Detector
+from inference import configure_threads
+from depth_estimation import DepthEstimator
+from backends import model_paths
+from model_registry import ModelRegistry
 from tracking import Tracker
 from events import EventDetector
 from reporting import Reporter
-from visualization_manager import VisualizationManager
+from visualization_manager import VisualizationManager, RenderSink
+from pipeline import StagedPipeline
+from cadence import AdaptiveCadence
+from jobs import JobManager, JobQueueFull
+from metrics import METRICS
 import numpy as np
 
 app = Flask(__name__)
 CORS(app)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
 
 # --- Configuration ---
 BASE_PATH       = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER   = os.path.join(BASE_PATH, 'videos')
+UPLOAD_FOLDER   = os.path.join(BASE_PATH, 'uploads')  # each upload is deleted when its job ends
 EVIDENCE_FOLDER = os.path.join(BASE_PATH, 'evidence')
 REPORT_FOLDER   = os.path.join(BASE_PATH, 'reports')
+BATCH_SIZE      = 8  # frames per batched inference call for uploaded videos
+QUEUE_SIZE      = 4  # batches buffered between pipeline stages
+ANNOTATED_VIDEO = False  # write an annotated clip of each upload to REPORT_FOLDER
+RENDER_EVENT_WINDOW = 30  # frames drawn before and after each event in the annotated clip
+MAX_JOBS        = 2  # uploads processed concurrently, each with its own YOLO models
+MAX_PENDING_JOBS = 8  # uploads allowed to wait for a worker before returning 503
+COMPRESS_EVIDENCE_FRAMES = True  # keep each job's recent-frame ring as JPEG bytes
+TRASH_CASCADE   = False  # run the trash model only on crops around detected vehicles (approximate)
+CASCADE_FULL_INTERVAL = 30  # trash cascade: still run it on the full frame every Nth frame
+CASCADE_MARGIN  = 150  # trash cascade: pixels around each vehicle to search (scale up for 4K footage)
+INFERENCE_BACKEND = "torch"  # "onnx" / "onnx-int8": exported models (python backends.py) on ONNX Runtime
+DEPTH_INTERVAL  = 1  # run MiDaS every Nth frame (or on scene change) and reuse the map in between
+DEPTH_RUNNING_NORM = False  # normalize depth with a running min/max so values are comparable over time
+DETECTION_INTERVAL = 1  # run the models at least every Nth frame, more often on motion or events (1 = every frame)
+MODEL_REGISTRY  = os.path.join(BASE_PATH, 'model', 'registry')  # versioned local models (python model_registry.py); model paths below if absent
+WARM_UP_MODELS  = True  # load and warm up one worker's models in the background at startup
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(EVIDENCE_FOLDER, exist_ok=True)
 os.makedirs(REPORT_FOLDER, exist_ok=True)
 
 # --- Initialize your pipeline components ---
-detector      = Detector(os.path.join(BASE_PATH, "model/yolov8m.pt"),
-                         os.path.join(BASE_PATH, "model/100epochv2.pt"))
-tracker       = Tracker(distance_threshold=150, max_inactive=30)
-event_detector= EventDetector(temporal_window=10,
-                              min_holding=15,
-                              min_disposal=20,
-                              min_throw=5,
-                              depth_threshold=50)
-reporter      = Reporter(EVIDENCE_FOLDER, REPORT_FOLDER, "Location1")
-vis_manager   = VisualizationManager(detector)
-def compute_potential_areas(flow, tracking_data):
-    """Identify potential disposal areas based on optical flow near vehicles."""
-    # Check if flow is None
-    if flow is None:
-        return []  # Return an empty list if no flow data is available
-    
-    potential_areas = []
-    for tid, track in tracking_data.items():
-        if track['type'] == 'vehicle':
-            x1, y1, x2, y2 = map(int, track['bbox'])
-            # Expand ROI by 50%
-            w, h = x2 - x1, y2 - y1
-            roi_x1 = max(0, x1 - w // 4)
-            roi_y1 = max(0, y1 - h // 4)
-            roi_x2 = min(flow.shape[1], x2 + w // 4)
-            roi_y2 = min(flow.shape[0], y2 + h // 4)
-            # Extract flow in ROI
-            roi_flow = flow[roi_y1:roi_y2, roi_x1:roi_x2]
-            # Compute magnitude
-            mag, _ = cv2.cartToPolar(roi_flow[..., 0], roi_flow[..., 1])
-            avg_mag = np.mean(mag)
-            if avg_mag > 5:  # Threshold for potential disposal
-                potential_areas.append({
-                    'top_left': (roi_x1, roi_y1),
-                    'bottom_right': (roi_x2, roi_y2)
-                })
-    return potential_areas
-
-
-def process_video(video_path):
-    """Runs detection → tracking → event detection → reporting on the given file,
-       returns the list of all detected events."""
-    print("1")
+# Nothing is loaded at import: detectors are created per worker by the job manager, and
+# MiDaS loads on its first estimate
+VEHICLE_MODEL_PATH = os.path.join(BASE_PATH, "model/yolov8m.pt")
+TRASH_MODEL_PATH   = os.path.join(BASE_PATH, "model/100epochv2.pt")
+configure_threads(engines=MAX_JOBS)  # every job worker runs its own models at the same time
+registry = ModelRegistry(MODEL_REGISTRY) if os.path.isdir(MODEL_REGISTRY) else None
+if registry is not None:
+    depth_estimator = DepthEstimator(refresh_interval=DEPTH_INTERVAL, running_norm=DEPTH_RUNNING_NORM,
+                                     **registry.depth_kwargs(INFERENCE_BACKEND))
+else:
+    VEHICLE_MODEL_PATH, TRASH_MODEL_PATH, MIDAS_MODEL_PATH = model_paths(INFERENCE_BACKEND, VEHICLE_MODEL_PATH, TRASH_MODEL_PATH,
+                                                                         os.path.join(BASE_PATH, "model"))
+    depth_estimator = DepthEstimator(refresh_interval=DEPTH_INTERVAL, running_norm=DEPTH_RUNNING_NORM,
+                                     onnx_path=MIDAS_MODEL_PATH)
+
+def create_detector():
+    """Detector for a job worker; YOLO models are per worker, MiDaS is shared."""
+    if registry is not None:
+        vehicle_model, trash_model = registry.detector_models(INFERENCE_BACKEND)
+    else:
+        vehicle_model, trash_model = VEHICLE_MODEL_PATH, TRASH_MODEL_PATH
+    return Detector(vehicle_model, trash_model, depth_estimator=depth_estimator,
+                    cascade=TRASH_CASCADE, cascade_full_interval=CASCADE_FULL_INTERVAL,
+                    cascade_margin=CASCADE_MARGIN)
+
+def warm_up_detector(job_detector):
+    """Run one blank frame through a detector so its models are loaded and warmed up."""
+    job_detector.detect(np.zeros((720, 1280, 3), dtype=np.uint8))
+    depth_estimator.forget_stream(None)
+    if registry is not None:
+        app.logger.info(f"Models ready: {registry.timings}")
+
+def process_video(job, job_detector):
+    """Runs detection → tracking → event detection → reporting on the job's video,
+       with tracker, event and reporter state private to the job."""
+    video_path = job.video_path
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
-        print(f"Error: Could not open video {video_path}")
-        return None
-    
+        raise IOError(f"Could not open video {video_path}")
+
+    tracker = Tracker(distance_threshold=150, max_inactive=30)
+    event_detector = EventDetector(temporal_window=10,
+                                   min_holding=15,
+                                   min_disposal=20,
+                                   min_throw=5,
+                                   depth_threshold=50,
+                                   compress_frames=COMPRESS_EVIDENCE_FRAMES)
+    reporter = Reporter(EVIDENCE_FOLDER, REPORT_FOLDER, "Location1")
     tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = 0
+    evidence = reporter.evidence_writer(fps=tracker.frame_rate or 30.0, report_id=job.id)
     events_data = []
-
-    # Initialize the visualization manager with the existing detector
-    vis_manager = VisualizationManager(detector)
-    vis_manager.set_mode('normal')  # Start with normal visualization
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        try:
-            detections = detector.detect(frame)
-            tracker.assign_ids(detections, frame_count)
-            flow = detector.compute_optical_flow(frame)  # Compute optical flow for every frame
-            event_detector.process(tracker.tracking_data, detections, frame, flow)
-            events_data.extend(event_detector.events_data[-1:])
-
-            # Added computation for potential areas and low-confidence detections
-            potential_areas = compute_potential_areas(flow, tracker.tracking_data)
-            low_conf_detections = [det for det in detections if det['type'] == 'trash' and det['confidence'] < 0.5]
-
-            # Updated visualize call to pass new parameters
-            vis_frame = vis_manager.visualize(frame, detections, tracker.tracking_data, flow, potential_areas, low_conf_detections)
-
-            # Display the visualized frame
-            cv2.imshow("Visualization", vis_frame)
-
-            
-
-            frame_count += 1
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-            elif key == ord('n'):
-                vis_manager.set_mode('normal')
-                print("Switched to Normal Visualization")
-            elif key == ord('d'):
-                vis_manager.set_mode('depth')
-                print("Switched to Depth Visualization")
-            elif key == ord('o'):
-                vis_manager.set_mode('optical_flow')
-                print("Switched to Optical Flow Visualization")
-            if event_detector.events_data:
-                events.extend(event_detector.events_data[-1:])
-        except Exception as e:
-            app.logger.exception(f"Error processing frame {frame_count}")
-            # either break, or continue to skip bad frames
-            break
-
-        frame_count += 1
- 
-    cap.release()
-    cv2.destroyAllWindows()
-   
-    return report_path
-
-    
-
-    # write out reports & evidence
-  
+    job.start(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+    # Headless: nothing is displayed server-side, so frames are only drawn when an
+    # annotated video is requested, and then only around events
+    render_sink = None
+    if ANNOTATED_VIDEO:
+        vis_manager = VisualizationManager(job_detector)
+        output_path = os.path.join(REPORT_FOLDER, os.path.splitext(os.path.basename(video_path))[0] + "_annotated.avi")
+        render_sink = RenderSink(vis_manager, output_path, render_every=0, event_window=RENDER_EVENT_WINDOW,
+                                 fps=tracker.frame_rate or 30.0)
+
+    cadence = AdaptiveCadence(DETECTION_INTERVAL) if DETECTION_INTERVAL > 1 else None
+    pipeline = StagedPipeline(job_detector, tracker, event_detector, BATCH_SIZE, QUEUE_SIZE,
+                              overlays=ANNOTATED_VIDEO, cadence=cadence, stream_id=job.id)
+    try:
+        with closing(pipeline.run(cap)) as results:
+            for result in results:
+                events_data.extend(result['events'])
+                evidence.add_frame(result['frame'])  # post-roll for earlier events' clips
+                for event in result['events']:
+                    evidence.submit(event)
+                job.update_progress(result['frame_index'] + 1, result['events'])
+                if render_sink is not None:
+                    render_sink.consume(result)
+    finally:
+        cap.release()
+        depth_estimator.forget_stream(job.id)
+        if render_sink is not None:
+            render_sink.close()
+
+    # evidence was written as events fired; wait for the last of it and save the report
+    report_path = evidence.close()
+    # Process-wide stage timings (shared with concurrent jobs) as of this job's end
+    METRICS.write_json(os.path.join(REPORT_FOLDER, f"metrics_{job.id}.json"))
+    app.logger.info(f"Job {job.id} finished, found {len(events_data)} events")
+    job.finish(report_path)
+
+def emit_progress(job):
+    """Push job progress to websocket clients subscribed to the job."""
+    socketio.emit('job_progress', job.to_dict(), to=job.id)
+
+job_manager = JobManager(process_video, create_detector, max_workers=MAX_JOBS,
+                         max_pending=MAX_PENDING_JOBS, on_progress=emit_progress, delete_videos=True)
+if WARM_UP_MODELS:
+    job_manager.warm_up(warm_up_detector)
 
 @app.route('/api/upload', methods=['POST'])
 def upload_video():
@@ -148,26 +162,59 @@ def upload_video():
     if not file.filename.lower().endswith('.mp4'):
         return jsonify(error="Invalid file format; only .mp4 allowed"), 400
 
+    final_path = None
     try:
-        # 2. save to a safe temp, then move into your upload folder
-        temp_name  = f"upload_.mp4"
+        # 2. reject before saving anything if the queue is full
+        job_manager.check_capacity()
+        # 3. save to a safe temp, then move into your upload folder
+        temp_name  = f"upload_{uuid.uuid4().hex[:16]}.mp4"
         temp_path  = os.path.join(tempfile.gettempdir(), temp_name)
         file.save(temp_path)
 
         final_path = os.path.join(UPLOAD_FOLDER, temp_name)
         shutil.move(temp_path, final_path)
-        print("the filepath",final_path)
-        # 3. process synchronously
-        events = process_video(final_path)
-        app.logger.info(f"Finished processing, found {len(events)} events")
-        # 4. return JSON
-        return jsonify(
-            eventsDetected=len(events),
-            events=events
-        ), 200
-
+        # 4. queue for processing and return straight away
+        job = job_manager.submit(final_path)
+    except JobQueueFull as e:
+        # The queue may have filled up while the file was being saved
+        if final_path is not None and os.path.exists(final_path):
+            os.remove(final_path)
+        return jsonify(error=f"Server busy: {str(e)}"), 503
     except Exception as e:
-        return jsonify(error=f"Processing failed: {str(e)}"), 500
+        return jsonify(error=f"Upload failed: {str(e)}"), 500
+    # 5. return the job id; progress is at /api/jobs/<id> or over the 'job_progress' websocket event
+    return jsonify(jobId=job.id, status=job.status, statusUrl=f"/api/jobs/{job.id}"), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(jobs=[job.to_dict() for job in job_manager.list()]), 200
+
+@app.route('/api/models', methods=['GET'])
+def model_status():
+    """Load and warm-up time of each registry model loaded so far."""
+    return jsonify(models=registry.timings if registry is not None else {}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latencies, fps, queue depths and memory in the Prometheus text format."""
+    return Response(METRICS.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@socketio.on('subscribe')
+def subscribe(data):
+    """Join the room of a job to receive its 'job_progress' events."""
+    job = job_manager.get(data.get('jobId'))
+    if job is None:
+        emit('job_error', {'error': "Unknown job"})
+        return
+    join_room(job.id)
+    emit('job_progress', job.to_dict())
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,27 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+def pairwise_distances(a, b):
+    """Euclidean distance between every row of a (N, D) and every row of b (M, D) as an (N, M) matrix."""
+    a = np.asarray(a, dtype=float).reshape(len(a), -1)
+    b = np.asarray(b, dtype=float).reshape(len(b), -1)
+    diff = a[:, None, :] - b[None, :, :]
+    return np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+
+def gated_assignment(cost, threshold):
+    """Hungarian matching that only considers pairs with cost below threshold.
+
+    Rows and columns with no pair under the gate are dropped before linear_sum_assignment,
+    and gated-out pairs inside the remaining block can never be matched. Returns (rows, cols).
+    """
+    feasible = cost < threshold
+    rows = np.flatnonzero(feasible.any(axis=1))
+    cols = np.flatnonzero(feasible.any(axis=0))
+    if rows.size == 0:
+        return rows, cols
+    sub_cost = cost[np.ix_(rows, cols)]
+    # Any gated pair costs more than every feasible matching combined
+    penalty = threshold * (min(sub_cost.shape) + 1)
+    r, c = linear_sum_assignment(np.where(feasible[np.ix_(rows, cols)], sub_cost, penalty))
+    keep = sub_cost[r, c] < threshold
+    return rows[r[keep]], cols[c[keep]]
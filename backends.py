@@ -0,0 +1,136 @@
+import argparse
+import glob
+import os
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+MIDAS_INPUT_SIZE = 384
+MIDAS_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+MIDAS_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def onnx_path(model_path, quantized=False):
+    """Where the exported (and optionally INT8-quantized) ONNX copy of a model lives."""
+    root, _ = os.path.splitext(model_path)
+    return root + ("_int8.onnx" if quantized else ".onnx")
+
+def model_paths(backend, vehicle_model_path, trash_model_path, model_dir="models"):
+    """(vehicle, trash, MiDaS) model paths for a backend; MiDaS is None for the torch.hub model."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == "torch":
+        return vehicle_model_path, trash_model_path, None
+    quantized = backend == "onnx-int8"
+    return (onnx_path(vehicle_model_path, quantized), onnx_path(trash_model_path, quantized),
+            onnx_path(os.path.join(model_dir, "midas_small.pt"), quantized))
+
+def midas_preprocess(frames):
+    """BGR frames -> normalized (N, 3, 384, 384) float32 MiDaS input, without torch."""
+    batch = []
+    for frame in frames:
+        img = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), (MIDAS_INPUT_SIZE, MIDAS_INPUT_SIZE),
+                         interpolation=cv2.INTER_AREA)
+        batch.append(((img.astype(np.float32) / 255.0 - MIDAS_MEAN) / MIDAS_STD).transpose(2, 0, 1))
+    return np.ascontiguousarray(np.stack(batch))
+
+def yolo_preprocess(frames, imgsz=640):
+    """BGR frames -> (N, 3, imgsz, imgsz) float32 RGB input in 0-1, as exported YOLO models expect."""
+    from inference import letterbox
+    batch = [cv2.cvtColor(letterbox(frame, imgsz, stride=imgsz)[0], cv2.COLOR_BGR2RGB) for frame in frames]
+    return np.ascontiguousarray(np.stack(batch).transpose(0, 3, 1, 2).astype(np.float32) / 255.0)
+
+def create_session(model_path, threads=None):
+    """ONNX Runtime CPU session."""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+def export_yolo(model_path, imgsz=640):
+    """Export a YOLO model to ONNX with dynamic batch and image size; returns the .onnx path."""
+    from ultralytics import YOLO
+    return YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+
+def export_midas(output_path, opset=17):
+    """Export torch.hub MiDaS_small to ONNX with a dynamic batch axis."""
+    import torch
+    midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small", pretrained=True)
+    midas.eval()
+    dummy = torch.randn(1, 3, MIDAS_INPUT_SIZE, MIDAS_INPUT_SIZE)
+    torch.onnx.export(midas, dummy, output_path, input_names=["image"], output_names=["depth"],
+                      dynamic_axes={"image": {0: "batch"}, "depth": {0: "batch"}}, opset_version=opset)
+    return output_path
+
+class VideoCalibrationReader:
+    def __init__(self, input_name, video_paths, preprocess, frames=64):
+        """Feeds frames sampled evenly from videos to ONNX Runtime static quantization calibration."""
+        self.input_name = input_name
+        self.samples = []
+        per_video = max(1, frames // max(1, len(video_paths)))
+        for video_path in video_paths:
+            cap = cv2.VideoCapture(video_path)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+            for index in np.linspace(0, total - 1, per_video).astype(int):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+                ret, frame = cap.read()
+                if ret:
+                    self.samples.append(preprocess([frame]))
+            cap.release()
+        self.position = 0
+
+    def get_next(self):
+        if self.position >= len(self.samples):
+            return None
+        self.position += 1
+        return {self.input_name: self.samples[self.position - 1]}
+
+    def rewind(self):
+        self.position = 0
+
+def quantize(model_path, output_path, calibration_videos=None, preprocess=None, calibration_frames=64):
+    """INT8-quantize an ONNX model: static (QDQ) with calibration videos, dynamic otherwise."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+    if not calibration_videos:
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+        return output_path
+    input_name = create_session(model_path).get_inputs()[0].name
+    reader = VideoCalibrationReader(input_name, calibration_videos, preprocess, calibration_frames)
+    quantize_static(model_path, output_path, reader, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return output_path
+
+def export_all(vehicle_model_path, trash_model_path, model_dir="models", imgsz=640, quantization="none",
+               calibration_videos=None, calibration_frames=64):
+    """Export both YOLO models and MiDaS_small to ONNX next to the .pt files, plus _int8 copies if asked."""
+    exported = [
+        (export_yolo(vehicle_model_path, imgsz), lambda frames: yolo_preprocess(frames, imgsz)),
+        (export_yolo(trash_model_path, imgsz), lambda frames: yolo_preprocess(frames, imgsz)),
+        (export_midas(onnx_path(os.path.join(model_dir, "midas_small.pt"))), midas_preprocess)
+    ]
+    for path, _ in exported:
+        print(f"Exported {path}")
+    if quantization == "none":
+        return
+    for path, preprocess in exported:
+        output_path = onnx_path(path, quantized=True)
+        videos = calibration_videos if quantization == "static" else None
+        quantize(path, output_path, videos, preprocess, calibration_frames)
+        print(f"Quantized {output_path} ({quantization})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the detection models for the ONNX Runtime backend.")
+    parser.add_argument("--vehicle-model", default="models/yolov8m.pt")
+    parser.add_argument("--trash-model", default="models/100epochv2.pt")
+    parser.add_argument("--model-dir", default="models", help="where midas_small.onnx is written")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--quantize", choices=["none", "dynamic", "static"], default="none",
+                        help="also write INT8 _int8.onnx copies (static calibrates on --calibration-videos)")
+    parser.add_argument("--calibration-videos", nargs="*", default=None)
+    parser.add_argument("--calibration-frames", type=int, default=64)
+    args = parser.parse_args()
+    calibration_videos = args.calibration_videos or sorted(glob.glob("videos/*.mp4"))
+    export_all(args.vehicle_model, args.trash_model, args.model_dir, args.imgsz, args.quantize,
+               calibration_videos, args.calibration_frames)
+
+if __name__ == "__main__":
+    main()
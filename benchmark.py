@@ -0,0 +1,497 @@
+import argparse
+import gc
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from contextlib import closing
+import cv2
+import numpy as np
+from tracking import Tracker
+from events import EventDetector
+from pipeline import StagedPipeline, compute_potential_areas, iter_detections, read_frame_batches
+from assignment import gated_assignment
+from backends import BACKENDS, model_paths
+from cadence import AdaptiveCadence
+from metrics import METRICS
+from optical_flow import FlowField, OpticalFlow
+
+class StubDetector:
+    def __init__(self, flow_mode="roi", flow_scale=1.0, model_ms=0.0, min_vehicle_area=4000, min_trash_area=30):
+        """Stand-in for Detector that needs no model weights, for benchmarking the rest of the pipeline.
+
+        Moving blobs from background subtraction on a quarter-size frame become vehicles (large)
+        or trash (small), with depth taken from how low the blob sits in the frame. model_ms adds a
+        simulated model latency per frame. Areas are in full-resolution pixels.
+        """
+        self.optical_flow = OpticalFlow(flow_mode, flow_scale)
+        self.model_ms = model_ms
+        self.min_vehicle_area = min_vehicle_area
+        self.min_trash_area = min_trash_area
+        self.reset()
+
+    def detect(self, frame, frame_index=None):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, frame_indices=None):
+        return [self._detect(frame) for frame in frames]
+
+    def _detect(self, frame):
+        with METRICS.time("stub_models"):
+            height, width = frame.shape[:2]
+            mask = self.subtractor.apply(cv2.resize(frame, (width // 4, height // 4), interpolation=cv2.INTER_AREA))
+            count, _, stats, _ = cv2.connectedComponentsWithStats(cv2.medianBlur(mask, 5))
+            detections = []
+            for x, y, w, h, _ in stats[1:count] * 4:
+                area = w * h
+                if area < self.min_trash_area:
+                    continue
+                vehicle = area >= self.min_vehicle_area
+                cx, cy = x + w / 2, y + h / 2
+                det = {
+                    'bbox': np.array([x, y, x + w, y + h], dtype=np.float32),
+                    'class_id': 2 if vehicle else 1,
+                    'type': 'vehicle' if vehicle else 'trash',
+                    'center': (cx, cy, 255.0 * cy / height),
+                    'confidence': np.float32(0.9 if vehicle else 0.4)
+                }
+                if not vehicle:
+                    det['depth_history'] = deque(maxlen=10)
+                    det['trajectory'] = deque(maxlen=10)
+                detections.append(det)
+        if self.model_ms:
+            time.sleep(self.model_ms / 1000)
+        return detections
+
+    def compute_optical_flow(self, frame, rois=None):
+        return self.optical_flow.compute(frame, rois)
+
+    def reset(self):
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, detectShadows=False)
+        self.optical_flow.reset()
+
+def write_synthetic_clip(path, frames=240, size=(1280, 720), fps=30.0):
+    """Render a deterministic clip in which StubDetector finds a disposal event; returns path.
+
+    A wide textured vehicle drives across a still background at a slowed pace and, at frame 110,
+    drops a small bright object just below it that slides along with it for 30 frames. The bundled
+    clips give the stub no events, so this is what the baseline's event count is checked against.
+    """
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(60, 120, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    texture = rng.integers(0, 255, (100, 440, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for frame_index in range(frames):
+        frame = background.copy()
+        x = -440 + 8 * frame_index
+        x1, x2 = max(x, 0), min(x + 440, width)
+        if x2 > x1:
+            frame[380:480, x1:x2] = texture[:, x1 - x:x2 - x]
+        if frame_index >= 110:
+            t = min(frame_index - 110, 30)
+            cx, cy = 8 * (110 + t) - 220, 508 + t
+            cv2.rectangle(frame, (cx - 12, cy - 12), (cx + 12, cy + 12), (240, 240, 240), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def peak_rss_bytes():
+    return METRICS.memory()["peak_rss_bytes"]
+
+def benchmark_batch_sizes(video_path, vehicle_model_path, trash_model_path, batch_sizes, max_frames):
+    """Report offline frames/sec for each batch size over the first max_frames frames of a video."""
+    from detection import Detector  # needs torch/ultralytics, unlike the synthetic benchmarks
+    from inference import configure_threads
+    configure_threads()
+    detector = Detector(vehicle_model_path, trash_model_path)
+    results = []
+    for batch_size in batch_sizes:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error: Could not open video {video_path}")
+            return results
+        tracker = Tracker()
+        tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS)
+        event_detector = EventDetector()
+        detector.reset()
+        detector.depth_estimator.clear()
+
+        frames = 0
+        start = time.perf_counter()
+        for frame_count, frame, detections in iter_detections(cap, detector, batch_size):
+            tracker.assign_ids(detections, frame_count)
+            flow = detector.compute_optical_flow(frame)
+            event_detector.process(tracker.tracking_data, detections, frame, flow)
+            frames += 1
+            if frames >= max_frames:
+                break
+        elapsed = time.perf_counter() - start
+        cap.release()
+
+        fps = frames / elapsed if elapsed > 0 else 0.0
+        results.append({"batch_size": batch_size, "frames": frames, "seconds": elapsed, "fps": fps})
+        print(f"batch_size={batch_size:<3d} frames={frames:<5d} {elapsed:8.2f}s {fps:7.2f} fps")
+    return results
+
+def synthetic_detections(num_vehicles, num_trash, frame_index, spacing=200.0):
+    """Detections for a grid of slowly moving vehicles with trash scattered beside them."""
+    detections = []
+    cols = int(np.ceil(np.sqrt(max(num_vehicles, 1))))
+    for i in range(num_vehicles):
+        x = (i % cols) * spacing + 100 + frame_index * 0.5
+        y = (i // cols) * spacing + 100
+        detections.append({
+            'bbox': np.array([x - 60, y - 40, x + 60, y + 40], dtype=np.float32),
+            'class_id': 2,
+            'type': 'vehicle',
+            'center': (x, y, 100.0 + i % 50),
+            'confidence': np.float32(0.9)
+        })
+    for i in range(num_trash):
+        x = (i % cols) * spacing + 150
+        y = (i // cols) * spacing + 130
+        detections.append({
+            'bbox': np.array([x - 8, y - 8, x + 8, y + 8], dtype=np.float32),
+            'class_id': 1,
+            'type': 'trash',
+            'center': (x, y, 100.0 + i % 50),
+            'depth_history': deque(maxlen=10),
+            'trajectory': deque(maxlen=10),
+            'confidence': np.float32(0.4)
+        })
+    return detections
+
+def benchmark_track_memory(track_counts, frames):
+    """Report track-state memory, allocations and per-frame time for N concurrent tracks."""
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)  # tiny, so evidence frame buffers don't dominate
+    results = []
+    for num_tracks in track_counts:
+        num_trash = num_tracks // 10
+        num_vehicles = num_tracks - num_trash
+        batches = [synthetic_detections(num_vehicles, num_trash, f) for f in range(frames)]
+        gc.collect()
+        tracked_before = len(gc.get_objects())
+        tracemalloc.start()
+        tracker = Tracker()
+        event_detector = EventDetector()
+        start = time.perf_counter()
+        for frame_index, detections in enumerate(batches):
+            tracker.assign_ids(detections, frame_index)
+            event_detector.process(tracker.tracking_data, detections, frame, None)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracked_objects = len(gc.get_objects()) - tracked_before
+        result = {
+            "tracks": len(tracker.tracking_data),
+            "bytes": current,
+            "bytes_per_track": current / max(len(tracker.tracking_data), 1),
+            "peak_bytes": peak,
+            "gc_objects": tracked_objects,
+            "ms_per_frame": elapsed / frames * 1000
+        }
+        results.append(result)
+        print(f"tracks={result['tracks']:<5d} memory={current / 1024:9.1f} KiB "
+              f"({result['bytes_per_track']:7.0f} B/track) peak={peak / 1024:9.1f} KiB "
+              f"gc_objects={tracked_objects:<7d} {result['ms_per_frame']:7.2f} ms/frame")
+        del tracker, event_detector, batches
+    return results
+
+def box_iou(a, b):
+    """IoU between every box in a (N, 4) and every box in b (M, 4)."""
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Per type: (matched, reference count, candidate count, depth differences of matched pairs)."""
+    stats = {}
+    for kind in ("vehicle", "trash"):
+        ref = [d for d in reference if d['type'] == kind]
+        cand = [d for d in candidate if d['type'] == kind]
+        depth_diffs = []
+        if ref and cand:
+            rows, cols = gated_assignment(1 - box_iou([d['bbox'] for d in ref], [d['bbox'] for d in cand]), 1 - iou_threshold)
+            depth_diffs = [abs(float(ref[r]['center'][2]) - float(cand[c]['center'][2])) for r, c in zip(rows, cols)]
+        stats[kind] = (len(depth_diffs), len(ref), len(cand), depth_diffs)
+    return stats
+
+def compare_backends(video_paths, vehicle_model_path, trash_model_path, backends, max_frames, batch_size):
+    """Latency of each backend, and its agreement with the first backend's detections and depth."""
+    from detection import Detector
+    from depth_estimation import DepthEstimator
+    from inference import configure_threads
+    configure_threads()
+    reference, results = None, []
+    for backend in backends:
+        vehicle_path, trash_path, midas_path = model_paths(backend, vehicle_model_path, trash_model_path)
+        detector = Detector(vehicle_path, trash_path, depth_estimator=DepthEstimator(onnx_path=midas_path))
+        outputs, frames, elapsed = [], 0, 0.0
+        for video_path in video_paths:
+            cap = cv2.VideoCapture(video_path)
+            video_frames = 0
+            for batch in read_frame_batches(cap, batch_size):
+                batch = batch[:max_frames - video_frames]
+                start = time.perf_counter()
+                outputs.extend(detector.detect_batch(batch))
+                elapsed += time.perf_counter() - start
+                video_frames += len(batch)
+                if video_frames >= max_frames:
+                    break
+            cap.release()
+            frames += video_frames
+        result = {"backend": backend, "frames": frames, "ms_per_frame": elapsed / max(frames, 1) * 1000}
+        if reference is None:
+            reference = outputs
+        totals = {kind: [0, 0, 0, []] for kind in ("vehicle", "trash")}
+        for ref, cand in zip(reference, outputs):
+            for kind, (matched, n_ref, n_cand, diffs) in match_detections(ref, cand).items():
+                totals[kind][0] += matched
+                totals[kind][1] += n_ref
+                totals[kind][2] += n_cand
+                totals[kind][3].extend(diffs)
+        line = f"{backend:<10s} {result['ms_per_frame']:8.1f} ms/frame"
+        for kind, (matched, n_ref, n_cand, diffs) in totals.items():
+            result[f"{kind}_recall"] = matched / n_ref if n_ref else 1.0
+            result[f"{kind}_precision"] = matched / n_cand if n_cand else 1.0
+            result[f"{kind}_depth_mae"] = float(np.mean(diffs)) if diffs else 0.0
+            line += (f"  {kind}: recall={result[f'{kind}_recall']:.3f} precision={result[f'{kind}_precision']:.3f}"
+                     f" depth_mae={result[f'{kind}_depth_mae']:.2f}")
+        results.append(result)
+        print(line)
+    return results
+
+def benchmark_pipeline(video_paths, stub=True, vehicle_model_path=None, trash_model_path=None, max_frames=0,
+                       batch_size=8, detection_interval=1, model_ms=0.0):
+    """Run the staged pipeline headless over each video: per-stage latency, fps, peak RSS and events found."""
+    if stub:
+        detector = StubDetector(model_ms=model_ms)
+    else:
+        from detection import Detector
+        from inference import configure_threads
+        configure_threads()
+        detector = Detector(vehicle_model_path, trash_model_path)
+    results = []
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error: Could not open video {video_path}")
+            continue
+        tracker = Tracker()
+        tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS) or tracker.frame_rate
+        event_detector = EventDetector()
+        detector.reset()
+        cadence = AdaptiveCadence(detection_interval) if detection_interval > 1 else None
+        pipeline = StagedPipeline(detector, tracker, event_detector, batch_size, overlays=False, cadence=cadence)
+        METRICS.reset()
+        frames, events = 0, 0
+        start = time.perf_counter()
+        with closing(pipeline.run(cap)) as pipeline_results:
+            for result in pipeline_results:
+                frames += 1
+                events += len(result['events'])
+                if max_frames and frames >= max_frames:
+                    break
+        elapsed = time.perf_counter() - start
+        cap.release()
+        summary = METRICS.summary()
+        result = {
+            "video": os.path.basename(video_path),
+            "frames": frames,
+            "seconds": round(elapsed, 3),
+            "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "events": events,
+            "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+            "stages": summary["stages"]
+        }
+        results.append(result)
+        print(f"{result['video'][:40]:<40s} frames={frames:<5d} {result['fps']:7.2f} fps events={events:<3d} "
+              f"peak_rss={result['peak_rss_mb']:.0f} MiB")
+        for stage, stats in result["stages"].items():
+            print(f"    {stage:<14s} p50={stats['p50_ms']:8.2f} ms  p95={stats['p95_ms']:8.2f} ms  p99={stats['p99_ms']:8.2f} ms")
+    return results
+
+def median_results(runs):
+    """Merge repeated benchmark_pipeline runs into one result per video, taking the median fps, time
+    and stage latencies (peak RSS is the maximum)."""
+    by_video = {}
+    for run in runs:
+        for result in run:
+            by_video.setdefault(result["video"], []).append(result)
+    merged = []
+    for video, results in by_video.items():
+        stages = {}
+        for stage in results[0]["stages"]:
+            samples = [r["stages"][stage] for r in results if stage in r["stages"]]
+            stages[stage] = {key: round(float(np.median([s[key] for s in samples])), 3) for key in samples[0]}
+        merged.append({
+            **results[0],
+            "seconds": round(float(np.median([r["seconds"] for r in results])), 3),
+            "fps": round(float(np.median([r["fps"] for r in results])), 2),
+            "peak_rss_mb": max(r["peak_rss_mb"] for r in results),
+            "runs": len(results),
+            "stages": stages
+        })
+    return merged
+
+def compare_to_baseline(results, baseline, tolerance=0.25, min_ms=0.5):
+    """Regressions of results against a stored baseline run: lower fps or higher stage p95 by more than
+    tolerance (stage times below min_ms are ignored as noise), and changed event counts."""
+    regressions = []
+    reference = {result["video"]: result for result in baseline.get("pipeline", [])}
+    for result in results:
+        base = reference.get(result["video"])
+        if base is None:
+            continue
+        name = result["video"]
+        if result["frames"] == base["frames"] and result["events"] != base["events"]:
+            regressions.append(f"{name}: events {base['events']} -> {result['events']}")
+        if result["fps"] < base["fps"] * (1 - tolerance):
+            regressions.append(f"{name}: fps {base['fps']} -> {result['fps']}")
+        for stage, stats in result["stages"].items():
+            before = base["stages"].get(stage, {}).get("p95_ms")
+            if before is not None and stats["p95_ms"] > max(before * (1 + tolerance), before + min_ms):
+                regressions.append(f"{name}: {stage} p95 {before} -> {stats['p95_ms']} ms")
+    return regressions
+
+def benchmark_micro(scales, frames):
+    """Per-call time of Tracker.assign_ids, EventDetector.process and compute_potential_areas at N synthetic objects."""
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    results = []
+    for num_objects in scales:
+        num_trash = max(1, num_objects // 10)
+        batches = [synthetic_detections(num_objects - num_trash, num_trash, f) for f in range(frames)]
+        extent = int(np.ceil(np.sqrt(num_objects))) * 200 + 300
+        # Dense flow over the whole synthetic scene, computed at 1/10 scale as in "roi" mode with flow_scale=0.1
+        flow = FlowField((extent, extent), scale=0.1)
+        flow.patches.append((0, 0, np.random.default_rng(0).normal(0, 3, (extent // 10, extent // 10, 2)).astype(np.float32)))
+        tracker, event_detector = Tracker(), EventDetector()
+        timings = {"assign_ids": [], "events_process": [], "potential_areas": []}
+        for frame_index, detections in enumerate(batches):
+            start = time.perf_counter()
+            tracker.assign_ids(detections, frame_index)
+            tracked = time.perf_counter()
+            event_detector.process(tracker.tracking_data, detections, frame, flow)
+            processed = time.perf_counter()
+            compute_potential_areas(flow, tracker.tracking_data)
+            timings["assign_ids"].append(tracked - start)
+            timings["events_process"].append(processed - tracked)
+            timings["potential_areas"].append(time.perf_counter() - processed)
+        result = {"objects": num_objects}
+        line = f"objects={num_objects:<5d}"
+        for name, samples in timings.items():
+            samples = np.array(samples[1:] or samples) * 1000  # the first frame only creates tracks
+            result[name] = {"mean_ms": round(float(samples.mean()), 3), "p95_ms": round(float(np.percentile(samples, 95)), 3)}
+            line += f"  {name}={result[name]['mean_ms']:8.3f} ms (p95 {result[name]['p95_ms']:8.3f})"
+        results.append(result)
+        print(line)
+    return results
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the detection pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="frames/sec of offline processing against inference batch size")
+    batch.add_argument("--video", default="videos/just_vehicle.mp4")
+    batch.add_argument("--vehicle-model", default="models/yolov8m.pt")
+    batch.add_argument("--trash-model", default="models/100epochv2.pt")
+    batch.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    batch.add_argument("--frames", type=int, default=240, help="frames to process per batch size")
+
+    memory = subparsers.add_parser("track-memory", help="track store memory and time at N concurrent tracks")
+    memory.add_argument("--tracks", type=int, nargs="+", default=[100, 1000])
+    memory.add_argument("--frames", type=int, default=60)
+
+    backends = subparsers.add_parser("backends", help="latency and agreement of inference backends (first is the reference)")
+    backends.add_argument("--videos", nargs="+", default=None, help="defaults to every clip in videos/")
+    backends.add_argument("--vehicle-model", default="models/yolov8m.pt")
+    backends.add_argument("--trash-model", default="models/100epochv2.pt")
+    backends.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    backends.add_argument("--frames", type=int, default=120, help="frames per video")
+    backends.add_argument("--batch-size", type=int, default=4)
+
+    pipeline = subparsers.add_parser("pipeline", help="headless end-to-end run over videos, optionally with stub models")
+    pipeline.add_argument("--videos", nargs="+", default=None, help="defaults to every clip in videos/")
+    pipeline.add_argument("--stub", action="store_true", help="background-subtraction stand-in for the models (no weights)")
+    pipeline.add_argument("--model-ms", type=float, default=0.0, help="--stub: simulated model latency per frame")
+    pipeline.add_argument("--vehicle-model", default="models/yolov8m.pt")
+    pipeline.add_argument("--trash-model", default="models/100epochv2.pt")
+    pipeline.add_argument("--frames", type=int, default=0, help="max frames per video (0 = all)")
+    pipeline.add_argument("--batch-size", type=int, default=8)
+    pipeline.add_argument("--detection-interval", type=int, default=1)
+    pipeline.add_argument("--output", default="benchmarks/pipeline.json")
+    pipeline.add_argument("--baseline", default=None, help="earlier --output to compare against, e.g. "
+                          "benchmarks/stub_baseline.json; regressions exit with 1")
+    pipeline.add_argument("--synthetic", action="store_true", help="also run a generated clip with a disposal "
+                          "event (write_synthetic_clip), so event counts are checked")
+    pipeline.add_argument("--tolerance", type=float, default=0.25, help="allowed relative fps/latency regression")
+    pipeline.add_argument("--repeat", type=int, default=3, help="runs per video; medians are reported, to damp noise")
+
+    micro = subparsers.add_parser("micro", help="tracking, event and potential-area time at 10-1000 synthetic objects")
+    micro.add_argument("--objects", type=int, nargs="+", default=[10, 100, 1000])
+    micro.add_argument("--frames", type=int, default=30)
+    micro.add_argument("--output", default=None)
+
+    args = parser.parse_args()
+    if args.command == "batch":
+        benchmark_batch_sizes(args.video, args.vehicle_model, args.trash_model, args.batch_sizes, args.frames)
+    elif args.command == "track-memory":
+        benchmark_track_memory(args.tracks, args.frames)
+    elif args.command == "backends":
+        compare_backends(args.videos or sorted(glob.glob("videos/*.mp4")), args.vehicle_model, args.trash_model,
+                         args.backends, args.frames, args.batch_size)
+    elif args.command == "pipeline":
+        settings = {"stub": args.stub, "synthetic": args.synthetic, "frames": args.frames, "batch_size": args.batch_size,
+                    "detection_interval": args.detection_interval, "model_ms": args.model_ms}
+        baseline = None
+        if args.baseline:
+            # Checked before the run, which takes minutes
+            if not os.path.exists(args.baseline):
+                parser.error(f"baseline {args.baseline} not found; record one with: python benchmark.py pipeline "
+                             f"--stub --synthetic --frames 300 --output {args.baseline}")
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            differing = {key: baseline[key] for key in settings if key in baseline and baseline[key] != settings[key]}
+            if differing:
+                parser.error(f"baseline {args.baseline} was recorded with different settings: {differing}")
+        with tempfile.TemporaryDirectory() as scratch:
+            video_paths = args.videos or sorted(glob.glob("videos/*.mp4"))
+            if args.synthetic:
+                video_paths = video_paths + [write_synthetic_clip(os.path.join(scratch, "synthetic_throw.mp4"))]
+            runs = [benchmark_pipeline(video_paths, args.stub, args.vehicle_model, args.trash_model, args.frames,
+                                       args.batch_size, args.detection_interval, args.model_ms)
+                    for _ in range(args.repeat)]
+        results = median_results(runs)
+        write_results(args.output, {**settings, "pipeline": results})
+        if baseline is not None:
+            regressions = compare_to_baseline(results, baseline, args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+            print("No regressions against baseline")
+    elif args.command == "micro":
+        results = benchmark_micro(args.objects, args.frames)
+        if args.output:
+            write_results(args.output, {"micro": results})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import threading
+import cv2
+import numpy as np
+
+ACTIVE_STATES = ("STOPPED_UNLOADING", "SLOWING_THROW", "DECELERATING_NEAR_TRASH", "POTENTIAL_THROW")
+
+class AdaptiveCadence:
+    def __init__(self, interval=5, active_interval=1, motion_threshold=0.02, motion_size=(160, 90), pixel_threshold=25):
+        """Decide which frames get full detection; the frames in between are filled in from tracker predictions.
+
+        Detection runs at least every interval frames, every active_interval frames while any vehicle
+        is in an active event state, and immediately when the amount of motion in the scene changes
+        (fraction of changed pixels between consecutive downscaled frames differs by more than
+        motion_threshold from the last detected frame) or the number of IDLE vehicles changes.
+        interval=1 detects every frame.
+        """
+        self.interval = interval
+        self.active_interval = active_interval
+        self.motion_threshold = motion_threshold
+        self.motion_size = motion_size
+        self.pixel_threshold = pixel_threshold
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the previous video's state."""
+        with self.lock:
+            self.prev_small = None
+            self.motion_at_detection = 0.0
+            self.last_detected = None
+            self.idle_count = None
+            self.active = False
+            self.force = True
+            self.detected_frames = 0
+            self.predicted_frames = 0
+
+    def should_detect(self, frame_index, frame):
+        """Return True if this frame needs full detection. Call once per frame, in frame order."""
+        small = cv2.cvtColor(cv2.resize(frame, self.motion_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        with self.lock:
+            motion = 0.0
+            if self.prev_small is not None:
+                motion = float(np.mean(cv2.absdiff(small, self.prev_small) > self.pixel_threshold))
+            self.prev_small = small
+            interval = self.active_interval if self.active else self.interval
+            detect = (self.force or self.last_detected is None or interval <= 1
+                      or frame_index - self.last_detected >= interval
+                      or abs(motion - self.motion_at_detection) > self.motion_threshold)
+            if detect:
+                self.force = False
+                self.last_detected = frame_index
+                self.motion_at_detection = motion
+                self.detected_frames += 1
+            else:
+                self.predicted_frames += 1
+            return detect
+
+    def observe(self, tracking_data):
+        """Feed back tracker/event state after a frame has been analyzed."""
+        _, slots = tracking_data.slots('vehicle')
+        idle_count = int(tracking_data.isin('state', ['IDLE'], slots).sum())
+        active = bool(tracking_data.isin('state', ACTIVE_STATES, slots).any())
+        with self.lock:
+            if self.idle_count is not None and idle_count != self.idle_count:
+                self.force = True
+            self.idle_count = idle_count
+            self.active = active
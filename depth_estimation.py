@@ -0,0 +1,227 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+import torch
+import torchvision.transforms as T
+from backends import create_session, midas_preprocess
+from metrics import METRICS
+
+class DepthMap:
+    def __init__(self, depth, frame_shape):
+        """MiDaS output normalized to 0-255 at model resolution, queried in frame coordinates.
+
+        Point and box queries read the low-resolution map directly; the full-resolution map is only
+        built when something asks for it (depth visualization).
+        """
+        self.depth = depth
+        self.frame_shape = frame_shape[:2]
+        self.scale_y = depth.shape[0] / self.frame_shape[0]
+        self.scale_x = depth.shape[1] / self.frame_shape[1]
+        self._full = None
+
+    def sample(self, x, y):
+        """Bilinear depth at frame coordinates (x, y); accepts scalars or arrays."""
+        h, w = self.depth.shape
+        # Pixel centers, as in interpolate(..., align_corners=False)
+        u = np.clip((np.asarray(x, dtype=float) + 0.5) * self.scale_x - 0.5, 0, w - 1)
+        v = np.clip((np.asarray(y, dtype=float) + 0.5) * self.scale_y - 0.5, 0, h - 1)
+        u0, v0 = np.minimum(u.astype(int), w - 2), np.minimum(v.astype(int), h - 2)
+        du, dv = u - u0, v - v0
+        d = self.depth
+        top = d[v0, u0] * (1 - du) + d[v0, u0 + 1] * du
+        bottom = d[v0 + 1, u0] * (1 - du) + d[v0 + 1, u0 + 1] * du
+        return top * (1 - dv) + bottom * dv
+
+    def box_median(self, bbox):
+        """Median depth over the map cells a frame-coordinate (x1, y1, x2, y2) box covers."""
+        x1, y1, x2, y2 = bbox
+        h, w = self.depth.shape
+        u1 = min(w - 1, max(0, int(x1 * self.scale_x)))
+        v1 = min(h - 1, max(0, int(y1 * self.scale_y)))
+        u2 = max(u1 + 1, min(w, int(np.ceil(x2 * self.scale_x))))
+        v2 = max(v1 + 1, min(h, int(np.ceil(y2 * self.scale_y))))
+        return float(np.median(self.depth[v1:v2, u1:u2]))
+
+    def full(self):
+        """Depth upsampled to the frame size, built on first use."""
+        if self._full is None:
+            self._full = cv2.resize(self.depth, (self.frame_shape[1], self.frame_shape[0]), interpolation=cv2.INTER_CUBIC)
+        return self._full
+
+class DepthEstimator:
+    def __init__(self, cache_size=4, refresh_interval=1, scene_change_threshold=12.0, running_norm=False, norm_momentum=0.1,
+                 onnx_path=None, onnx_threads=None, model=None):
+        """Load a single MiDaS model shared by detection and depth visualization.
+
+        With refresh_interval > 1, MiDaS runs on every refresh_interval-th frame of a stream, or sooner
+        when the scene changes (mean absolute difference of a 64x36 grayscale thumbnail against the
+        last refreshed frame above scene_change_threshold); frames in between reuse the latest map.
+        running_norm normalizes with a running min/max per stream instead of each map's own, so depth
+        values stay comparable from frame to frame. Streams are told apart by the first element of
+        (stream, frame) tuple indices. onnx_path runs an exported MiDaS_small through ONNX Runtime
+        (see backends.py) instead of the torch model. model is an already built (or ModelRegistry.lazy)
+        torch MiDaS; without one, MiDaS_small is fetched through torch.hub on the first estimate.
+        """
+        self.session = None
+        if onnx_path is not None:
+            self.session = create_session(onnx_path, onnx_threads)
+            self.input_name = self.session.get_inputs()[0].name
+        self.midas = model
+        self.load_lock = threading.Lock()
+        self.transform = T.Compose([
+            T.ToTensor(),
+            T.Resize((384, 384)),
+            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # frame index -> DepthMap
+        self.refresh_interval = refresh_interval
+        self.scene_change_threshold = scene_change_threshold
+        self.running_norm = running_norm
+        self.norm_momentum = norm_momentum
+        self.streams = {}  # stream -> temporal reuse and normalization state
+        self.lock = threading.Lock()  # inference and visualization may run on different threads
+
+    def reserve(self, frames):
+        """Keep at least this many recent maps cached, e.g. every frame a pipeline can have in flight."""
+        with self.lock:
+            self.cache_size = max(self.cache_size, frames)
+
+    def cached(self, frame_index):
+        """The cached DepthMap of a frame index, or None; unlike estimate(), never runs MiDaS or touches
+        the per-stream reuse and normalization state."""
+        with self.lock:
+            return self.cache.get(frame_index) if frame_index is not None else None
+
+    def estimate_single(self, frame):
+        """DepthMap of one frame from its own MiDaS pass, normalized by its own min/max, outside the
+        per-stream reuse and normalization state (e.g. for displaying a frame that wasn't analyzed)."""
+        depth = self._run_midas([frame])[0]
+        low, high = float(depth.min()), float(depth.max())
+        return DepthMap(np.clip((depth - low) / max(high - low, 1e-6) * 255.0, 0, 255).astype(np.float32), frame.shape)
+
+    def estimate(self, frame, frame_index=None):
+        """Return the frame's DepthMap (normalized to 0-255), computed once per frame index."""
+        return self.estimate_batch([frame], [frame_index])[0]
+
+    def estimate_batch(self, frames, frame_indices=None):
+        """Return DepthMaps for a stack of same-sized frames from at most one MiDaS forward pass."""
+        if frame_indices is None:
+            frame_indices = [None] * len(frames)
+        # Keep a whole batch cached so the visualizer can reuse every map
+        self.cache_size = max(self.cache_size, len(frames))
+        depths = [self._lookup(i) for i in frame_indices]
+        missing = [k for k, depth in enumerate(depths) if depth is None]
+        if not missing:
+            return depths
+
+        run, sources = self._plan(frames, frame_indices, missing)
+        if run:
+            # Kept at model resolution; DepthMap samples it without upsampling
+            batch_depth = self._run_midas([frames[k] for k in run])
+            for k, depth in zip(run, batch_depth):
+                sources[k][0] = DepthMap(self._normalize(self._stream_key(frame_indices[k]), depth), frames[k].shape)
+
+        for k in missing:
+            depths[k] = sources[k][0]
+            self._store(frame_indices[k], depths[k])
+        return depths
+
+    def _run_midas(self, frames):
+        """Raw MiDaS output for a list of frames, as an (N, 384, 384) array."""
+        with METRICS.time("midas"):
+            return self._midas_forward(frames)
+
+    def _midas_forward(self, frames):
+        if self.session is not None:
+            depth = self.session.run(None, {self.input_name: midas_preprocess(frames)})[0]
+            return depth.reshape(len(frames), *depth.shape[-2:])
+        img_input = torch.stack([
+            self.transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames
+        ]).to('cpu')
+        with torch.no_grad():
+            return self._torch_model()(img_input).cpu().numpy()
+
+    def _torch_model(self):
+        """The torch MiDaS model, loaded from torch.hub on first use if none was passed in."""
+        with self.load_lock:
+            if self.midas is None:
+                self.midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small", pretrained=True)
+                self.midas.eval()
+            return self.midas
+
+    def _stream_key(self, frame_index):
+        return frame_index[0] if isinstance(frame_index, tuple) else None
+
+    def _plan(self, frames, frame_indices, missing):
+        """Pick the frames that need a MiDaS pass; every missing frame gets a one-item list its map lands in."""
+        run, sources = [], {}
+        if self.refresh_interval <= 1:
+            for k in missing:
+                run.append(k)
+                sources[k] = [None]
+            return run, sources
+        created = set()  # maps this batch will fill in
+        with self.lock:
+            for k in missing:
+                stream = self.streams.setdefault(self._stream_key(frame_indices[k]),
+                                                 {"latest": None, "thumb": None, "since": 0})
+                thumb = cv2.resize(cv2.cvtColor(frames[k], cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+                latest = stream["latest"]
+                # A map still pending in another worker's batch can't be reused here
+                usable = latest is not None and (latest[0] is not None or id(latest) in created)
+                refresh = (not usable or stream["since"] + 1 >= self.refresh_interval
+                           or cv2.absdiff(thumb, stream["thumb"]).mean() > self.scene_change_threshold)
+                if refresh:
+                    latest = [None]
+                    created.add(id(latest))
+                    stream.update(latest=latest, thumb=thumb, since=0)
+                    run.append(k)
+                else:
+                    stream["since"] += 1
+                sources[k] = latest
+        return run, sources
+
+    def _normalize(self, stream_key, depth):
+        """Scale a raw MiDaS map to 0-255 by its own min/max, or by the stream's running min/max."""
+        low, high = float(depth.min()), float(depth.max())
+        if self.running_norm:
+            with self.lock:
+                stream = self.streams.setdefault(stream_key, {"latest": None, "thumb": None, "since": 0})
+                if "low" in stream:
+                    m = self.norm_momentum
+                    stream["low"] += m * (low - stream["low"])
+                    stream["high"] += m * (high - stream["high"])
+                else:
+                    stream["low"], stream["high"] = low, high
+                low, high = stream["low"], stream["high"]
+        return np.clip((depth - low) / max(high - low, 1e-6) * 255.0, 0, 255).astype(np.float32)
+
+    def _lookup(self, frame_index):
+        """Return the cached depth map for a frame index, if any."""
+        with self.lock:
+            if frame_index is None or frame_index not in self.cache:
+                return None
+            self.cache.move_to_end(frame_index)
+            return self.cache[frame_index]
+
+    def _store(self, frame_index, depth):
+        """Cache a depth map, evicting the oldest entries beyond cache_size."""
+        if frame_index is None:
+            return
+        with self.lock:
+            self.cache[frame_index] = depth
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def forget_stream(self, stream_key):
+        """Drop the reuse and normalization state of a finished stream."""
+        with self.lock:
+            self.streams.pop(stream_key, None)
+
+    def clear(self):
+        """Drop all cached depth maps and per-stream reuse state."""
+        with self.lock:
+            self.cache.clear()
+            self.streams.clear()
@@ -1,32 +1,21 @@
 import cv2
 import numpy as np
-import torch
-import torchvision.transforms as T
+from depth_estimation import DepthEstimator
 
 class DepthVisualizer:
-    def __init__(self):
-        """Initialize the MiDaS model for depth estimation."""
-        self.midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small", pretrained=True)
-        self.midas.eval()
-        self.midas.to('cpu')
-        self.transform = T.Compose([
-            T.ToTensor(),
-            T.Resize((384, 384)),
-            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+    def __init__(self, depth_estimator=None):
+        """Use the shared MiDaS estimator for depth estimation."""
+        self.depth_estimator = depth_estimator or DepthEstimator()
 
-    def visualize_depth(self, frame):
-        """Generate and visualize the depth map."""
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img_input = self.transform(img_rgb).unsqueeze(0).to('cpu')
-        
-        with torch.no_grad():
-            depth = self.midas(img_input)
-            depth = torch.nn.functional.interpolate(
-                depth.unsqueeze(1), size=frame.shape[:2], mode="bicubic", align_corners=False
-            ).squeeze().cpu().numpy()
-        
-        # Normalize depth values to 0-255 for visualization
-        depth_normalized = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
+    def visualize_depth(self, frame, frame_index=None, depth=None):
+        """Generate and visualize the depth map.
+
+        depth is the DepthMap the frame was analyzed with (pipeline results carry it). Without one the
+        estimator's cache is checked, and only then is MiDaS run for this frame alone; neither path
+        changes the depth reuse or running normalization the pipeline relies on.
+        """
+        if depth is None:
+            depth = self.depth_estimator.cached(frame_index) or self.depth_estimator.estimate_single(frame)
+        depth_normalized = depth.full()
         depth_map = depth_normalized.astype(np.uint8)
         return cv2.applyColorMap(depth_map, cv2.COLORMAP_JET)
\ No newline at end of file
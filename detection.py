@@ -1,16 +1,27 @@
 import cv2
 import numpy as np
-import torch
 from collections import defaultdict
 from ultralytics import YOLO
-import torchvision.transforms as T
 from collections import deque
+from depth_estimation import DepthEstimator
+from inference import InferenceEngine
+from optical_flow import OpticalFlow
+
+VEHICLE_CLASSES = [2, 3, 4, 6, 8]  # bicycle, car, motorcycle, bus, truck
 
 class Detector:
-    def __init__(self, vehicle_model_path, trash_model_path):
-        """Initialize the Detector with vehicle and trash YOLO models and MiDaS."""
-        self.vehicle_model = YOLO(vehicle_model_path)
-        self.trash_model = YOLO(trash_model_path)
+    def __init__(self, vehicle_model_path, trash_model_path, depth_estimator=None, flow_mode="roi", flow_scale=1.0, cascade=False, cascade_full_interval=30, cascade_margin=150,
+                 depth_sampling="median"):
+        """Initialize the Detector with vehicle and trash YOLO models and a shared MiDaS estimator.
+
+        depth_sampling picks each detection's depth: "median" over its box or "center" (bilinear at the box center).
+        The model paths may also be already built models, e.g. lazy ones from ModelRegistry.detector_models.
+        cascade_margin is how far (in frame pixels) around each vehicle the trash cascade looks; the
+        default matches the 150px trash-vehicle association gate, so raise it with the resolution.
+        """
+        # .onnx paths (see backends.py) run through ONNX Runtime with the same results API
+        self.vehicle_model = self._load_model(vehicle_model_path)
+        self.trash_model = self._load_model(trash_model_path)
         self.trails = defaultdict(list)
         self.font = cv2.FONT_HERSHEY_SIMPLEX
         self.id_font_size = 0.5
@@ -25,81 +36,82 @@ class Detector:
             "POTENTIAL_THROW": (255, 0, 255),
             "DECELERATING_NEAR_TRASH": (255, 255, 0)
         }
-        # Initialize MiDaS for depth estimation
-        self.midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small", pretrained=True)
-        self.midas.eval()
-        self.midas.to('cpu')
-        self.transform = T.Compose([
-            T.ToTensor(),
-            T.Resize((384, 384)),
-            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        self.prev_frame = None  # For optical flow
-
-    def detect(self, frame):
+        # MiDaS depth estimation, shared with the depth visualizer
+        self.depth_estimator = depth_estimator or DepthEstimator()
+        # Runs both YOLO models and MiDaS concurrently on each frame; in cascade mode the trash
+        # model only looks within the 150px association gate around vehicles
+        self.engine = InferenceEngine(self.vehicle_model, self.trash_model, self.depth_estimator,
+                                      vehicle_conf=0.5, trash_conf=0.3,
+                                      cascade=cascade, cascade_classes=VEHICLE_CLASSES, cascade_margin=cascade_margin,
+                                      cascade_full_interval=cascade_full_interval)
+        self.optical_flow = OpticalFlow(flow_mode, flow_scale)
+        self.depth_sampling = depth_sampling
+
+    def _load_model(self, model):
+        return YOLO(model, task="detect") if isinstance(model, str) else model
+
+    def detect(self, frame, frame_index=None):
         """Detect vehicles and trash in the frame with depth estimation."""
+        vehicle_boxes, trash_boxes, depth = self.engine.infer(frame, frame_index)
+        return self._build_detections(vehicle_boxes, trash_boxes, depth)
+
+    def detect_batch(self, frames, frame_indices=None):
+        """Detect vehicles and trash in a stack of frames with one batched call per model."""
+        return [detections for detections, _ in self.detect_batch_with_depth(frames, frame_indices)]
+
+    def detect_batch_with_depth(self, frames, frame_indices=None):
+        """Like detect_batch, but a (detections, DepthMap) pair per frame, for callers that also draw depth."""
+        return [(self._build_detections(vehicle_boxes, trash_boxes, depth), depth)
+                for vehicle_boxes, trash_boxes, depth in self.engine.infer_batch(frames, frame_indices)]
+
+    def _build_detections(self, vehicle_boxes, trash_boxes, depth):
+        """Convert raw model boxes into detection dicts with depth-augmented centers."""
         detections = []
-        # Prepare frame for MiDaS
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img_input = self.transform(img_rgb).unsqueeze(0).to('cpu')
-        with torch.no_grad():
-            depth = self.midas(img_input)
-            depth = torch.nn.functional.interpolate(
-                depth.unsqueeze(1), size=frame.shape[:2], mode="bicubic", align_corners=False
-            ).squeeze().cpu().numpy()
-        # Normalize depth to 0-255
-        depth = (depth - depth.min()) / (depth.max() - depth.min()) * 255.0
-        
-        # Detect vehicles with expanded classes
-        vehicle_results = self.vehicle_model(frame, conf=0.5, verbose=False)
-        for result in vehicle_results:
-            for box in result.boxes:
-                bbox = box.xyxy[0].cpu().numpy()
-                class_id = int(box.cls[0].cpu().numpy())
-                # Updated to include more vehicle classes
-                if class_id in [2, 3, 4, 6, 8]:  # bicycle, car, motorcycle, bus, truck
-                    x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
-                    z = depth[int(y), int(x)]
-                    center = (x, y, z)
-                    detections.append({
-                        'bbox': bbox,
-                        'class_id': class_id,
-                        'type': 'vehicle',
-                        'center': center,
-                        'confidence': box.conf[0].cpu().numpy()  # Added confidence
-                    })
-        
-        # Detect trash with lower confidence threshold
-        trash_results = self.trash_model(frame, conf=0.3, verbose=False)
-        for result in trash_results:
-            for box in result.boxes:
-                bbox = box.xyxy[0].cpu().numpy()
-                class_id = int(box.cls[0].cpu().numpy())
-                if class_id == 1:  # 1: trash
-                    x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
-                    z = depth[int(y), int(x)]
-                    center = (x, y, z)
-                    detections.append({
-                        'bbox': bbox,
-                        'class_id': class_id,
-                        'type': 'trash',
-                        'center': center,
-                        'depth_history': deque(maxlen=10),
-                        'trajectory': deque(maxlen=10),
-                        'confidence': box.conf[0].cpu().numpy()  # Added confidence
-                    })
+        # Vehicles with expanded classes
+        for bbox, conf, class_id in zip(*vehicle_boxes):
+            # Updated to include more vehicle classes
+            if class_id in VEHICLE_CLASSES:
+                x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+                center = (x, y, self._sample_depth(depth, bbox, x, y))
+                detections.append({
+                    'bbox': bbox,
+                    'class_id': int(class_id),
+                    'type': 'vehicle',
+                    'center': center,
+                    'confidence': conf  # Added confidence
+                })
+
+        # Trash detected with lower confidence threshold
+        for bbox, conf, class_id in zip(*trash_boxes):
+            if class_id == 1:  # 1: trash
+                x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+                center = (x, y, self._sample_depth(depth, bbox, x, y))
+                detections.append({
+                    'bbox': bbox,
+                    'class_id': int(class_id),
+                    'type': 'trash',
+                    'center': center,
+                    'depth_history': deque(maxlen=10),
+                    'trajectory': deque(maxlen=10),
+                    'confidence': conf  # Added confidence
+                })
         return detections
 
-    def compute_optical_flow(self, frame):
-        """Compute optical flow between consecutive frames."""
-        if self.prev_frame is None:
-            self.prev_frame = frame.copy()
-            return None
-        prev_gray = cv2.cvtColor(self.prev_frame, cv2.COLOR_BGR2GRAY)
-        current_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        flow = cv2.calcOpticalFlowFarneback(prev_gray, current_gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-        self.prev_frame = frame.copy()
-        return flow
+    def _sample_depth(self, depth, bbox, x, y):
+        """Depth of one detection, read from the low-resolution DepthMap."""
+        if self.depth_sampling == "median":
+            return depth.box_median(bbox)
+        return float(depth.sample(x, y))
+
+    def reset(self):
+        """Forget per-video state (optical flow reference frame, trails, trash cascade schedule) before a new video."""
+        self.optical_flow.reset()
+        self.trails.clear()
+        self.engine.reset()
+
+    def compute_optical_flow(self, frame, rois=None):
+        """Compute optical flow between consecutive frames, over rois or the whole frame."""
+        return self.optical_flow.compute(frame, rois)
 
     def visualize(self, frame, detections, tracking_data):
         """Visualize detections with bounding boxes, trails, and a state panel."""
@@ -1,35 +1,83 @@
 import numpy as np
 from collections import deque
 from datetime import datetime
-import cv2
-from scipy.optimize import linear_sum_assignment
+from assignment import pairwise_distances, gated_assignment
+from frame_buffer import FrameBuffer
+from spatial_index import UniformGrid
+
+class EventAggregator:
+    def __init__(self, cooldown=90):
+        """Fold repeated triggers for one vehicle into a single incident.
+
+        A trigger less than cooldown frames after the vehicle's last one extends its open incident
+        (end_frame, triggers, event_types) instead of starting a new event.
+        """
+        self.cooldown = cooldown
+        self.open = {}  # vehicle id -> its latest incident, while within the cooldown
+
+    def extend(self, vehicle_id, frame_index, event_type):
+        """Fold a trigger into the vehicle's open incident and return it, or None if a new incident starts."""
+        incident = self.open.get(vehicle_id)
+        if incident is None or frame_index - incident["end_frame"] >= self.cooldown:
+            return None
+        incident["end_frame"] = frame_index
+        incident["triggers"] += 1
+        if event_type not in incident["event_types"]:
+            incident["event_types"].append(event_type)
+        return incident
+
+    def start(self, vehicle_id, frame_index, event):
+        """Open a new incident for the vehicle with event as its record."""
+        event.update(start_frame=frame_index, end_frame=frame_index, triggers=1, event_types=[event["event_type"]])
+        self.open[vehicle_id] = event
+
+    def expire(self, frame_index):
+        """Close incidents whose cooldown has run out."""
+        for vehicle_id in [v for v, incident in self.open.items() if frame_index - incident["end_frame"] >= self.cooldown]:
+            del self.open[vehicle_id]
 
 class EventDetector:
-    def __init__(self, temporal_window=10, min_holding=15, min_disposal=20, min_throw=5, depth_threshold=50):
-        """Initialize the EventDetector with event detection parameters."""
-        self.events_data = []
+    def __init__(self, temporal_window=10, min_holding=15, min_disposal=20, min_throw=5, depth_threshold=50,
+                 evidence_frames=30, compress_frames=False, event_cooldown=90, max_events=None):
+        """Initialize the EventDetector with event detection parameters.
+
+        Triggers for a vehicle within event_cooldown frames of its previous one are merged into
+        that incident (see EventAggregator), so each incident is one event with one set of evidence.
+        max_events bounds the incident log for long-running sources (None keeps every incident).
+        """
+        self.events_data = deque(maxlen=max_events)  # append-only log of incidents
+        self.new_events = []  # incidents started by the last process() call
+        self.aggregator = EventAggregator(event_cooldown)
+        self.frame_index = -1
         self.temporal_window = temporal_window
         self.min_holding = min_holding
         self.min_disposal = min_disposal
         self.min_throw = min_throw
         self.depth_threshold = depth_threshold
         self.max_depth = 255
+        self.evidence_frames = evidence_frames
+        # One copy of each recent frame, shared by all vehicles; tracks keep only frame ids
+        self.frame_buffer = FrameBuffer(evidence_frames, compress_frames)
+
+    def process(self, tracking_data, detections, frame, flow=None, frame_index=None):
+        """Process tracking data to detect disposal events with improved association.
 
-    def process(self, tracking_data, detections, frame, flow=None):
-        """Process tracking data to detect disposal events with improved association."""
-        vehicle_tracks = {tid: t for tid, t in tracking_data.items() if t["type"] == "vehicle"}
+        frame_index numbers incidents' start and end frames; without it, calls are counted.
+        """
+        self.frame_index = self.frame_index + 1 if frame_index is None else frame_index
+        self.new_events = []
+        self.aggregator.expire(self.frame_index)
+        self._init_track_buffers(tracking_data)
+        vehicle_ids, slots = tracking_data.slots("vehicle")
+        vehicle_centers = tracking_data.ring("center").last(slots)
         trash_detections = [d for d in detections if d["class_id"] == 1]
         
         # Feature 3: Improved Trash-Vehicle Association
-        if vehicle_tracks and trash_detections:
-            cost_matrix = np.zeros((len(trash_detections), len(vehicle_tracks)))
-            for i, trash in enumerate(trash_detections):
-                for j, (tid, vehicle) in enumerate(vehicle_tracks.items()):
-                    cost_matrix[i, j] = self._calc_distance(trash["center"], vehicle["center"][-1])
-            row_idx, col_idx = linear_sum_assignment(cost_matrix)
+        if len(slots) and trash_detections:
+            cost_matrix = pairwise_distances([trash["center"] for trash in trash_detections], vehicle_centers)
+            row_idx, col_idx = gated_assignment(cost_matrix, 150)
             for r, c in zip(row_idx, col_idx):
-                if cost_matrix[r, c] < 150:
-                    trash_detections[r]["assigned_vehicle"] = list(vehicle_tracks.keys())[c]
+                trash_detections[r]["assigned_vehicle"] = int(vehicle_ids[c])
         
         # Feature 4: Update trash depth history
         for det in trash_detections:
@@ -38,56 +86,58 @@ class EventDetector:
                 det["trajectory"] = deque(maxlen=10)
             det["trajectory"].append(det["center"][:2])
         
-        for tid, track in vehicle_tracks.items():
-            self._init_track_buffers(track)
-            trash_near, nearest_trash = self._check_trash_proximity(track, trash_detections)
-            track["proximity_buffer"].append(1 if trash_near else 0)
-            track["throw_buffer"].append(1 if trash_near else 0)
-            track["frames"].append(frame.copy())
-            avg_vel = track.get('smoothed_velocity', 0)
-            avg_area = np.mean(track["area_history"]) if track["area_history"] else 0
-            stop_thresh, move_thresh = self._get_dynamic_thresholds(avg_area)
-            self._update_vehicle_state(track, tid, avg_vel, stop_thresh, move_thresh, nearest_trash, flow)
-
-    def _init_track_buffers(self, track):
-        """Initialize buffers for tracking state and frames."""
-        if "proximity_buffer" not in track:
-            track.update({
-                "proximity_buffer": deque([0] * self.temporal_window, maxlen=self.temporal_window),
-                "throw_buffer": deque([0] * self.min_throw, maxlen=self.min_throw),
-                "frames": deque(maxlen=30),
-                "state": "IDLE",
-                "no_trash_count": 0,
-                "disposal_location": None
-            })
-
-    def _check_trash_proximity(self, track, detections):
-        """Check if trash is near the vehicle with adaptive threshold."""
-        nearest_trash = None
-        min_distance = float('inf')
-        vehicle_z = track["center"][-1][2]
-        vehicle_area = (track['bbox'][2] - track['bbox'][0]) * (track['bbox'][3] - track['bbox'][1])
-        adaptive_threshold = 150 * (vehicle_area / 100000) ** 0.5
-        
-        for det in detections:
-            if det["class_id"] == 1 and (not det.get("assigned_vehicle") or det["assigned_vehicle"] == track.get("id")):
-                distance = self._calc_distance(track["center"][-1], det["center"])
-                trash_z = det["center"][2]
-                depth_diff = abs(vehicle_z - trash_z)
-                if distance < adaptive_threshold and depth_diff < self.depth_threshold:
-                    if distance < min_distance:
-                        min_distance = distance
-                        nearest_trash = det
-        return nearest_trash is not None, nearest_trash
+        if not len(slots):
+            return
+        frame_id = self.frame_buffer.push(frame)
+        nearest = self._nearest_trash(vehicle_ids, vehicle_centers, tracking_data.column("bbox")[slots],
+                                      trash_detections)
+        trash_near = np.array([trash is not None for trash in nearest], dtype=np.uint8)
+        tracking_data.ring("proximity_buffer").append(slots, trash_near)
+        tracking_data.ring("throw_buffer").append(slots, trash_near)
+        tracking_data.ring("frame_ids").append(slots, frame_id)
+        avg_vel = tracking_data.column("smoothed_velocity")[slots]
+        stop_thresh, move_thresh = self._get_dynamic_thresholds(tracking_data.ring("area_history").mean(slots))
+        # Only vehicles that are past IDLE or meet a condition for leaving it go through the state machine
+        is_stopped = avg_vel < stop_thresh
+        is_slowed = ~is_stopped & (avg_vel < move_thresh)
+        holding = tracking_data.ring("proximity_buffer").sum(slots) >= self.min_holding
+        throwing = tracking_data.ring("throw_buffer").sum(slots) >= self.min_throw
+        idle = tracking_data.isin("state", ["IDLE"], slots)
+        update = ~idle | (is_stopped & holding) | (is_slowed & (throwing | trash_near.astype(bool)))
+        for i in np.flatnonzero(update):
+            tid = int(vehicle_ids[i])
+            self._update_vehicle_state(tracking_data[tid], tid, avg_vel[i], stop_thresh[i], move_thresh[i],
+                                       nearest[i], flow)
+
+    def _init_track_buffers(self, tracking_data):
+        """Register per-track buffers for tracking state and evidence frame ids with the tracker's track table."""
+        tracking_data.add_ring("proximity_buffer", self.temporal_window, dtype=np.uint8, fill=0)
+        tracking_data.add_ring("throw_buffer", self.min_throw, dtype=np.uint8, fill=0)
+        tracking_data.add_ring("frame_ids", self.evidence_frames, dtype=np.int64)
+        tracking_data.add_field("no_trash_count", dtype=np.int64, default=0)
+        tracking_data.add_field("disposal_location", shape=(3,), default=None, optional=True)
+
+    def _nearest_trash(self, vehicle_ids, centers, bboxes, trash_detections):
+        """Nearest trash to each vehicle within its adaptive (size-scaled) radius, or None per vehicle.
+
+        Trash assigned to another vehicle is skipped. All vehicles are queried at once against a
+        uniform grid over this frame's trash centers.
+        """
+        if not len(vehicle_ids) or not trash_detections:
+            return [None] * len(vehicle_ids)
+        vehicle_area = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        radii = 150 * (vehicle_area / 100000) ** 0.5
+        owners = np.array([det.get("assigned_vehicle", -1) for det in trash_detections])
+        grid = UniformGrid([det["center"] for det in trash_detections], cell_size=max(radii.max(), 1.0))
+        indices, _ = grid.nearest_within(centers, radii, max_dz=self.depth_threshold,
+                                         owners=owners, groups=vehicle_ids)
+        return [trash_detections[i] if i >= 0 else None for i in indices]
 
     def _get_dynamic_thresholds(self, avg_area):
-        """Get dynamic velocity thresholds based on vehicle size."""
-        if avg_area > 100000:
-            return 0.2, 1.0
-        elif avg_area > 20000:
-            return 0.4, 2.0
-        else:
-            return 0.8, 4.0
+        """Get dynamic velocity thresholds, per vehicle, based on vehicle size."""
+        stop_thresh = np.select([avg_area > 100000, avg_area > 20000], [0.2, 0.4], 0.8)
+        move_thresh = np.select([avg_area > 100000, avg_area > 20000], [1.0, 2.0], 4.0)
+        return stop_thresh, move_thresh
 
     def _analyze_velocity_trend(self, track):
         """Analyze velocity trend for behavior analysis."""
@@ -111,10 +161,10 @@ class EventDetector:
         velocity_trend = self._analyze_velocity_trend(track)
         
         if track["state"] == "IDLE":
-            if is_stopped and sum(track["proximity_buffer"]) >= self.min_holding:
+            if is_stopped and np.sum(track["proximity_buffer"]) >= self.min_holding:
                 track["state"] = "STOPPED_UNLOADING"
                 track["disposal_location"] = track["center"][-1]
-            elif is_slowed and sum(track["throw_buffer"]) >= self.min_throw:
+            elif is_slowed and np.sum(track["throw_buffer"]) >= self.min_throw:
                 track["state"] = "SLOWING_THROW"
                 track["disposal_location"] = track["center"][-1]
             elif velocity_trend < -0.1 and is_slowed and nearest_trash:
@@ -132,9 +182,7 @@ class EventDetector:
                     self._record_event(tid, track, "DEPTH_CONFIRMED_DISPOSAL")
                 elif flow is not None and nearest_trash:
                     x, y = map(int, nearest_trash["center"][:2])
-                    flow_region = flow[max(0, y-10):min(flow.shape[0], y+10), max(0, x-10):min(flow.shape[1], x+10)]
-                    mag, _ = cv2.cartToPolar(flow_region[..., 0], flow_region[..., 1])
-                    if np.mean(mag) > 1.0:
+                    if flow.region_magnitude(x - 10, y - 10, x + 10, y + 10) > 1.0:
                         track["state"] = "POTENTIAL_THROW"
                         self._record_event(tid, track, "FLOW_DETECTED_THROW")
             else:
@@ -155,19 +203,22 @@ class EventDetector:
         direction = trash_pos - vehicle_pos
         return np.dot(movement, direction) > 0
 
-    def _calc_distance(self, p1, p2):
-        """Calculate 3D Euclidean distance between two points."""
-        return np.sqrt(sum((a - b) ** 2 for a, b in zip(p1, p2)))
-
     def _record_event(self, tid, track, event_type):
-        """Record a detected event."""
+        """Record a detected event, copying its evidence frames out of the shared frame buffer.
+
+        A repeated trigger for a vehicle's open incident only extends that incident's span.
+        """
+        if self.aggregator.extend(tid, self.frame_index, event_type) is not None:
+            return
         event = {
             "timestamp": datetime.now(),
             "vehicle_id": tid,
             "event_type": event_type,
             "location": track["disposal_location"],
             "velocity": track.get('smoothed_velocity', 0),
-            "frames": list(track["frames"]),
+            "frames": self.frame_buffer.get_many(track["frame_ids"]),
             "state": track["state"]
         }
-        self.events_data.append(event)
\ No newline at end of file
+        self.aggregator.start(tid, self.frame_index, event)
+        self.events_data.append(event)
+        self.new_events.append(event)
\ No newline at end of file
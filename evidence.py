@@ -0,0 +1,215 @@
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import cv2
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as ExcelImage
+from metrics import METRICS
+
+REPORT_HEADERS = ["Timestamp", "Vehicle ID", "Type", "Location", "Start Frame", "End Frame", "Start Time", "End Time", "Frames"]
+SPAN_COLUMNS = 4  # Start Frame .. End Time: the incident's first and last trigger
+CLIP_CODECS = (("avc1", ".mp4"), ("MJPG", ".avi"))  # H.264 where OpenCV was built with it, else MJPEG
+
+def video_time(frame_index, fps):
+    """Position of a frame in the video as H:MM:SS.ss, or "" if unknown."""
+    if frame_index is None:
+        return ""
+    minutes, seconds = divmod(frame_index / (fps or 30.0), 60)
+    return f"{int(minutes // 60)}:{int(minutes % 60):02d}:{seconds:05.2f}"
+
+def clip_hash(frames):
+    """Content hash of a clip's frames; identical evidence gets the same name."""
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        digest.update(memoryview(frame).cast("B"))
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def clip_codec():
+    """(fourcc, extension) of the first CLIP_CODECS entry this OpenCV build can write."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, ext in CLIP_CODECS:
+            writer = cv2.VideoWriter(os.path.join(tmp, "probe" + ext), cv2.VideoWriter_fourcc(*codec), 30.0, (64, 64))
+            opened = writer.isOpened()
+            writer.release()
+            if opened:
+                return codec, ext
+    raise IOError("No usable video codec for evidence clips")
+
+def write_clip(path, frames, fps=30.0):
+    """Encode frames into one video file with clip_codec()."""
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*clip_codec()[0]), fps, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+def thumbnail_png(frame, size=(400, 300)):
+    """PNG bytes of a frame shrunk to fit within size, keeping its aspect ratio."""
+    height, width = frame.shape[:2]
+    scale = min(1.0, size[0] / width, size[1] / height)
+    if scale < 1.0:
+        frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".png", frame)[1].tobytes()
+
+class EvidenceWriter:
+    def __init__(self, evidence_path, report_path, location, workers=2, fps=30.0, post_roll=15, report_id=None):
+        """Write event evidence in the background while a video is still being processed.
+
+        Each event becomes one video clip: the frames the event carries (pre-roll) plus the next
+        post_roll frames passed to add_frame(). Clips are named by a hash of their frames, so a
+        duplicate event (same vehicle, same frames) reuses the existing clip instead of writing it
+        again. The event's own frame is also saved as a JPEG keyframe, and used as the report
+        thumbnail. Encoding runs on a thread pool. Finished events are added to the report in the
+        order they were submitted. The CSV report is written row by row; close() saves the Excel workbook.
+        Report files are named report_<time>_<report_id>, with a random id by default, so writers
+        finishing in the same second (concurrent jobs) never share a file.
+        """
+        self.evidence_base = evidence_path
+        self.location = location
+        self.fps = fps
+        self.post_roll = post_roll
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evidence")
+        name = f"report_{datetime.now().strftime('%Y%m%d%H%M%S')}_{report_id or uuid.uuid4().hex[:8]}"
+        self.report_path = os.path.join(report_path, name + ".xlsx")
+        self.csv_path = os.path.join(report_path, name + ".csv")
+        self.workbook = Workbook()
+        self.sheet = self.workbook.active
+        self.sheet.append(REPORT_HEADERS)
+        self.csv_file = None
+        self.pending = []  # clips still collecting post-roll frames
+        self.futures = []
+        self.results = {}  # submission index -> finished evidence entry, until its row is written
+        self.next_row = 0
+        self.clips = {}  # content hash -> clip path, for clips written by this writer
+        self.evidence = []
+        self.error = None
+        self.lock = threading.Lock()
+
+    def submit(self, event):
+        """Start an event's clip; it's encoded once its post-roll frames have arrived."""
+        clip = {"index": len(self.futures) + len(self.pending), "event": event,
+                "frames": list(event["frames"]), "keyframe": len(event["frames"]) - 1, "remaining": self.post_roll}
+        if clip["remaining"] > 0:
+            self.pending.append(clip)
+        else:
+            self._dispatch(clip)
+
+    def add_frame(self, frame):
+        """Feed a frame that follows the submitted events, as post-roll for their clips."""
+        if not self.pending:
+            return
+        frame = frame.copy()  # frames may be drawn on after this
+        for clip in self.pending:
+            clip["frames"].append(frame)
+            clip["remaining"] -= 1
+        for clip in [clip for clip in self.pending if clip["remaining"] <= 0]:
+            self.pending.remove(clip)
+            self._dispatch(clip)
+
+    def _dispatch(self, clip):
+        with self.lock:
+            future = self.pool.submit(self._timed_write, clip)
+            self.futures.append(future)
+        future.add_done_callback(self._on_done)
+
+    def _timed_write(self, clip):
+        with METRICS.time("reporting"):
+            return self._write(clip)
+
+    def _write(self, clip):
+        """Worker: hash, encode and write one event's clip and keyframe."""
+        event, frames = clip["event"], clip["frames"]
+        entry = {
+            "path": None,
+            "timestamp": event["timestamp"],
+            "vehicle_id": event["vehicle_id"],
+            "type": ", ".join(event.get("event_types") or [event["event_type"]]),
+            "start_frame": event.get("start_frame"),
+            "end_frame": event.get("end_frame"),
+            "frames": len(frames),
+            "thumbnails": []
+        }
+        if not frames:
+            return clip["index"], entry
+        digest = clip_hash(frames)
+        path = os.path.join(self.evidence_base, f"clip_{digest}{clip_codec()[1]}")
+        keyframe = frames[max(0, clip["keyframe"])]
+        with self.lock:
+            # A duplicate of a clip written earlier, or being written by another worker, isn't written again
+            claimed = digest not in self.clips and not os.path.exists(path)
+            self.clips.setdefault(digest, path)
+        if claimed:
+            os.makedirs(self.evidence_base, exist_ok=True)
+            cv2.imwrite(os.path.splitext(path)[0] + ".jpg", keyframe)
+            write_clip(path, frames, self.fps)
+        entry["path"] = path
+        entry["thumbnails"].append(thumbnail_png(keyframe))
+        return clip["index"], entry
+
+    def _on_done(self, future):
+        if future.exception() is not None:
+            return  # raised again by close()
+        index, entry = future.result()
+        with self.lock:
+            self.results[index] = entry
+            try:
+                while self.next_row in self.results:
+                    self._append_row(self.results.pop(self.next_row))
+                    self.next_row += 1
+            except Exception as e:
+                self.error = self.error or e
+
+    def _append_row(self, entry):
+        row = [
+            entry["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+            entry["vehicle_id"],
+            entry["type"],
+            self.location,
+            entry["start_frame"],
+            entry["end_frame"],
+            video_time(entry["start_frame"], self.fps),
+            video_time(entry["end_frame"], self.fps),
+            entry["frames"]
+        ]
+        self.sheet.append(row)
+        for i, png in enumerate(entry.pop("thumbnails"), start=len(row) + 1):
+            self.sheet.column_dimensions[chr(64 + i)].width = 40
+            self.sheet.add_image(ExcelImage(io.BytesIO(png)), f"{chr(64 + i)}{self.sheet.max_row}")
+        if self.csv_file is None:
+            self.csv_file = open(self.csv_path, "w", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(REPORT_HEADERS[:4 + SPAN_COLUMNS] + ["Evidence"])
+        self.csv_writer.writerow(row[:4 + SPAN_COLUMNS] + [entry["path"]])
+        self.csv_file.flush()
+        self.evidence.append(entry)
+
+    def close(self):
+        """Encode clips still waiting for post-roll, wait for all evidence and save the report.
+
+        Returns the report path, or None without events.
+        """
+        for clip in self.pending:
+            self._dispatch(clip)
+        self.pending = []
+        self.pool.shutdown(wait=True)
+        try:
+            for future in self.futures:
+                future.result()
+            if self.error is not None:
+                raise self.error
+        finally:
+            if self.csv_file is not None:
+                self.csv_file.close()
+        if not self.futures:
+            return None
+        with METRICS.time("report_save"):
+            self.workbook.save(self.report_path)
+        return self.report_path
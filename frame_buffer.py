@@ -0,0 +1,47 @@
+import cv2
+
+class FrameBuffer:
+    def __init__(self, maxlen=30, compress=False, jpeg_quality=90):
+        """Shared ring of the most recent frames, so tracks can hold frame ids instead of frame copies.
+
+        With compress=True frames are kept as JPEG bytes and decoded only when read back.
+        """
+        self.maxlen = maxlen
+        self.compress = compress
+        self.jpeg_quality = jpeg_quality
+        self.ids = [-1] * maxlen
+        self.frames = [None] * maxlen
+        self.next_id = 0
+
+    def push(self, frame):
+        """Store one frame and return its id."""
+        frame_id = self.next_id
+        self.next_id += 1
+        if self.compress:
+            ok, payload = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                raise ValueError("Could not encode frame as JPEG")
+        else:
+            payload = frame.copy()  # the caller may draw on its frame afterwards
+        slot = frame_id % self.maxlen
+        self.ids[slot] = frame_id
+        self.frames[slot] = payload
+        return frame_id
+
+    def get(self, frame_id):
+        """Return the frame with this id, or None once it has been overwritten."""
+        slot = frame_id % self.maxlen
+        if self.ids[slot] != frame_id:
+            return None
+        if self.compress:
+            return cv2.imdecode(self.frames[slot], cv2.IMREAD_COLOR)
+        return self.frames[slot]
+
+    def get_many(self, frame_ids):
+        """Frames for frame_ids, in order, skipping any that are no longer buffered."""
+        frames = [self.get(int(frame_id)) for frame_id in frame_ids]
+        return [frame for frame in frames if frame is not None]
+
+    def clear(self):
+        self.ids = [-1] * self.maxlen
+        self.frames = [None] * self.maxlen
@@ -38,11 +38,6 @@ export function VideoUpload() {
     setError(null);
     setEvents([]);
 
-    // fake‐progress until we get a response
-    const timer = setInterval(() => {
-      setProgress((p) => Math.min(p + 15, 85));
-    }, 300);
-
     try {
       const form = new FormData();
       form.append('file', videoFile);
@@ -51,14 +46,29 @@ export function VideoUpload() {
         method: 'POST',
         body: form,
       });
-      clearInterval(timer);
 
       if (!res.ok) {
         throw new Error(`Server returned ${res.status}`);
       }
-      const json = await res.json();
-      setResult(json);
-      setEvents(json.events || []);
+      const { jobId } = await res.json();
+
+      // processing runs in the background; poll the job until it finishes
+      let job;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const statusRes = await fetch(`http://localhost:5000/api/jobs/${jobId}`);
+        if (!statusRes.ok) {
+          throw new Error(`Server returned ${statusRes.status}`);
+        }
+        job = await statusRes.json();
+        setProgress(job.progress);
+      } while (job.status === 'queued' || job.status === 'running');
+
+      if (job.status === 'failed') {
+        throw new Error(job.error);
+      }
+      setResult(job);
+      setEvents(job.events || []);
       setProgress(100);
     } catch (err) {
       setError(`Upload failed: ${err.message}`);
@@ -0,0 +1,24 @@
+def merge_rects(rects):
+    """Merge overlapping (x1, y1, x2, y2) rectangles until none overlap, dropping empty ones."""
+    rects = [r for r in rects if r[0] < r[2] and r[1] < r[3]]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for rect in rects:
+            for i, other in enumerate(result):
+                if rect[0] < other[2] and other[0] < rect[2] and rect[1] < other[3] and other[1] < rect[3]:
+                    result[i] = (min(rect[0], other[0]), min(rect[1], other[1]),
+                                 max(rect[2], other[2]), max(rect[3], other[3]))
+                    merged = True
+                    break
+            else:
+                result.append(rect)
+        rects = result
+    return rects
+
+def pad_box(bbox, margin, width, height):
+    """Integer box grown by margin pixels on every side, clipped to a width x height frame."""
+    x1, y1, x2, y2 = bbox
+    return (max(0, int(x1) - margin), max(0, int(y1) - margin),
+            min(width, int(x2) + margin), min(height, int(y2) + margin))
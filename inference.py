@@ -0,0 +1,159 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
+from geometry import merge_rects, pad_box
+from metrics import METRICS
+
+Boxes = namedtuple("Boxes", ["xyxy", "conf", "cls"])
+
+def letterbox(frame, imgsz=640, stride=32, color=(114, 114, 114)):
+    """Resize and pad the frame to the smallest stride-aligned rectangle that fits imgsz."""
+    h, w = frame.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_w = (stride - new_w % stride) % stride
+    pad_h = (stride - new_h % stride) % stride
+    left, top = pad_w // 2, pad_h // 2
+    img = cv2.copyMakeBorder(frame, top, pad_h - top, left, pad_w - left, cv2.BORDER_CONSTANT, value=color)
+    return img, ratio, (left, top)
+
+def scale_boxes(xyxy, ratio, pad, frame_shape):
+    """Map letterboxed xyxy boxes back onto the original frame."""
+    xyxy = xyxy.copy()
+    xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / ratio
+    xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / ratio
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_shape[1])
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_shape[0])
+    return xyxy
+
+def empty_boxes():
+    return Boxes(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int))
+
+def configure_threads(intra_op_threads=None, engines=1):
+    """Set torch's intra-op thread count for the whole process; call once at startup, not per engine.
+
+    By default the cores are split between the three models each of engines concurrent
+    InferenceEngines runs at once.
+    """
+    if intra_op_threads is None:
+        intra_op_threads = max(1, (os.cpu_count() or 1) // (3 * engines))
+    torch.set_num_threads(intra_op_threads)
+
+class InferenceEngine:
+    def __init__(self, vehicle_model, trash_model, depth_estimator, vehicle_conf=0.5, trash_conf=0.3,
+                 imgsz=640, cascade=False, cascade_classes=(), cascade_margin=150,
+                 cascade_full_interval=30):
+        """Run both YOLO models and MiDaS concurrently on one shared letterboxed frame.
+
+        In cascade mode the trash model only sees crops around vehicles (vehicle boxes of
+        cascade_classes grown by cascade_margin pixels), batched into one call at the same scale as a
+        full frame. Every cascade_full_interval-th frame of each stream still runs it on the full frame;
+        streams are told apart by the first element of (stream, frame) tuple indices, as in DepthEstimator.
+        Torch's thread count is process-wide and set once by configure_threads.
+        """
+        self.vehicle_model = vehicle_model
+        self.trash_model = trash_model
+        self.depth_estimator = depth_estimator
+        self.vehicle_conf = vehicle_conf
+        self.trash_conf = trash_conf
+        self.imgsz = imgsz
+        self.cascade = cascade
+        self.cascade_classes = list(cascade_classes)
+        self.cascade_margin = cascade_margin
+        self.cascade_full_interval = cascade_full_interval
+        self.frames_since_full = {}  # stream -> frames since its last full-frame trash pass
+        self.pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="inference")
+
+    def infer(self, frame, frame_index=None):
+        """Return (vehicle Boxes, trash Boxes, depth map) for a single frame."""
+        return self.infer_batch([frame], [frame_index])[0]
+
+    def infer_batch(self, frames, frame_indices=None):
+        """Return a (vehicle Boxes, trash Boxes, depth map) tuple per frame, batching each model over the stack."""
+        # Letterbox once; ultralytics leaves an already stride-aligned image untouched
+        letterboxed = [letterbox(frame, self.imgsz) for frame in frames]
+        vehicle_future = self.pool.submit(self._run_yolo, self.vehicle_model, letterboxed, self.vehicle_conf, frames,
+                                          "vehicle_yolo")
+        depth_future = self.pool.submit(self.depth_estimator.estimate_batch, frames, frame_indices)
+        if self.cascade:
+            # Trash crops depend on the vehicle boxes, so the trash model runs after the vehicle model
+            vehicle_boxes = vehicle_future.result()
+            trash_boxes = self._run_trash_cascade(letterboxed, frames, vehicle_boxes, frame_indices)
+        else:
+            trash_future = self.pool.submit(self._run_yolo, self.trash_model, letterboxed, self.trash_conf, frames,
+                                            "trash_yolo")
+            vehicle_boxes, trash_boxes = vehicle_future.result(), trash_future.result()
+        return list(zip(vehicle_boxes, trash_boxes, depth_future.result()))
+
+    def _run_yolo(self, model, letterboxed, conf, frames, stage):
+        """Run one YOLO model over the batch and return its boxes in original frame coordinates."""
+        with METRICS.time(stage):
+            results = model([img for img, _, _ in letterboxed], conf=conf, imgsz=self.imgsz, verbose=False)
+        batch_boxes = []
+        for result, (_, ratio, pad), frame in zip(results, letterboxed, frames):
+            xyxy = result.boxes.xyxy.cpu().numpy()
+            batch_boxes.append(Boxes(
+                scale_boxes(xyxy, ratio, pad, frame.shape),
+                result.boxes.conf.cpu().numpy(),
+                result.boxes.cls.cpu().numpy().astype(int)
+            ))
+        return batch_boxes
+
+    def _run_trash_cascade(self, letterboxed, frames, vehicle_boxes, frame_indices=None):
+        """Trash boxes per frame from full frames when one is due, otherwise from crops around vehicles."""
+        trash_boxes = [empty_boxes() for _ in frames]
+        full, crops = [], []  # crops: (frame position, x1, y1, scale, resized crop)
+        for i, (frame, (_, ratio, _), boxes) in enumerate(zip(frames, letterboxed, vehicle_boxes)):
+            index = frame_indices[i] if frame_indices is not None else None
+            stream = index[0] if isinstance(index, tuple) else None
+            since = self.frames_since_full.get(stream)  # None until the stream's first full-frame pass
+            if since is None or since + 1 >= self.cascade_full_interval:
+                full.append(i)
+                self.frames_since_full[stream] = 0
+                continue
+            self.frames_since_full[stream] = since + 1
+            height, width = frame.shape[:2]
+            rois = [pad_box(bbox, self.cascade_margin, width, height)
+                    for bbox, cls in zip(boxes.xyxy, boxes.cls) if cls in self.cascade_classes]
+            for x1, y1, x2, y2 in merge_rects(rois):
+                # Same scale as the full-frame letterbox, so small trash is seen at the usual resolution
+                crop = cv2.resize(frame[y1:y2, x1:x2], (max(1, round((x2 - x1) * ratio)), max(1, round((y2 - y1) * ratio))),
+                                  interpolation=cv2.INTER_LINEAR)
+                crops.append((i, x1, y1, ratio, crop))
+        if full:
+            for i, boxes in zip(full, self._run_yolo(self.trash_model, [letterboxed[i] for i in full], self.trash_conf,
+                                                     [frames[i] for i in full], "trash_yolo")):
+                trash_boxes[i] = boxes
+        if not crops:
+            return trash_boxes
+        # Pad every crop to one stride-aligned size so they run as a single batch
+        stride = 32
+        pad_h = -(-max(crop.shape[0] for *_, crop in crops) // stride) * stride
+        pad_w = -(-max(crop.shape[1] for *_, crop in crops) // stride) * stride
+        images = [cv2.copyMakeBorder(crop, 0, pad_h - crop.shape[0], 0, pad_w - crop.shape[1],
+                                     cv2.BORDER_CONSTANT, value=(114, 114, 114)) for *_, crop in crops]
+        with METRICS.time("trash_yolo"):
+            results = self.trash_model(images, conf=self.trash_conf, imgsz=[pad_h, pad_w], verbose=False)
+        per_frame = {}
+        for (i, x1, y1, ratio, crop), result in zip(crops, results):
+            xyxy = scale_boxes(result.boxes.xyxy.cpu().numpy(), ratio, (0, 0), (crop.shape[0] / ratio, crop.shape[1] / ratio))
+            xyxy[:, [0, 2]] += x1
+            xyxy[:, [1, 3]] += y1
+            per_frame.setdefault(i, []).append((xyxy, result.boxes.conf.cpu().numpy(),
+                                                result.boxes.cls.cpu().numpy().astype(int)))
+        for i, parts in per_frame.items():
+            trash_boxes[i] = Boxes(*(np.concatenate(column) for column in zip(*parts)))
+        return trash_boxes
+
+    def reset(self):
+        """Forget when streams last had a full-frame trash pass, so each starts with one."""
+        self.frames_since_full.clear()
+
+    def close(self):
+        """Shut down the worker threads."""
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,217 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already waiting for a worker."""
+
+class Job:
+    def __init__(self, video_path, progress_interval=30):
+        """Track the status and progress of one uploaded video."""
+        self.id = uuid.uuid4().hex[:16]
+        self.video_path = video_path
+        self.status = "queued"
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.fps = 0.0
+        self.events = []
+        self.report_path = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.progress_interval = progress_interval
+        self.on_progress = None
+        self._start_time = None
+
+    def start(self, total_frames=0):
+        """Mark the job as running."""
+        self.status = "running"
+        self.total_frames = total_frames
+        self.started_at = datetime.now()
+        self._start_time = time.perf_counter()
+        self._notify()
+
+    def update_progress(self, frames_processed, new_events=()):
+        """Record processed frames and newly fired events, notifying listeners every progress_interval frames."""
+        self.frames_processed = frames_processed
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0
+        self.fps = frames_processed / elapsed if elapsed > 0 else 0.0
+        for event in new_events:
+            self.events.append(summarize_event(event))
+        if new_events or frames_processed % self.progress_interval == 0:
+            self._notify()
+
+    def finish(self, report_path=None):
+        """Mark the job as done."""
+        self.status = "done"
+        self.report_path = report_path
+        self.finished_at = datetime.now()
+        self._notify()
+
+    def fail(self, error):
+        """Mark the job as failed."""
+        self.status = "failed"
+        self.error = str(error)
+        self.finished_at = datetime.now()
+        self._notify()
+
+    def _notify(self):
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+    def to_dict(self):
+        """JSON-serializable view of the job."""
+        progress = 100 if self.status == "done" else 0
+        if self.status == "running" and self.total_frames:
+            progress = min(99, int(100 * self.frames_processed / self.total_frames))
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "framesProcessed": self.frames_processed,
+            "totalFrames": self.total_frames,
+            "progress": progress,
+            "fps": round(self.fps, 2),
+            "eventsDetected": len(self.events),
+            "events": list(self.events),
+            "reportPath": self.report_path,
+            "error": self.error,
+            "createdAt": self.created_at.isoformat(),
+            "startedAt": self.started_at.isoformat() if self.started_at else None,
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+def summarize_event(event):
+    """Strip the evidence frames from an event so it can be sent as JSON."""
+    return {
+        "vehicle_id": int(event["vehicle_id"]),
+        "event_type": event["event_type"],
+        "timestamp": event["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+        "start_frame": event.get("start_frame"),
+        "velocity": float(event["velocity"]),
+        "state": event["state"]
+    }
+
+class JobManager:
+    def __init__(self, process_fn, detector_factory, max_workers=2, max_pending=8, on_progress=None, detectors=(),
+                 max_finished=100, finished_ttl=3600, delete_videos=False):
+        """Run video jobs on a bounded worker pool.
+
+        process_fn(job, detector) does the work for one job. Each worker borrows its own Detector,
+        created on demand by detector_factory, since YOLO models and optical-flow state can't be
+        shared between concurrent jobs; tracker and event state are created per job by process_fn.
+        Already loaded detectors can be handed over through detectors.
+        Finished and failed jobs are forgotten finished_ttl seconds after they end, and beyond the
+        newest max_finished of them. With delete_videos, a job's video file is deleted when the job
+        ends, or at the latest when it is forgotten (for uploads, which nothing else reads).
+        """
+        self.process_fn = process_fn
+        self.detector_factory = detector_factory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_progress = on_progress
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.delete_videos = delete_videos
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.jobs = {}
+        self.idle_detectors = queue.Queue()
+        for detector in detectors:
+            self.idle_detectors.put(detector)
+        self.detectors_created = len(detectors)
+        self.lock = threading.Lock()
+
+    def check_capacity(self):
+        """Raise JobQueueFull if a new job would be rejected, e.g. before saving its upload."""
+        with self.lock:
+            self._check_capacity()
+
+    def _check_capacity(self):
+        self._prune()
+        waiting = sum(1 for job in self.jobs.values() if job.status == "queued")
+        if waiting >= self.max_pending:
+            raise JobQueueFull(f"{waiting} jobs already waiting")
+
+    def _prune(self):
+        """Forget finished jobs past finished_ttl, and the oldest beyond max_finished."""
+        finished = sorted((job for job in self.jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        now = datetime.now()
+        expired = [job for job in finished if (now - job.finished_at).total_seconds() > self.finished_ttl]
+        for job in expired + finished[len(expired):max(len(expired), len(finished) - self.max_finished)]:
+            del self.jobs[job.id]
+            self._delete_video(job)
+
+    def _delete_video(self, job):
+        if self.delete_videos and os.path.exists(job.video_path):
+            os.remove(job.video_path)
+
+    def submit(self, video_path):
+        """Queue a video for processing and return its Job immediately."""
+        with self.lock:
+            self._check_capacity()
+            job = Job(video_path)
+            job.on_progress = self.on_progress
+            self.jobs[job.id] = job
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with this id, or None."""
+        return self.jobs.get(job_id)
+
+    def list(self):
+        """All jobs still remembered, oldest first."""
+        with self.lock:
+            self._prune()
+            return list(self.jobs.values())
+
+    def _acquire_detector(self):
+        """Borrow an idle detector, creating one if every existing detector is busy."""
+        with self.lock:
+            create = self.idle_detectors.empty() and self.detectors_created < self.max_workers
+            if create:
+                self.detectors_created += 1
+        if not create:
+            return self.idle_detectors.get()
+        try:
+            return self.detector_factory()
+        except Exception:
+            with self.lock:
+                self.detectors_created -= 1
+            raise
+
+    def _run(self, job):
+        try:
+            detector = self._acquire_detector()
+        except Exception as e:
+            job.fail(e)
+            self._delete_video(job)
+            return
+        detector.reset()
+        try:
+            self.process_fn(job, detector)
+        except Exception as e:
+            job.fail(e)
+        finally:
+            self.idle_detectors.put(detector)
+            self._delete_video(job)
+
+    def warm_up(self, warm_fn):
+        """Borrow a detector in the background and call warm_fn(detector) on it, so its models are
+        loaded before the first job needs them."""
+        def run():
+            detector = self._acquire_detector()
+            try:
+                warm_fn(detector)
+            finally:
+                self.idle_detectors.put(detector)
+        threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+    def shutdown(self):
+        """Stop accepting jobs and wait for running ones to finish."""
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,55 @@
+import numpy as np
+
+CHI2_GATE_3DOF = 11.345  # 99% quantile of chi-square with 3 degrees of freedom
+
+class ConstantVelocityKalman:
+    def __init__(self, pixel_noise=5.0, depth_noise=10.0, pixel_accel=3.0, depth_accel=1.0, initial_speed=30.0):
+        """Constant-velocity Kalman filter over (x, y, depth) centers, applied to many tracks at once.
+
+        State is [x, y, z, vx, vy, vz] in pixels, depth units and per-frame velocities. Means are
+        (N, 6) and covariances (N, 6, 6) arrays, so every method works on all tracks in one call.
+        Noise terms are standard deviations: measurement noise in pixels/depth units, process noise as
+        per-frame accelerations, and initial_speed as the velocity uncertainty of a new track.
+        """
+        self.measurement_var = np.array([pixel_noise, pixel_noise, depth_noise]) ** 2
+        self.accel_var = np.array([pixel_accel, pixel_accel, depth_accel]) ** 2
+        self.initial_velocity_var = np.array([initial_speed, initial_speed, depth_noise]) ** 2
+
+    def initiate(self, measurements):
+        """Means and covariances for new tracks from their first (x, y, z) centers."""
+        measurements = np.asarray(measurements, dtype=float).reshape(-1, 3)
+        mean = np.hstack([measurements, np.zeros_like(measurements)])
+        cov = np.zeros((len(measurements), 6, 6))
+        cov[:, :3, :3] = np.diag(self.measurement_var)
+        cov[:, 3:, 3:] = np.diag(self.initial_velocity_var)
+        return mean, cov
+
+    def predict(self, mean, cov, dt=1):
+        """Advance every track by dt frames."""
+        F = np.eye(6)
+        F[:3, 3:] = dt * np.eye(3)
+        # Discrete white-noise acceleration model, per axis
+        Q = np.zeros((6, 6))
+        Q[:3, :3] = np.diag(self.accel_var * dt ** 4 / 4)
+        Q[:3, 3:] = Q[3:, :3] = np.diag(self.accel_var * dt ** 3 / 2)
+        Q[3:, 3:] = np.diag(self.accel_var * dt ** 2)
+        return mean @ F.T, F @ cov @ F.T + Q
+
+    def project(self, mean, cov):
+        """Predicted measurement and its covariance (innovation covariance) for every track."""
+        return mean[:, :3], cov[:, :3, :3] + np.diag(self.measurement_var)
+
+    def mahalanobis(self, mean, cov, measurements):
+        """Squared Mahalanobis distance of each (x, y, z) measurement to the track in the same row."""
+        projected, S = self.project(mean, cov)
+        diff = np.asarray(measurements, dtype=float).reshape(-1, 3) - projected
+        return np.einsum('ti,tij,tj->t', diff, np.linalg.inv(S), diff)
+
+    def update(self, mean, cov, measurements):
+        """Correct each track with its matched (x, y, z) measurement."""
+        projected, S = self.project(mean, cov)
+        gain = cov[:, :, :3] @ np.linalg.inv(S)  # P H^T S^-1, with H selecting the position
+        innovation = np.asarray(measurements, dtype=float).reshape(-1, 3) - projected
+        mean = mean + np.einsum('tij,tj->ti', gain, innovation)
+        cov = cov - gain @ cov[:, :3, :]
+        return mean, cov
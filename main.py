@@ -1,100 +1,97 @@
 import cv2
 import os
+from contextlib import closing
 from detection import Detector
+from inference import configure_threads
+from depth_estimation import DepthEstimator
+from backends import model_paths
+from model_registry import ModelRegistry
 from tracking import Tracker
 from events import EventDetector
 from reporting import Reporter
-from visualization_manager import VisualizationManager
+from visualization_manager import VisualizationManager, RenderSink
+from pipeline import StagedPipeline
+from cadence import AdaptiveCadence
+from metrics import METRICS
 import numpy as np
 
-def compute_potential_areas(flow, tracking_data):
-    """Identify potential disposal areas based on optical flow near vehicles."""
-    # Check if flow is None
-    if flow is None:
-        return []  # Return an empty list if no flow data is available
-    
-    potential_areas = []
-    for tid, track in tracking_data.items():
-        if track['type'] == 'vehicle':
-            x1, y1, x2, y2 = map(int, track['bbox'])
-            # Expand ROI by 50%
-            w, h = x2 - x1, y2 - y1
-            roi_x1 = max(0, x1 - w // 4)
-            roi_y1 = max(0, y1 - h // 4)
-            roi_x2 = min(flow.shape[1], x2 + w // 4)
-            roi_y2 = min(flow.shape[0], y2 + h // 4)
-            # Extract flow in ROI
-            roi_flow = flow[roi_y1:roi_y2, roi_x1:roi_x2]
-            # Compute magnitude
-            mag, _ = cv2.cartToPolar(roi_flow[..., 0], roi_flow[..., 1])
-            avg_mag = np.mean(mag)
-            if avg_mag > 5:  # Threshold for potential disposal
-                potential_areas.append({
-                    'top_left': (roi_x1, roi_y1),
-                    'bottom_right': (roi_x2, roi_y2)
-                })
-    return potential_areas
+def process_video(video_path, batch_size=1, queue_size=4, headless=False, render_every=0, event_window=0, output_video=None,
+                  detection_interval=1):
+    """Process video with visualization mode toggling, including optical flow.
 
-def process_video(video_path):
-    """Process video with visualization mode toggling, including optical flow."""
+    In headless mode nothing is shown; frames are only drawn every render_every frames and/or
+    event_window frames around each event, and written to output_video if one is given.
+    With detection_interval > 1, quiet frames skip inference and are tracked by prediction.
+    """
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"Error: Could not open video {video_path}")
         return None
     
     tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = 0
-    events_data = []
+    # Evidence is written in the background as events fire, so little is left to do at the end
+    evidence = reporter.evidence_writer(fps=tracker.frame_rate or 30.0)
 
     # Initialize the visualization manager with the existing detector
     vis_manager = VisualizationManager(detector)
     vis_manager.set_mode('normal')  # Start with normal visualization
+    render_sink = None
+    if headless:
+        render_sink = RenderSink(vis_manager, output_video, render_every, event_window, tracker.frame_rate or 30.0)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        detections = detector.detect(frame)
-        tracker.assign_ids(detections, frame_count)
-        flow = detector.compute_optical_flow(frame)  # Compute optical flow for every frame
-        event_detector.process(tracker.tracking_data, detections, frame, flow)
-        events_data.extend(event_detector.events_data[-1:])
-
-        # Added computation for potential areas and low-confidence detections
-        potential_areas = compute_potential_areas(flow, tracker.tracking_data)
-        low_conf_detections = [det for det in detections if det['type'] == 'trash' and det['confidence'] < 0.5]
+    # Decode, inference and tracking/events run on their own threads; this loop is the display sink
+    cadence = AdaptiveCadence(detection_interval) if detection_interval > 1 else None
+    pipeline = StagedPipeline(detectors, tracker, event_detector, batch_size, queue_size,
+                              overlays=not headless or output_video is not None, cadence=cadence)
+    with closing(pipeline.run(cap)) as results:
+        for result in results:
+            frame, frame_count, detections = result['frame'], result['frame_index'], result['detections']
+            evidence.add_frame(frame)  # post-roll for earlier events' clips
+            for event in result['events']:
+                evidence.submit(event)
+            if render_sink is not None:
+                render_sink.consume(result)
+                continue
 
-        # Updated visualize call to pass new parameters
-        vis_frame = vis_manager.visualize(frame, detections, tracker.tracking_data, flow, potential_areas, low_conf_detections)
+            # Added computation for low-confidence detections
+            low_conf_detections = [det for det in detections if det['type'] == 'trash' and det['confidence'] < 0.5]
 
-        # Display the visualized frame
-        cv2.imshow("Visualization", vis_frame)
+            # Updated visualize call to pass new parameters
+            vis_frame = vis_manager.visualize(frame, detections, result['tracks'], result['flow'],
+                                              result['potential_areas'], low_conf_detections, frame_count,
+                                              result['depth'])
 
-        # Keyboard controls to toggle visualization modes
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            break
-        elif key == ord('n'):
-            vis_manager.set_mode('normal')
-            print("Switched to Normal Visualization")
-        elif key == ord('d'):
-            vis_manager.set_mode('depth')
-            print("Switched to Depth Visualization")
-        elif key == ord('o'):
-            vis_manager.set_mode('optical_flow')
-            print("Switched to Optical Flow Visualization")
+            # Display the visualized frame
+            cv2.imshow("Visualization", vis_frame)
 
-        frame_count += 1
+            # Keyboard controls to toggle visualization modes
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            elif key == ord('n'):
+                vis_manager.set_mode('normal')
+                print("Switched to Normal Visualization")
+            elif key == ord('d'):
+                vis_manager.set_mode('depth')
+                print("Switched to Depth Visualization")
+            elif key == ord('o'):
+                vis_manager.set_mode('optical_flow')
+                print("Switched to Optical Flow Visualization")
 
     cap.release()
-    cv2.destroyAllWindows()
-    report_path = reporter.export_events(events_data)
+    if render_sink is not None:
+        render_sink.close()
+    else:
+        cv2.destroyAllWindows()
+    report_path = evidence.close()
     return report_path
 
 def main():
     config = {
         "vehicle_model_path": "models/yolov8m.pt",
         "trash_model_path": "models/100epochv2.pt",
+        "backend": "torch",  # "onnx" / "onnx-int8": exported models (python backends.py) on ONNX Runtime
+        "model_registry": None,  # e.g. "models/registry": load versioned local models (python model_registry.py) instead of the paths above
         "video_path": "videos/ODOT camera films litterbug dumping trash on highway in Cleveland.mp4",
         "evidence_path": "evidence",
         "report_path": "reports",
@@ -105,25 +102,68 @@ def main():
         "min_disposal": 20,
         "min_throw": 5,
         "depth_threshold": 50,
-        "camera_location": "Location1"
+        "event_cooldown": 90,  # frames: repeated triggers for a vehicle within this merge into one incident
+        "compress_evidence_frames": False,  # keep the recent-frame ring as JPEG bytes instead of raw frames
+        "camera_location": "Location1",
+        "flow_mode": "roi",  # "roi": dense flow near vehicles/trash only, "full": whole frame, "sparse": Lucas-Kanade
+        "flow_scale": 1.0,  # compute optical flow on a frame downscaled by this factor
+        "depth_interval": 1,  # run MiDaS every Nth frame (or on scene change) and reuse the map in between
+        "depth_running_norm": False,  # normalize depth with a running min/max so values are comparable over time
+        "trash_cascade": False,  # run the trash model only on crops around detected vehicles (approximate)
+        "cascade_full_interval": 30,  # trash cascade: still run it on the full frame every Nth frame
+        "cascade_margin": 150,  # trash cascade: pixels around each vehicle to search (scale up for 4K footage)
+        "batch_size": 8,
+        "inference_workers": 1,  # each extra worker loads its own YOLO models
+        "queue_size": 4,  # batches buffered between pipeline stages
+        "headless": False,  # no window; render only as configured below
+        "render_every": 0,  # headless: draw every Nth frame (0 = off)
+        "event_window": 30,  # headless: frames drawn before and after each event
+        "output_video": "output.avi",  # headless: annotated output (MJPG)
+        "metrics_path": "reports/metrics.json",  # per-stage latency percentiles, fps, queue depths and memory of the run
+        "detection_interval": 1  # run the models at least every Nth frame, more often on motion or events (1 = every frame)
     }
     os.makedirs(config["evidence_path"], exist_ok=True)
     os.makedirs(config["report_path"], exist_ok=True)
     
-    global detector, tracker, event_detector, reporter
-    detector = Detector(config["vehicle_model_path"], config["trash_model_path"])
+    global detector, detectors, tracker, event_detector, reporter
+    configure_threads(engines=config["inference_workers"])
+    if config["model_registry"]:
+        # Loaded from local files on first use, no torch.hub download
+        registry = ModelRegistry(config["model_registry"])
+        depth_estimator = DepthEstimator(refresh_interval=config["depth_interval"], running_norm=config["depth_running_norm"],
+                                         **registry.depth_kwargs(config["backend"]))
+        yolo_models = [registry.detector_models(config["backend"]) for _ in range(config["inference_workers"])]
+    else:
+        vehicle_model_path, trash_model_path, midas_path = model_paths(config["backend"], config["vehicle_model_path"],
+                                                                       config["trash_model_path"])
+        depth_estimator = DepthEstimator(refresh_interval=config["depth_interval"], running_norm=config["depth_running_norm"],
+                                         onnx_path=midas_path)
+        yolo_models = [(vehicle_model_path, trash_model_path)] * config["inference_workers"]
+    detectors = [
+        Detector(vehicle_model, trash_model, depth_estimator=depth_estimator,
+                 flow_mode=config["flow_mode"], flow_scale=config["flow_scale"],
+                 cascade=config["trash_cascade"], cascade_full_interval=config["cascade_full_interval"],
+                 cascade_margin=config["cascade_margin"])
+        for vehicle_model, trash_model in yolo_models
+    ]
+    detector = detectors[0]
     tracker = Tracker(config["distance_threshold"], config["max_inactive_frames"])
     event_detector = EventDetector(
         temporal_window=config["temporal_window"],
         min_holding=config["min_holding"],
         min_disposal=config["min_disposal"],
         min_throw=config["min_throw"],
-        depth_threshold=config["depth_threshold"]
+        depth_threshold=config["depth_threshold"],
+        event_cooldown=config["event_cooldown"],
+        compress_frames=config["compress_evidence_frames"]
     )
     reporter = Reporter(config["evidence_path"], config["report_path"], config["camera_location"])
     
     video_path = config["video_path"]
-    report_path = process_video(video_path)
+    report_path = process_video(video_path, config["batch_size"], config["queue_size"], config["headless"],
+                                config["render_every"], config["event_window"], config["output_video"],
+                                config["detection_interval"])
+    print(f"Metrics written to: {METRICS.write_json(config['metrics_path'])}")
     if report_path:
         print(f"Report generated at: {report_path}")
     else:
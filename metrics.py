@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+def format_labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+class RollingStats:
+    def __init__(self, window=1000):
+        """Latencies of one stage: the last window samples for percentiles, plus all-time count and sum."""
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self):
+        if not self.samples:
+            return [0.0] * len(QUANTILES)
+        return list(np.quantile(np.fromiter(self.samples, dtype=float), QUANTILES))
+
+class Metrics:
+    def __init__(self, window=1000, enabled=True):
+        """Process-wide stage latencies, frame rate, queue depths and memory.
+
+        Recording a sample is a perf_counter pair and a deque append, so the hooks stay on in
+        production; percentiles are only computed when summary() or prometheus() is called.
+        Stages: decode, midas, vehicle_yolo, trash_yolo, flow, tracking, events, visualization, reporting.
+        """
+        self.window = window
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = defaultdict(lambda: RollingStats(self.window))
+            self.gauges = {}  # (name, ((label, value), ...)) -> value
+            self.frames = 0
+            self.frame_times = deque(maxlen=self.window)
+            self.started = time.time()
+
+    @contextmanager
+    def time(self, stage):
+        """Time the enclosed block as one sample of stage."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.stages[stage].add(seconds)
+
+    def frame(self):
+        """Count one fully processed frame, for fps."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.frames += 1
+            self.frame_times.append(time.perf_counter())
+
+    def gauge(self, name, value, **labels):
+        """Set a point-in-time value, e.g. gauge("queue_depth", q.qsize(), queue="decode")."""
+        if self.enabled:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def fps(self):
+        """Frames per second over the last window frames."""
+        with self.lock:
+            if len(self.frame_times) < 2:
+                return 0.0
+            span = self.frame_times[-1] - self.frame_times[0]
+            return (len(self.frame_times) - 1) / span if span > 0 else 0.0
+
+    def memory(self):
+        """Current and peak resident set size in bytes (current is 0 where /proc isn't available)."""
+        rss = 0
+        try:
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            pass
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource is not None else rss
+        return {"rss_bytes": rss, "peak_rss_bytes": max(peak, rss)}
+
+    def summary(self):
+        """JSON-serializable snapshot: per-stage latency percentiles (ms), fps, queue depths and memory."""
+        with self.lock:
+            stages = {name: (stats.count, stats.total, stats.quantiles()) for name, stats in self.stages.items()}
+            gauges = dict(self.gauges)
+            frames = self.frames
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "frames": frames,
+            "fps": round(self.fps(), 2),
+            "stages": {name: {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                **{f"p{int(q * 100)}_ms": round(v * 1000, 3) for q, v in zip(QUANTILES, quantiles)}
+            } for name, (count, total, quantiles) in sorted(stages.items())},
+            "gauges": {name + format_labels(labels): value for (name, labels), value in sorted(gauges.items())},
+            "memory": self.memory()
+        }
+
+    def write_json(self, path):
+        """Write summary() to path; returns the path."""
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def prometheus(self, prefix="trashdet"):
+        """All metrics in the Prometheus text exposition format."""
+        with self.lock:
+            stages = {name: (stats.count, stats.total, stats.quantiles()) for name, stats in self.stages.items()}
+            gauges = dict(self.gauges)
+            frames = self.frames
+        lines = [f"# HELP {prefix}_stage_seconds Per-stage latency over the recent window.",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for name, (count, total, quantiles) in sorted(stages.items()):
+            for q, v in zip(QUANTILES, quantiles):
+                lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{q}"}} {v:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {count}')
+        lines += [f"# TYPE {prefix}_frames_total counter", f"{prefix}_frames_total {frames}",
+                  f"# TYPE {prefix}_fps gauge", f"{prefix}_fps {self.fps():.3f}"]
+        for gauge in sorted({name for name, _ in gauges}):
+            lines.append(f"# TYPE {prefix}_{gauge} gauge")
+            for (name, labels), value in sorted(gauges.items()):
+                if name == gauge:
+                    lines.append(f"{prefix}_{name}{format_labels(labels)} {value}")
+        memory = self.memory()
+        lines += ["# TYPE process_resident_memory_bytes gauge", f"process_resident_memory_bytes {memory['rss_bytes']}",
+                  f"# TYPE {prefix}_peak_resident_memory_bytes gauge",
+                  f"{prefix}_peak_resident_memory_bytes {memory['peak_rss_bytes']}"]
+        return "\n".join(lines) + "\n"
+
+# Shared by every pipeline in the process; the hooks in the pipeline modules record into it
+METRICS = Metrics()
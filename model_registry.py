@@ -0,0 +1,280 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+MANIFEST = "manifest.json"
+# torch.hub repos that stored model code loads models from itself, and the registry directory each is
+# vendored into: MiDaS_small builds its EfficientNet-Lite3 backbone with torch.hub.load(...)
+VENDORED_HUB_REPOS = {"rwightman/gen-efficientnet-pytorch": "gen-efficientnet"}
+# Fused float32 YOLO weights stored next to a .pt checkpoint, loaded memory-mapped
+YOLO_MMAP_STATE = "fused_state.pt"
+_hub_lock = threading.Lock()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class LazyModel:
+    def __init__(self, registry, name, version=None, shared=True):
+        """Callable stand-in that loads a registry model on first call.
+
+        shared=True hands out the registry's single instance (MiDaS); shared=False gives this
+        holder its own copy, for models that can't be called from several workers at once (YOLO).
+        """
+        self.registry = registry
+        self.name = name
+        self.version = version
+        self.shared = shared
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.model is None:
+                if self.shared:
+                    self.model = self.registry.get(self.name, self.version)
+                else:
+                    self.model = self.registry.load(self.name, self.version)
+            return self.model
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+class ModelRegistry:
+    def __init__(self, root="models/registry", warmup=True):
+        """Versioned local model store: <root>/<name>/<version>/ holds the weights and a manifest.json.
+
+        Models load from disk only, never from the network, and only when first used. MiDaS and YOLO
+        weights are memory-mapped, so workers and worker processes on one machine share their pages.
+        """
+        self.root = root
+        self.warmup = warmup
+        self.models = {}  # (name, version) -> shared instance
+        self.timings = {}  # "name@version" -> {"load_s", "warmup_s"}
+        self.lock = threading.Lock()
+
+    def versions(self, name):
+        """Versions of a model, oldest first by the time they were added."""
+        base = os.path.join(self.root, name)
+        if not os.path.isdir(base):
+            return []
+        versions = [v for v in os.listdir(base) if os.path.isfile(os.path.join(base, v, MANIFEST))]
+        return sorted(versions, key=lambda v: self.manifest(name, v)["added_at"])
+
+    def manifest(self, name, version=None):
+        version = version or self._latest(name)
+        with open(os.path.join(self.root, name, version, MANIFEST)) as f:
+            manifest = json.load(f)
+        manifest["version"] = version
+        manifest["dir"] = os.path.join(self.root, name, version)
+        return manifest
+
+    def path(self, name, version=None):
+        """Path of a model's weights file, for callers that load it themselves (e.g. ONNX sessions)."""
+        manifest = self.manifest(name, version)
+        return os.path.join(manifest["dir"], manifest["file"])
+
+    def lazy(self, name, version=None, shared=True):
+        return LazyModel(self, name, version, shared)
+
+    def detector_models(self, backend="torch"):
+        """Fresh lazy (vehicle, trash) YOLO models for one Detector; each Detector needs its own pair.
+
+        The torch backend uses the "vehicle" and "trash" entries, the ONNX backends "vehicle-<backend>"
+        and "trash-<backend>" (e.g. "trash-onnx-int8", added from python backends.py output).
+        """
+        suffix = "" if backend == "torch" else "-" + backend
+        return self.lazy("vehicle" + suffix, shared=False), self.lazy("trash" + suffix, shared=False)
+
+    def depth_kwargs(self, backend="torch"):
+        """DepthEstimator arguments that take MiDaS from the registry: "midas" or "midas-<backend>"."""
+        if backend == "torch":
+            return {"model": self.lazy("midas")}
+        return {"onnx_path": self.path("midas-" + backend)}
+
+    def get(self, name, version=None):
+        """The shared instance of a model, loaded (and warmed up) on first request."""
+        key = (name, version or self._latest(name))
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = self.load(*key)
+            return self.models[key]
+
+    def load(self, name, version=None):
+        """Load a new instance of a model and record its load and warm-up time."""
+        manifest = self.manifest(name, version)
+        start = time.perf_counter()
+        model = LOADERS[manifest["kind"]](manifest)
+        loaded = time.perf_counter()
+        if self.warmup:
+            WARMUPS[manifest["kind"]](model)
+        self.timings[f"{name}@{manifest['version']}"] = {
+            "load_s": round(loaded - start, 3),
+            "warmup_s": round(time.perf_counter() - loaded, 3)
+        }
+        return model
+
+    def add(self, name, version, kind, weights_path, extra_dirs=None):
+        """Copy weights (and e.g. model source code in extra_dirs) into a new version directory."""
+        target = os.path.join(self.root, name, version)
+        if os.path.exists(target):
+            raise FileExistsError(f"{name}@{version} already exists")
+        os.makedirs(target)
+        shutil.copy2(weights_path, target)
+        for dest, source in (extra_dirs or {}).items():
+            shutil.copytree(source, os.path.join(target, dest))
+        manifest = {
+            "kind": kind,
+            "file": os.path.basename(weights_path),
+            "sha256": file_sha256(weights_path),
+            "added_at": datetime.now().isoformat()
+        }
+        with open(os.path.join(target, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return target
+
+    def _latest(self, name):
+        versions = self.versions(name)
+        if not versions:
+            raise FileNotFoundError(f"No versions of model '{name}' in {self.root}")
+        return versions[-1]
+
+def load_yolo(manifest):
+    """YOLO from the stored checkpoint, with its weights swapped for the memory-mapped fused ones if stored."""
+    from ultralytics import YOLO
+    model = YOLO(os.path.join(manifest["dir"], manifest["file"]), task="detect")
+    state_path = os.path.join(manifest["dir"], YOLO_MMAP_STATE)
+    if os.path.exists(state_path):
+        import torch
+        # Fused like ultralytics fuses before its first prediction (it skips already fused models),
+        # so the mmapped tensors are the ones inference runs on instead of private copies
+        net = model.model.fuse(verbose=False)
+        state = torch.load(state_path, map_location="cpu", mmap=True, weights_only=True)
+        net.load_state_dict(state, assign=True)
+    return model
+
+def add_yolo(registry, name, version, weights_path):
+    """Store a YOLO checkpoint and, for .pt files, its fused float32 weights for memory-mapped loading."""
+    target = registry.add(name, version, "yolo", weights_path)
+    if weights_path.endswith(".pt"):
+        import torch
+        from ultralytics import YOLO
+        net = YOLO(weights_path, task="detect").model.fuse(verbose=False).float()
+        torch.save(net.state_dict(), os.path.join(target, YOLO_MMAP_STATE))
+    return target
+
+def warmup_yolo(model):
+    model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+@contextmanager
+def local_hub(model_dir):
+    """Serve the torch.hub.load calls that model code makes while being built from the repos vendored in
+    model_dir (see VENDORED_HUB_REPOS), with pretrained downloads off; any other GitHub load raises.
+
+    torch.hub.load is replaced process-wide for the duration, but only calls from the calling thread
+    are redirected; other threads loading models meanwhile reach the real torch.hub.load.
+    """
+    import torch
+    hub_load = torch.hub.load
+    owner = threading.get_ident()
+
+    def load(repo_or_dir, model, *args, source="github", **kwargs):
+        if source == "local" or threading.get_ident() != owner:
+            return hub_load(repo_or_dir, model, *args, source=source, **kwargs)
+        repo = repo_or_dir.split(":")[0]
+        if repo not in VENDORED_HUB_REPOS:
+            raise RuntimeError(f"torch.hub repo {repo} isn't vendored in {model_dir}; not downloading it")
+        path = os.path.join(model_dir, VENDORED_HUB_REPOS[repo])
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"{path} is missing; add the model again (python model_registry.py add-midas)")
+        kwargs["pretrained"] = False  # the registry's own weights are loaded afterwards
+        return hub_load(path, model, *args, source="local", **kwargs)
+
+    with _hub_lock:  # one redirect installed at a time, so each restores the real torch.hub.load
+        torch.hub.load = load
+        try:
+            yield
+        finally:
+            torch.hub.load = hub_load
+
+def load_midas(manifest):
+    """MiDaS from its stored hub source and memory-mapped weights, without network access."""
+    import torch
+    with local_hub(manifest["dir"]):
+        midas = torch.hub.load(os.path.join(manifest["dir"], "repo"), "MiDaS_small", source="local", pretrained=False)
+    state = torch.load(os.path.join(manifest["dir"], manifest["file"]), map_location="cpu", mmap=True, weights_only=True)
+    midas.load_state_dict(state, assign=True)  # keep the mmapped tensors instead of copying them
+    midas.eval()
+    return midas
+
+def warmup_midas(model):
+    import torch
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 384, 384))
+
+LOADERS = {"yolo": load_yolo, "midas": load_midas}
+WARMUPS = {"yolo": warmup_yolo, "midas": warmup_midas}
+
+def add_midas(registry, version):
+    """Fetch MiDaS_small through torch.hub once (needs network) and store its weights, its source and the
+    source of the backbone repo it loads through torch.hub."""
+    import tempfile
+    import torch
+    midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small", pretrained=True)
+    hub_dir = torch.hub.get_dir()
+    extra_dirs = {"repo": os.path.join(hub_dir, "intel-isl_MiDaS_master")}
+    for repo, dest in VENDORED_HUB_REPOS.items():
+        # Checked out by the load above, under <owner>_<name>_<branch>
+        checkouts = glob.glob(os.path.join(hub_dir, repo.replace("/", "_") + "_*"))
+        if not checkouts:
+            raise FileNotFoundError(f"torch.hub didn't fetch {repo} into {hub_dir}")
+        extra_dirs[dest] = checkouts[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "midas_small.pt")
+        torch.save(midas.state_dict(), weights)
+        return registry.add("midas", version, "midas", weights, extra_dirs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local model registry.")
+    parser.add_argument("--root", default="models/registry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add = subparsers.add_parser("add", help="store a YOLO .pt/.onnx file (and mmappable weights) as a new version")
+    add.add_argument("name")
+    add.add_argument("weights")
+    add.add_argument("--version", required=True)
+    midas = subparsers.add_parser("add-midas", help="fetch MiDaS_small once and store it for offline use")
+    midas.add_argument("--version", default="v2.1-small")
+    subparsers.add_parser("list", help="list stored models and versions")
+    warm = subparsers.add_parser("warmup", help="load and warm up models, reporting timings")
+    warm.add_argument("names", nargs="*", default=["vehicle", "trash", "midas"])
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "add":
+        print(f"Added {add_yolo(registry, args.name, args.version, args.weights)}")
+    elif args.command == "add-midas":
+        print(f"Added {add_midas(registry, args.version)}")
+    elif args.command == "list":
+        for name in sorted(os.listdir(args.root)) if os.path.isdir(args.root) else []:
+            for version in registry.versions(name):
+                manifest = registry.manifest(name, version)
+                print(f"{name}@{version}  {manifest['kind']}  {manifest['file']}  {manifest['sha256'][:12]}")
+    elif args.command == "warmup":
+        for name in args.names:
+            registry.get(name)
+        for key, timing in registry.timings.items():
+            print(f"{key:<24s} load={timing['load_s']:.2f}s warmup={timing['warmup_s']:.2f}s")
+
+if __name__ == "__main__":
+    main()
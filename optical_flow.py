@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from geometry import merge_rects
+
+class FlowField:
+    def __init__(self, shape, scale=1.0):
+        """Optical flow for one frame, kept only for the regions that were computed.
+
+        Boxes passed to the sampling methods and the flow they return are in full-resolution frame pixels.
+        """
+        self.shape = shape  # (height, width) of the frame
+        self.scale = scale
+        self.patches = []  # (x1, y1, flow) with x1, y1 in scaled pixels; patches don't overlap
+        self.points = np.zeros((0, 2), dtype=np.float32)  # sparse mode: point positions in the previous frame
+        self.vectors = np.zeros((0, 2), dtype=np.float32)  # sparse mode: point displacements
+
+    def region_magnitude(self, x1, y1, x2, y2):
+        """Mean flow magnitude inside a box, over the part of it that flow was computed for (0 if none)."""
+        if len(self.points):
+            inside = ((self.points[:, 0] >= x1) & (self.points[:, 0] < x2) &
+                      (self.points[:, 1] >= y1) & (self.points[:, 1] < y2))
+            return float(np.linalg.norm(self.vectors[inside], axis=1).mean()) if inside.any() else 0.0
+        sx1, sy1 = int(x1 * self.scale), int(y1 * self.scale)
+        sx2, sy2 = int(np.ceil(x2 * self.scale)), int(np.ceil(y2 * self.scale))
+        total, count = 0.0, 0
+        for px, py, flow in self.patches:
+            ix1, iy1 = max(sx1, px), max(sy1, py)
+            ix2, iy2 = min(sx2, px + flow.shape[1]), min(sy2, py + flow.shape[0])
+            if ix1 >= ix2 or iy1 >= iy2:
+                continue
+            region = flow[iy1 - py:iy2 - py, ix1 - px:ix2 - px]
+            mag, _ = cv2.cartToPolar(region[..., 0], region[..., 1])
+            total += float(mag.sum())
+            count += mag.size
+        return total / count / self.scale if count else 0.0
+
+    def dense(self):
+        """Full-resolution (height, width, 2) flow array, zero wherever flow wasn't computed."""
+        height, width = self.shape
+        dense = np.zeros((height, width, 2), dtype=np.float32)
+        for px, py, flow in self.patches:
+            x1, y1 = int(px / self.scale), int(py / self.scale)
+            x2 = min(width, int((px + flow.shape[1]) / self.scale))
+            y2 = min(height, int((py + flow.shape[0]) / self.scale))
+            if self.scale != 1.0:
+                flow = cv2.resize(flow, (x2 - x1, y2 - y1), interpolation=cv2.INTER_LINEAR) / self.scale
+            dense[y1:y2, x1:x2] = flow[:y2 - y1, :x2 - x1]
+        for (x, y), (dx, dy) in zip(self.points, self.vectors):
+            cv2.circle(dense, (int(x), int(y)), 4, (float(dx), float(dy)), -1)
+        return dense
+
+class OpticalFlow:
+    def __init__(self, mode="roi", scale=1.0, margin=16, max_corners=200):
+        """Optical flow against the previous frame of one video stream.
+
+        mode "roi" runs dense Farneback only over the regions callers will sample, "full" over the whole
+        frame, and "sparse" tracks corners inside the regions with pyramidal Lucas-Kanade. scale < 1
+        computes flow on a downscaled frame; margin pads each region so flow at its edges has context.
+        """
+        if mode not in ("roi", "full", "sparse"):
+            raise ValueError(f"Invalid optical flow mode: {mode}")
+        self.mode = mode
+        self.scale = scale
+        self.margin = margin
+        self.max_corners = max_corners
+        self.prev_gray = None
+
+    def compute(self, frame, rois=None):
+        """Compute flow between the previous frame and this one over rois, a list of (x1, y1, x2, y2) boxes.
+
+        rois=None computes flow for the whole frame. Returns a FlowField, or None for the first frame.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        # Only the gray (downscaled) frame is kept, so next frame doesn't convert this one again
+        prev_gray, self.prev_gray = self.prev_gray, gray
+        if prev_gray is None or prev_gray.shape != gray.shape:
+            return None
+        field = FlowField(frame.shape[:2], self.scale)
+        height, width = gray.shape
+        if self.mode == "full" or rois is None:
+            rects = [(0, 0, width, height)]
+        else:
+            rects = merge_rects([self._scaled_rect(roi, width, height) for roi in rois])
+        if self.mode == "sparse":
+            self._compute_sparse(field, prev_gray, gray, rects)
+        else:
+            for x1, y1, x2, y2 in rects:
+                flow = cv2.calcOpticalFlowFarneback(prev_gray[y1:y2, x1:x2], gray[y1:y2, x1:x2],
+                                                    None, 0.5, 3, 15, 3, 5, 1.2, 0)
+                field.patches.append((x1, y1, flow))
+        return field
+
+    def _compute_sparse(self, field, prev_gray, gray, rects):
+        mask = np.zeros_like(prev_gray)
+        for x1, y1, x2, y2 in rects:
+            mask[y1:y2, x1:x2] = 255
+        points = cv2.goodFeaturesToTrack(prev_gray, self.max_corners, 0.01, 5, mask=mask)
+        if points is None:
+            return
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(21, 21), maxLevel=3)
+        found = status[:, 0] == 1
+        field.points = points[found, 0] / self.scale
+        field.vectors = (next_points[found, 0] - points[found, 0]) / self.scale
+
+    def _scaled_rect(self, roi, width, height):
+        """A full-resolution box mapped to the scaled frame, padded by margin and clipped."""
+        x1, y1, x2, y2 = roi
+        return (max(0, int(x1 * self.scale) - self.margin), max(0, int(y1 * self.scale) - self.margin),
+                min(width, int(np.ceil(x2 * self.scale)) + self.margin),
+                min(height, int(np.ceil(y2 * self.scale)) + self.margin))
+
+    def reset(self):
+        """Forget the previous frame before a new video."""
+        self.prev_gray = None
@@ -0,0 +1,288 @@
+import queue
+import threading
+from metrics import METRICS
+
+_STOP = object()  # end-of-stream marker passed between pipeline stages
+
+def expand_box(bbox, width, height):
+    """Vehicle box grown by a quarter of its size on each side (50% overall), clipped to the frame."""
+    x1, y1, x2, y2 = map(int, bbox)
+    w, h = x2 - x1, y2 - y1
+    return max(0, x1 - w // 4), max(0, y1 - h // 4), min(width, x2 + w // 4), min(height, y2 + h // 4)
+
+def flow_rois(tracking_data, detections, frame_shape):
+    """Regions optical flow is sampled in: expanded vehicle boxes and the patch around each trash item."""
+    height, width = frame_shape[:2]
+    _, slots = tracking_data.slots('vehicle')
+    rois = [expand_box(bbox, width, height) for bbox in tracking_data.column('bbox')[slots]]
+    for det in detections:
+        if det['class_id'] == 1:
+            x, y = map(int, det['center'][:2])
+            rois.append((x - 10, y - 10, x + 10, y + 10))
+    return rois
+
+def compute_potential_areas(flow, tracking_data):
+    """Identify potential disposal areas based on optical flow near vehicles."""
+    # Check if flow is None
+    if flow is None:
+        return []  # Return an empty list if no flow data is available
+
+    potential_areas = []
+    _, slots = tracking_data.slots('vehicle')
+    for bbox in tracking_data.column('bbox')[slots]:
+        # Expand ROI by 50%
+        roi_x1, roi_y1, roi_x2, roi_y2 = expand_box(bbox, flow.shape[1], flow.shape[0])
+        avg_mag = flow.region_magnitude(roi_x1, roi_y1, roi_x2, roi_y2)
+        if avg_mag > 5:  # Threshold for potential disposal
+            potential_areas.append({
+                'top_left': (roi_x1, roi_y1),
+                'bottom_right': (roi_x2, roi_y2)
+            })
+    return potential_areas
+
+def read_frame_batches(cap, batch_size):
+    """Read ahead up to batch_size consecutive frames at a time from an open capture."""
+    frames = []
+    while cap.isOpened():
+        with METRICS.time("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+        if len(frames) == batch_size:
+            yield frames
+            frames = []
+    if frames:
+        yield frames
+
+def iter_detections(cap, detector, batch_size=1, start_index=0):
+    """Yield (frame_index, frame, detections) in frame order, running inference on batch_size frames per call."""
+    frame_index = start_index
+    for frames in read_frame_batches(cap, batch_size):
+        indices = list(range(frame_index, frame_index + len(frames)))
+        for index, frame, detections in zip(indices, frames, detector.detect_batch(frames, indices)):
+            yield index, frame, detections
+        frame_index += len(frames)
+
+def analyze_frame(optical_flow, tracker, event_detector, frame_index, frame, detections):
+    """Run tracking, optical flow and event detection for one frame; return (flow, new events)."""
+    with METRICS.time("tracking"):
+        tracker.assign_ids(detections, frame_index)
+    # Flow is only computed where compute_potential_areas and the event detector sample it
+    with METRICS.time("flow"):
+        flow = optical_flow.compute(frame, flow_rois(tracker.tracking_data, detections, frame.shape))
+    with METRICS.time("events"):
+        event_detector.process(tracker.tracking_data, detections, frame, flow, frame_index)
+    METRICS.frame()
+    return flow, event_detector.new_events
+
+def snapshot_tracks(tracking_data):
+    """Copy the per-track fields the visualization reads, so later frames can't mutate them."""
+    return {tid: {
+        'type': track['type'],
+        'bbox': track['bbox'],
+        'state': track.get('state', 'IDLE'),
+        'smoothed_velocity': track.get('smoothed_velocity', 0)
+    } for tid, track in tracking_data.items()}
+
+class StagedPipeline:
+    def __init__(self, detectors, tracker, event_detector, batch_size=1, queue_size=4, drop_frames=False, overlays=True,
+                 cadence=None, stream_id=None, start_index=0, cadence_lookahead=1):
+        """Pipeline with decode, inference, ordered tracking/events and consumer stages joined by bounded queues.
+
+        detectors is a Detector or a list of them, one per inference worker; YOLO models must not be
+        shared between workers. queue_size bounds every inter-stage queue (in batches), and drop_frames
+        makes the decoder skip batches instead of blocking when inference falls behind (live sources).
+        overlays=False skips the track snapshot and potential-area overlay data when nothing is drawn.
+        cadence (an AdaptiveCadence) lets frames skip inference and use tracker predictions instead. Its
+        decisions are made at decode time, so with a cadence the decoder runs at most cadence_lookahead
+        batches ahead of the last analyzed batch; event state then reaches the cadence within
+        (cadence_lookahead + 1) * batch_size frames instead of a full set of queues later.
+        stream_id keys the shared depth cache by (stream_id, frame index), so concurrent videos don't collide.
+        start_index is the frame index of the capture's first frame, for captures seeked into a video.
+        Each result carries the DepthMap its frame was analyzed with ('depth'; frames that skipped
+        inference carry the last inferred one), so depth views never have to ask the estimator again.
+        """
+        self.detectors = list(detectors) if isinstance(detectors, (list, tuple)) else [detectors]
+        self.tracker = tracker
+        self.event_detector = event_detector
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.drop_frames = drop_frames
+        self.overlays = overlays
+        self.cadence = cadence
+        self.stream_id = stream_id
+        self.start_index = start_index
+        self.cadence_lookahead = cadence_lookahead
+        self.analyzed_seq = -1  # last batch the ordered stage has finished, for the cadence lookahead
+        self.progress = threading.Condition()
+        self.dropped_frames = 0
+        # Depth maps of every result waiting for the consumer stay cached, for depth lookups by frame index
+        for detector in self.detectors:
+            if getattr(detector, "depth_estimator", None) is not None:
+                detector.depth_estimator.reserve(queue_size * batch_size)
+
+    def run(self, cap):
+        """Yield one result dict per processed frame, in frame order, while later frames are decoded and inferred."""
+        stop = threading.Event()
+        self.analyzed_seq = -1
+        decode_queue = queue.Queue(self.queue_size)
+        infer_queue = queue.Queue(self.queue_size)
+        output_queue = queue.Queue(self.queue_size * self.batch_size)
+        threads = [threading.Thread(target=self._decode, args=(cap, decode_queue, stop), name="decode", daemon=True)]
+        for i, detector in enumerate(self.detectors):
+            threads.append(threading.Thread(target=self._infer, args=(detector, decode_queue, infer_queue, stop),
+                                            name=f"infer-{i}", daemon=True))
+        threads.append(threading.Thread(target=self._analyze, args=(infer_queue, output_queue, stop),
+                                        name="analyze", daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(output_queue, stop)
+                if item is _STOP:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _put(self, q, item, stop):
+        """Block on a full queue until there is room or the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, stop):
+        """Block on an empty queue until an item arrives or the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _decode(self, cap, decode_queue, stop):
+        """Decode stage: read frame batches and hand them to the inference workers."""
+        seq, frame_index = 0, self.start_index
+        try:
+            for frames in read_frame_batches(cap, self.batch_size):
+                if stop.is_set():
+                    return
+                indices = list(range(frame_index, frame_index + len(frames)))
+                frame_index += len(frames)
+                if self.cadence is not None:
+                    if not self._wait_for_analysis(seq, stop):
+                        return
+                    detect = [self.cadence.should_detect(i, frame) for i, frame in zip(indices, frames)]
+                else:
+                    detect = [True] * len(frames)
+                item = (seq, indices, frames, detect)
+                if self.drop_frames:
+                    try:
+                        decode_queue.put_nowait(item)
+                    except queue.Full:
+                        self.dropped_frames += len(frames)
+                        continue
+                elif not self._put(decode_queue, item, stop):
+                    return
+                seq += 1
+        except Exception as e:
+            self._put(decode_queue, e, stop)
+        for _ in self.detectors:
+            self._put(decode_queue, _STOP, stop)
+
+    def _wait_for_analysis(self, seq, stop):
+        """Block until batch seq is within cadence_lookahead batches of the analyzed ones; False on stop."""
+        with self.progress:
+            while seq - 1 - self.analyzed_seq > self.cadence_lookahead:
+                if stop.is_set():
+                    return False
+                self.progress.wait(0.1)
+        return True
+
+    def _infer(self, detector, decode_queue, infer_queue, stop):
+        """Inference stage: run batched detection; batches may complete out of order across workers."""
+        while True:
+            item = self._get(decode_queue, stop)
+            if item is _STOP or isinstance(item, BaseException):
+                self._put(infer_queue, item, stop)
+                return
+            seq, indices, frames, detect = item
+            METRICS.gauge("queue_depth", decode_queue.qsize(), queue="decode")
+            try:
+                detections = [None] * len(frames)  # None: filled in from tracker predictions
+                depths = [None] * len(frames)
+                selected = [i for i, flag in enumerate(detect) if flag]
+                if selected:
+                    keys = [indices[i] if self.stream_id is None else (self.stream_id, indices[i]) for i in selected]
+                    inputs = [frames[i] for i in selected]
+                    if hasattr(detector, "detect_batch_with_depth"):
+                        batch = detector.detect_batch_with_depth(inputs, keys)
+                    else:  # detectors without depth, e.g. benchmark.StubDetector
+                        batch = [(frame_detections, None) for frame_detections in detector.detect_batch(inputs, keys)]
+                    for i, (frame_detections, depth) in zip(selected, batch):
+                        detections[i], depths[i] = frame_detections, depth
+            except Exception as e:
+                self._put(infer_queue, e, stop)
+                return
+            if not self._put(infer_queue, (seq, indices, frames, detections, depths), stop):
+                return
+
+    def _analyze(self, infer_queue, output_queue, stop):
+        """Ordered stage: restore frame order, then run tracking and event detection frame by frame."""
+        optical_flow = self.detectors[0].optical_flow
+        pending = {}
+        next_seq = 0
+        depth = None
+        finished_workers = 0
+        try:
+            while finished_workers < len(self.detectors):
+                item = self._get(infer_queue, stop)
+                if item is _STOP:
+                    finished_workers += 1
+                    continue
+                if isinstance(item, BaseException):
+                    self._put(output_queue, item, stop)
+                    return
+                pending[item[0]] = item
+                METRICS.gauge("queue_depth", infer_queue.qsize(), queue="infer")
+                METRICS.gauge("queue_depth", output_queue.qsize(), queue="output")
+                while next_seq in pending:
+                    _, indices, frames, batch_detections, batch_depths = pending.pop(next_seq)
+                    next_seq += 1
+                    for frame_index, frame, detections, frame_depth in zip(indices, frames, batch_detections, batch_depths):
+                        if detections is None:
+                            detections = self.tracker.predict_detections(frame_index, frame.shape)
+                        else:
+                            depth = frame_depth
+                        flow, new_events = analyze_frame(optical_flow, self.tracker, self.event_detector,
+                                                         frame_index, frame, detections)
+                        result = {
+                            'frame_index': frame_index,
+                            'frame': frame,
+                            'detections': detections,
+                            'flow': flow,
+                            'depth': depth,
+                            'tracks': snapshot_tracks(self.tracker.tracking_data) if self.overlays else {},
+                            'potential_areas': compute_potential_areas(flow, self.tracker.tracking_data) if self.overlays else [],
+                            'events': new_events
+                        }
+                        if self.cadence is not None:
+                            self.cadence.observe(self.tracker.tracking_data)
+                        if not self._put(output_queue, result, stop):
+                            return
+                    with self.progress:
+                        self.analyzed_seq = next_seq - 1
+                        self.progress.notify_all()
+        except Exception as e:
+            self._put(output_queue, e, stop)
+            return
+        self._put(output_queue, _STOP, stop)
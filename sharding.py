@@ -0,0 +1,273 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+import cv2
+import numpy as np
+from assignment import gated_assignment
+from cadence import AdaptiveCadence
+from events import EventAggregator, EventDetector
+from pipeline import StagedPipeline
+from reporting import Reporter
+from tracking import Tracker
+
+class SegmentCapture:
+    def __init__(self, cap, count):
+        """A capture that ends after count frames, for reading one segment of a seeked video."""
+        self.cap = cap
+        self.remaining = count
+
+    def isOpened(self):
+        return self.remaining > 0 and self.cap.isOpened()
+
+    def read(self):
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        return self.cap.read()
+
+def plan_segments(total_frames, shards, overlap):
+    """Split [0, total_frames) into shards owned ranges, each read with overlap extra frames on both sides.
+
+    Returns dicts with start/end (the frames whose events the segment reports) and read_start/read_end
+    (the frames it processes). The leading overlap warms up tracks and event state; the trailing one
+    lets incidents that start near the end of the range complete. If total_frames is unknown (0 or
+    negative, as some containers and streams report), one segment is read sequentially to the end,
+    with end and read_end None.
+    """
+    if total_frames <= 0:
+        return [{"index": 0, "start": 0, "end": None, "read_start": 0, "read_end": None}]
+    shards = max(1, min(shards, total_frames // max(2 * overlap, 1) or 1))
+    bounds = np.linspace(0, total_frames, shards + 1).astype(int)
+    return [{
+        "index": k,
+        "start": int(start),
+        "end": int(end),
+        "read_start": int(max(0, start - overlap)),
+        "read_end": int(min(total_frames, end + overlap))
+    } for k, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+def build_detector(config, intra_op_threads=None):
+    """A Detector for one worker process, set up like main.py's (models are never shared across processes)."""
+    if config.get("stub"):
+        from benchmark import StubDetector
+        return StubDetector(config["flow_mode"], config["flow_scale"])
+    from detection import Detector  # torch/ultralytics are only needed in the workers
+    from depth_estimation import DepthEstimator
+    from inference import configure_threads
+    configure_threads(intra_op_threads)  # once per worker process, which runs one Detector
+    if config["model_registry"]:
+        from model_registry import ModelRegistry
+        registry = ModelRegistry(config["model_registry"])
+        depth_kwargs = registry.depth_kwargs(config["backend"])
+        vehicle_model, trash_model = registry.detector_models(config["backend"])
+    else:
+        from backends import model_paths
+        vehicle_model, trash_model, midas_path = model_paths(config["backend"], config["vehicle_model_path"],
+                                                             config["trash_model_path"])
+        depth_kwargs = {"onnx_path": midas_path}
+    depth_estimator = DepthEstimator(refresh_interval=config["depth_interval"], running_norm=config["depth_running_norm"],
+                                     **depth_kwargs)
+    return Detector(vehicle_model, trash_model, depth_estimator=depth_estimator,
+                    flow_mode=config["flow_mode"], flow_scale=config["flow_scale"],
+                    cascade=config["trash_cascade"], cascade_full_interval=config["cascade_full_interval"],
+                    cascade_margin=config["cascade_margin"])
+
+def process_segment(video_path, segment, config, overlap, intra_op_threads=None):
+    """Worker: run the full pipeline over one segment with its own Detector, Tracker and EventDetector.
+
+    Returns the events the segment owns (start_frame within [start, end)), the vehicle ids seen in
+    its range, and vehicle positions near both boundaries for stitching tracks with its neighbours.
+    """
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, segment["read_start"])
+    detector = build_detector(config, intra_op_threads)
+    tracker = Tracker(config["distance_threshold"], config["max_inactive_frames"])
+    tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS) or tracker.frame_rate
+    event_detector = EventDetector(
+        temporal_window=config["temporal_window"],
+        min_holding=config["min_holding"],
+        min_disposal=config["min_disposal"],
+        min_throw=config["min_throw"],
+        depth_threshold=config["depth_threshold"],
+        event_cooldown=config["event_cooldown"],
+        compress_frames=config["compress_evidence_frames"]
+    )
+    cadence = AdaptiveCadence(config["detection_interval"]) if config["detection_interval"] > 1 else None
+    pipeline = StagedPipeline(detector, tracker, event_detector, config["batch_size"], config["queue_size"],
+                              overlays=False, cadence=cadence, start_index=segment["read_start"])
+    events, vehicles, positions, frames = [], set(), {}, 0
+    end = segment["end"] if segment["end"] is not None else float("inf")
+    capture = cap if segment["read_end"] is None else SegmentCapture(cap, segment["read_end"] - segment["read_start"])
+    with closing(pipeline.run(capture)) as results:
+        for result in results:
+            frame_index = result["frame_index"]
+            frames += 1
+            owned = segment["start"] <= frame_index < end
+            near_boundary = (abs(frame_index - segment["start"]) < overlap or abs(frame_index - end) < overlap)
+            for det in result["detections"]:
+                if det["type"] != "vehicle" or "id" not in det:
+                    continue
+                if owned:
+                    vehicles.add(det["id"])
+                if near_boundary:
+                    positions.setdefault(det["id"], []).append((frame_index, det["center"][0], det["center"][1]))
+            events.extend(event for event in result["events"] if owned)
+    cap.release()
+    return {
+        "segment": segment,
+        "events": events,
+        "vehicles": vehicles,
+        "positions": {tid: np.array(points) for tid, points in positions.items()},
+        "frames": frames,
+        "seconds": time.perf_counter() - started
+    }
+
+def track_distance(a, b, min_common=5):
+    """Median image distance between two tracks over the frames both were seen in, or inf if too few."""
+    _, ia, ib = np.intersect1d(a[:, 0], b[:, 0], return_indices=True)
+    if len(ia) < min_common:
+        return np.inf
+    return float(np.median(np.hypot(a[ia, 1] - b[ib, 1], a[ia, 2] - b[ib, 2])))
+
+def stitch_tracks(results, max_distance=50.0):
+    """Map each segment's local vehicle ids to global ids.
+
+    Consecutive segments both process the frames around their shared boundary; a track in one is
+    the same vehicle as the track in the other that stays closest to it there (Hungarian, gated by
+    max_distance). Unmatched tracks get new ids. Returns one {local id: global id} dict per segment.
+    """
+    mappings, next_id = [], 0
+    for k, result in enumerate(results):
+        mapping = {}
+        if k > 0:
+            previous = results[k - 1]
+            # Only frames around the shared boundary are common to both, so only those are compared
+            prev_ids = [tid for tid in previous["positions"] if tid in mappings[k - 1]]
+            ids = list(result["positions"])
+            if prev_ids and ids:
+                cost = np.array([[track_distance(previous["positions"][a], result["positions"][b]) for b in ids]
+                                 for a in prev_ids])
+                for r, c in zip(*gated_assignment(cost, max_distance)):
+                    mapping[ids[c]] = mappings[k - 1][prev_ids[r]]
+        for tid in sorted(result["vehicles"] | {event["vehicle_id"] for event in result["events"]}):
+            if tid not in mapping:
+                mapping[tid] = next_id
+                next_id += 1
+        mappings.append(mapping)
+    return mappings
+
+def merge_events(results, mappings, cooldown=90):
+    """Events of all segments in frame order, with global vehicle ids and incidents split by a segment
+    boundary (one segment saw the start, the next re-triggered it) merged like EventAggregator does."""
+    events = []
+    for result, mapping in zip(results, mappings):
+        for event in result["events"]:
+            event["vehicle_id"] = mapping[event["vehicle_id"]]
+            events.append(event)
+    events.sort(key=lambda event: event["start_frame"])
+    aggregator = EventAggregator(cooldown)
+    merged = []
+    for event in events:
+        incident = aggregator.extend(event["vehicle_id"], event["start_frame"], event["event_type"])
+        if incident is not None:
+            incident["end_frame"] = max(incident["end_frame"], event["end_frame"])
+            incident["triggers"] += event["triggers"] - 1
+            incident["event_types"] += [t for t in event["event_types"] if t not in incident["event_types"]]
+            continue
+        aggregator.open[event["vehicle_id"]] = event
+        merged.append(event)
+    return merged
+
+def process_video_sharded(video_path, config, shards=None, overlap=90):
+    """Process a recorded video on shards worker processes, one overlapping time segment each.
+
+    Segments are seeked with CAP_PROP_POS_FRAMES and run independently; their tracks are stitched
+    and events deduplicated across the overlaps before one Reporter.export_events call.
+    Returns (report_path, events).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return None, []
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    shards = shards or os.cpu_count() or 1
+    segments = plan_segments(total_frames, shards, overlap)
+    if total_frames <= 0:
+        print(f"Warning: {video_path} reports no frame count; processing it as one sequential segment")
+    # Split the cores between the workers instead of letting every torch runtime claim all of them
+    intra_op_threads = max(1, (os.cpu_count() or 1) // len(segments))
+    start = time.perf_counter()
+    # spawn: torch and the pipeline threads don't survive fork
+    with ProcessPoolExecutor(len(segments), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(process_segment, video_path, segment, config, overlap, intra_op_threads)
+                   for segment in segments]
+        results = [future.result() for future in futures]
+    mappings = stitch_tracks(results)
+    events = merge_events(results, mappings, config["event_cooldown"])
+    for result in results:
+        segment = result["segment"]
+        end = segment["end"] if segment["end"] is not None else result["frames"]
+        print(f"segment {segment['index']}: frames {segment['start']}-{end} "
+              f"({result['frames']} processed) {result['seconds']:.1f}s events={len(result['events'])}")
+    vehicles = len({global_id for mapping in mappings for global_id in mapping.values()})
+    print(f"{len(segments)} segments in {time.perf_counter() - start:.1f}s: {vehicles} vehicles, {len(events)} events")
+    reporter = Reporter(config["evidence_path"], config["report_path"], config["camera_location"])
+    return reporter.export_events(events, fps), events
+
+def main():
+    config = {
+        "vehicle_model_path": "models/yolov8m.pt",
+        "trash_model_path": "models/100epochv2.pt",
+        "backend": "torch",
+        "model_registry": None,
+        "stub": False,  # background-subtraction StubDetector instead of the models, for testing
+        "evidence_path": "evidence",
+        "report_path": "reports",
+        "distance_threshold": 150,
+        "max_inactive_frames": 30,
+        "temporal_window": 10,
+        "min_holding": 15,
+        "min_disposal": 20,
+        "min_throw": 5,
+        "depth_threshold": 50,
+        "event_cooldown": 90,
+        "compress_evidence_frames": False,
+        "camera_location": "Location1",
+        "flow_mode": "roi",
+        "flow_scale": 1.0,
+        "depth_interval": 1,
+        "depth_running_norm": False,
+        "trash_cascade": False,
+        "cascade_full_interval": 30,
+        "cascade_margin": 150,
+        "batch_size": 8,
+        "queue_size": 4,
+        "detection_interval": 1
+    }
+    parser = argparse.ArgumentParser(description="Process a recorded video in parallel, overlapping time segments.")
+    parser.add_argument("video")
+    parser.add_argument("--shards", type=int, default=0, help="worker processes (default: one per core)")
+    parser.add_argument("--overlap", type=int, default=90, help="frames each segment also reads on either side")
+    parser.add_argument("--stub", action="store_true", help="use StubDetector instead of the models")
+    parser.add_argument("--registry", help="load models from this model registry")
+    args = parser.parse_args()
+    config.update(stub=args.stub, model_registry=args.registry)
+    os.makedirs(config["evidence_path"], exist_ok=True)
+    os.makedirs(config["report_path"], exist_ok=True)
+
+    report_path, _ = process_video_sharded(args.video, config, args.shards or None, args.overlap)
+    if report_path:
+        print(f"Report generated at: {report_path}")
+    else:
+        print("No events found.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+
+class UniformGrid:
+    def __init__(self, points, cell_size=150.0, dense_pairs=4096):
+        """Uniform grid over (x, y[, z]) points, bucketed by x and y, for radius queries.
+
+        Points are sorted by cell id (row-major), so each row of cells a query touches is one
+        contiguous slice found with searchsorted. Built once per frame; construction is O(N log N).
+        Batches of at most dense_pairs query-point pairs skip the grid and test every pair, which
+        is cheaper at that size.
+        """
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = float(cell_size)
+        self.dense_pairs = dense_pairs
+        if len(self.points) == 0:
+            return
+        cells = np.floor(self.points[:, :2] / self.cell_size).astype(np.int64)
+        self.origin = cells.min(axis=0)
+        cells -= self.origin
+        self.cols = int(cells[:, 0].max()) + 1
+        self.rows = int(cells[:, 1].max()) + 1
+        cell_ids = cells[:, 1] * self.cols + cells[:, 0]
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.sorted_ids = cell_ids[self.order]
+
+    def candidates(self, centers, radii):
+        """(queries, points) index pairs: every point in a cell that each query's circle overlaps.
+
+        All queries are expanded at once: one searchsorted slice per (query, cell row), then the
+        slices are concatenated without a Python loop.
+        """
+        centers = np.asarray(centers, dtype=float)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        empty = np.zeros(0, dtype=np.int64)
+        if len(self.points) == 0 or len(centers) == 0:
+            return empty, empty
+        lo = np.floor((centers[:, :2] - radii[:, None]) / self.cell_size).astype(np.int64) - self.origin
+        hi = np.floor((centers[:, :2] + radii[:, None]) / self.cell_size).astype(np.int64) - self.origin
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, [self.cols - 1, self.rows - 1])
+        row_counts = np.where(lo[:, 0] <= hi[:, 0], np.maximum(hi[:, 1] - lo[:, 1] + 1, 0), 0)
+        row_query = np.repeat(np.arange(len(centers)), row_counts)
+        row_y = lo[row_query, 1] + np.arange(len(row_query)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+        starts = np.searchsorted(self.sorted_ids, row_y * self.cols + lo[row_query, 0], side="left")
+        ends = np.searchsorted(self.sorted_ids, row_y * self.cols + hi[row_query, 0], side="right")
+        counts = ends - starts
+        positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return np.repeat(row_query, counts), self.order[positions]
+
+    def nearest_within(self, centers, radii, max_dz=None, owners=None, groups=None):
+        """For each query center, the nearest point closer than its radius, in one batched call.
+
+        Distance is Euclidean over all coordinates. max_dz additionally bounds the difference in
+        the third coordinate (depth). With owners (one per point, -1 = none) and groups (one per
+        query), a query only sees unowned points and points owned by its group.
+        Returns (indices, distances): -1 and inf where a query has no point in range.
+        """
+        centers = np.asarray(centers, dtype=float)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        indices = np.full(len(centers), -1, dtype=np.int64)
+        distances = np.full(len(centers), np.inf)
+        if len(centers) == 0 or len(self.points) == 0:
+            return indices, distances
+        if len(centers) * len(self.points) <= self.dense_pairs:
+            return self._nearest_dense(centers, radii, max_dz, owners, groups)
+        queries, cand = self.candidates(centers, radii)
+        diff = self.points[cand] - centers[queries]
+        dist = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        ok = dist < radii[queries]
+        if max_dz is not None:
+            ok &= np.abs(diff[:, 2]) < max_dz
+        if owners is not None:
+            ok &= (owners[cand] < 0) | (owners[cand] == np.asarray(groups)[queries])
+        queries, cand, dist = queries[ok], cand[ok], dist[ok]
+        # Nearest pair per query: order by (query, distance) and keep each query's first
+        order = np.lexsort((dist, queries))
+        first = order[np.r_[True, queries[order][1:] != queries[order][:-1]]] if order.size else order
+        indices[queries[first]] = cand[first]
+        distances[queries[first]] = dist[first]
+        return indices, distances
+
+    def _nearest_dense(self, centers, radii, max_dz, owners, groups):
+        """nearest_within over the full (queries, points) distance matrix."""
+        diff = self.points[None, :, :] - centers[:, None, :]
+        dist = np.sqrt(np.einsum('qpk,qpk->qp', diff, diff))
+        ok = dist < radii[:, None]
+        if max_dz is not None:
+            ok &= np.abs(diff[:, :, 2]) < max_dz
+        if owners is not None:
+            ok &= (owners[None, :] < 0) | (owners[None, :] == np.asarray(groups)[:, None])
+        dist = np.where(ok, dist, np.inf)
+        indices = np.argmin(dist, axis=1)
+        distances = dist[np.arange(len(centers)), indices]
+        return np.where(np.isfinite(distances), indices, -1), distances
@@ -0,0 +1,326 @@
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from detection import Detector
+from inference import configure_threads
+from depth_estimation import DepthEstimator
+from backends import model_paths
+from model_registry import ModelRegistry
+from tracking import Tracker
+from events import EventDetector
+from reporting import Reporter
+from optical_flow import OpticalFlow
+from pipeline import analyze_frame
+from cadence import AdaptiveCadence
+from metrics import METRICS
+
+class CameraStats:
+    def __init__(self, window=100):
+        """Rolling throughput and inference latency for one camera."""
+        self.frames = 0
+        self.latencies = deque(maxlen=window)
+        self.completed = deque(maxlen=window)  # completion times, for fps over the window
+
+    def record(self, latency):
+        self.frames += 1
+        self.latencies.append(latency)
+        self.completed.append(time.perf_counter())
+
+    def summary(self):
+        """Frames, fps and latency (ms) over the rolling window."""
+        fps = 0.0
+        if len(self.completed) > 1:
+            span = self.completed[-1] - self.completed[0]
+            fps = (len(self.completed) - 1) / span if span > 0 else 0.0
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "frames": self.frames,
+            "fps": round(fps, 2),
+            "latency_ms_mean": round(float(latencies.mean()), 1),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1)
+        }
+
+class InferenceScheduler:
+    def __init__(self, detector, max_batch=8, max_wait=0.02):
+        """Central inference loop that groups frames from all cameras into batched detector calls.
+
+        A batch is dispatched once it holds max_batch frames or the oldest frame has waited max_wait
+        seconds. Frames of different sizes are batched separately.
+        """
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = defaultdict(CameraStats)
+        self.stats_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name="inference-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the loop after its current batch; frames still queued fail instead of leaving their streams waiting."""
+        with self.lock:
+            self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            request[4].set_exception(RuntimeError("Inference scheduler stopped"))
+
+    def submit(self, camera_id, frame_index, frame):
+        """Queue a frame for detection; the returned Future resolves to its detections."""
+        future = Future()
+        with self.lock:
+            if not self.running:
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+                return future
+            self.requests.put((camera_id, frame_index, frame, time.perf_counter(), future))
+        return future
+
+    def camera_stats(self):
+        """Per-camera fps and latency summaries."""
+        with self.stats_lock:
+            return {camera_id: stats.summary() for camera_id, stats in self.stats.items()}
+
+    def _collect(self):
+        """Wait for one request, then gather more until the batch is full or max_wait has passed."""
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        METRICS.gauge("queue_depth", self.requests.qsize(), queue="scheduler")
+        return batch
+
+    def _loop(self):
+        while self.running:
+            batch = self._collect()
+            groups = defaultdict(list)
+            for request in batch:
+                groups[request[2].shape].append(request)
+            for requests in groups.values():
+                self._run(requests)
+
+    def _run(self, requests):
+        frames = [frame for _, _, frame, _, _ in requests]
+        # Depth is cached per (camera, frame) so indices from different cameras don't collide
+        keys = [(camera_id, frame_index) for camera_id, frame_index, _, _, _ in requests]
+        try:
+            batch_detections = self.detector.detect_batch(frames, keys)
+        except Exception as e:
+            for request in requests:
+                request[4].set_exception(e)
+            return
+        done = time.perf_counter()
+        with self.stats_lock:
+            for (camera_id, _, _, submitted, _), detections in zip(requests, batch_detections):
+                self.stats[camera_id].record(done - submitted)
+        for request, detections in zip(requests, batch_detections):
+            request[4].set_result(detections)
+
+class CameraStream:
+    def __init__(self, camera_id, source, scheduler, reporter, max_in_flight=2, tracker_kwargs=None, event_kwargs=None,
+                 flow_kwargs=None, detection_interval=1, max_events=100):
+        """One RTSP/file source with its own tracking, optical flow and event state.
+
+        With detection_interval > 1, quiet frames aren't sent to the scheduler and are tracked by prediction.
+        Only the last max_events events are kept, without their frames once the evidence writer has them.
+        """
+        self.camera_id = camera_id
+        self.source = source
+        self.scheduler = scheduler
+        self.reporter = reporter
+        self.max_in_flight = max_in_flight
+        self.tracker = Tracker(**(tracker_kwargs or {}))
+        self.event_detector = EventDetector(max_events=max_events, **(event_kwargs or {}))
+        self.optical_flow = OpticalFlow(**(flow_kwargs or {}))
+        self.cadence = AdaptiveCadence(detection_interval) if detection_interval > 1 else None
+        self.events_data = deque(maxlen=max_events)
+        self.evidence = None
+        self.report_path = None
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"camera-{camera_id}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self):
+        self.thread.join()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            self.error = f"Could not open source {self.source}"
+            print(f"Error: [{self.camera_id}] {self.error}")
+            return
+        self.tracker.frame_rate = cap.get(cv2.CAP_PROP_FPS) or self.tracker.frame_rate
+        self.evidence = self.reporter.evidence_writer(fps=self.tracker.frame_rate or 30.0, report_id=self.camera_id)
+        # A few frames stay in flight so this camera's next frames can join other cameras' batches
+        in_flight = deque()
+        frame_index = 0
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                future = None
+                if self.cadence is None or self.cadence.should_detect(frame_index, frame):
+                    future = self.scheduler.submit(self.camera_id, frame_index, frame)
+                in_flight.append((frame_index, frame, future))
+                frame_index += 1
+                if len(in_flight) >= self.max_in_flight:
+                    self._analyze(*in_flight.popleft())
+            while in_flight:
+                self._analyze(*in_flight.popleft())
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error: [{self.camera_id}] {e}")
+        finally:
+            cap.release()
+        self.report_path = self.evidence.close()
+
+    def _analyze(self, frame_index, frame, future):
+        if future is not None:
+            detections = future.result()
+        else:
+            detections = self.tracker.predict_detections(frame_index, frame.shape)
+        _, new_events = analyze_frame(self.optical_flow, self.tracker, self.event_detector,
+                                      frame_index, frame, detections)
+        self.events_data.extend(new_events)
+        self.evidence.add_frame(frame)  # post-roll for earlier events' clips
+        for event in new_events:
+            self.evidence.submit(event)
+            event["frames"] = []  # the clip has its own list; don't hold raw frames for the life of the stream
+        if self.cadence is not None:
+            self.cadence.observe(self.tracker.tracking_data)
+
+class MultiStreamRunner:
+    def __init__(self, detector, cameras, evidence_path, report_path, max_batch=8, max_wait=0.02,
+                 max_in_flight=2, tracker_kwargs=None, event_kwargs=None, flow_kwargs=None, detection_interval=1):
+        """Run N camera sources against one shared set of loaded models.
+
+        cameras is a list of {"id", "source", "location"} dicts.
+        """
+        self.scheduler = InferenceScheduler(detector, max_batch, max_wait)
+        self.streams = []
+        for camera in cameras:
+            # Separate evidence folders so same-numbered vehicles from different cameras don't clash
+            camera_evidence_path = os.path.join(evidence_path, camera["id"])
+            os.makedirs(camera_evidence_path, exist_ok=True)
+            reporter = Reporter(camera_evidence_path, report_path, camera.get("location", camera["id"]))
+            self.streams.append(CameraStream(camera["id"], camera["source"], self.scheduler, reporter,
+                                             max_in_flight, tracker_kwargs, event_kwargs, flow_kwargs,
+                                             detection_interval))
+
+    def start(self):
+        self.scheduler.start()
+        for stream in self.streams:
+            stream.start()
+
+    def stop(self):
+        for stream in self.streams:
+            stream.stop()
+
+    def join(self, stats_interval=None):
+        """Wait for every stream to end, printing per-camera stats every stats_interval seconds."""
+        last_print = time.perf_counter()
+        while any(stream.thread.is_alive() for stream in self.streams):
+            time.sleep(0.5)
+            if stats_interval and time.perf_counter() - last_print >= stats_interval:
+                self.print_stats()
+                last_print = time.perf_counter()
+        for stream in self.streams:
+            stream.join()
+        self.scheduler.stop()
+
+    def stats(self):
+        return self.scheduler.camera_stats()
+
+    def print_stats(self):
+        for camera_id, stats in sorted(self.stats().items()):
+            print(f"[{camera_id}] frames={stats['frames']} fps={stats['fps']} "
+                  f"latency={stats['latency_ms_mean']}ms p95={stats['latency_ms_p95']}ms")
+
+def main():
+    config = {
+        "vehicle_model_path": "models/yolov8m.pt",
+        "trash_model_path": "models/100epochv2.pt",
+        "backend": "torch",  # "onnx" / "onnx-int8": exported models (python backends.py) on ONNX Runtime
+        "model_registry": None,  # e.g. "models/registry": load versioned local models (python model_registry.py) instead of the paths above
+        "cameras": [
+            {"id": "cam1", "source": "videos/just_vehicle.mp4", "location": "Location1"},
+            {"id": "cam2", "source": "rtsp://192.168.1.20:554/stream1", "location": "Location2"}
+        ],
+        "evidence_path": "evidence",
+        "report_path": "reports",
+        "max_batch": 8,  # frames per batched inference call across cameras
+        "max_wait": 0.02,  # seconds a frame may wait for a batch to fill
+        "max_in_flight": 2,  # frames per camera queued for inference at once
+        "depth_interval": 1,  # per camera: run MiDaS every Nth frame (or on scene change), reuse the map in between
+        "depth_running_norm": False,  # normalize depth with a running min/max per camera
+        "trash_cascade": False,  # run the trash model only on crops around detected vehicles (approximate)
+        "cascade_full_interval": 30,  # trash cascade: still run it on each camera's full frame every Nth frame
+        "cascade_margin": 150,  # trash cascade: pixels around each vehicle to search
+        "detection_interval": 1,  # per camera: run the models at least every Nth frame, more often on motion or events
+        "stats_interval": 10,
+        "metrics_path": "reports/metrics.json"  # per-stage latency percentiles, fps, queue depths and memory of the run
+    }
+    os.makedirs(config["evidence_path"], exist_ok=True)
+    os.makedirs(config["report_path"], exist_ok=True)
+
+    configure_threads()  # one Detector, shared by every camera
+    if config["model_registry"]:
+        registry = ModelRegistry(config["model_registry"])
+        depth_estimator = DepthEstimator(refresh_interval=config["depth_interval"], running_norm=config["depth_running_norm"],
+                                         **registry.depth_kwargs(config["backend"]))
+        vehicle_model, trash_model = registry.detector_models(config["backend"])
+    else:
+        vehicle_model, trash_model, midas_path = model_paths(config["backend"], config["vehicle_model_path"],
+                                                             config["trash_model_path"])
+        depth_estimator = DepthEstimator(refresh_interval=config["depth_interval"], running_norm=config["depth_running_norm"],
+                                         onnx_path=midas_path)
+    detector = Detector(vehicle_model, trash_model, depth_estimator=depth_estimator,
+                        cascade=config["trash_cascade"], cascade_full_interval=config["cascade_full_interval"],
+                        cascade_margin=config["cascade_margin"])
+    runner = MultiStreamRunner(detector, config["cameras"], config["evidence_path"], config["report_path"],
+                               config["max_batch"], config["max_wait"], config["max_in_flight"],
+                               detection_interval=config["detection_interval"])
+    runner.start()
+    try:
+        runner.join(config["stats_interval"])
+    except KeyboardInterrupt:
+        runner.stop()
+        runner.join()
+    runner.print_stats()
+    print(f"Metrics written to: {METRICS.write_json(config['metrics_path'])}")
+    for stream in runner.streams:
+        if stream.report_path:
+            print(f"[{stream.camera_id}] Report generated at: {stream.report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assignment import gated_assignment, pairwise_distances
+
+def test_pairwise_distances():
+    np.testing.assert_allclose(pairwise_distances([[0, 0], [3, 4]], [[0, 0], [6, 8], [3, 0]]),
+                               [[0, 10, 3], [5, 5, 4]])
+
+def test_gated_assignment_never_returns_pairs_over_the_gate():
+    cost = np.array([[1.0, 90.0, 80.0],
+                     [2.0, 95.0, 99.0],
+                     [60.0, 3.0, 70.0]])
+    rows, cols = gated_assignment(cost, 50)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0), (2, 1)]
+
+def test_gated_assignment_prefers_total_cost_within_the_gate():
+    cost = np.array([[1.0, 2.0],
+                     [3.0, 40.0]])
+    rows, cols = gated_assignment(cost, 10)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 1), (1, 0)]
+
+def test_gated_assignment_with_nothing_feasible():
+    rows, cols = gated_assignment(np.full((2, 3), 100.0), 50)
+    assert rows.size == 0 and cols.size == 0
+    rows, cols = gated_assignment(np.zeros((0, 4)), 50)
+    assert rows.size == 0
@@ -0,0 +1,48 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cadence import AdaptiveCadence
+from tracking import Tracker
+
+def vehicle(x):
+    return {'bbox': np.array([x - 50, 100, x + 50, 200], dtype=np.float32), 'class_id': 2, 'type': 'vehicle',
+            'center': (x, 150.0, 100.0), 'confidence': 0.9}
+
+def detected_frames(cadence, frames, start=0):
+    return [i for i, frame in enumerate(frames, start) if cadence.should_detect(i, frame)]
+
+def test_still_scene_detects_every_interval():
+    cadence = AdaptiveCadence(interval=5)
+    frame = np.zeros((180, 320, 3), dtype=np.uint8)
+    assert detected_frames(cadence, [frame] * 12) == [0, 5, 10]
+    assert (cadence.detected_frames, cadence.predicted_frames) == (3, 9)
+
+def test_interval_one_detects_every_frame():
+    cadence = AdaptiveCadence(interval=1)
+    frame = np.zeros((180, 320, 3), dtype=np.uint8)
+    assert detected_frames(cadence, [frame] * 4) == [0, 1, 2, 3]
+
+def test_motion_change_forces_detection():
+    cadence = AdaptiveCadence(interval=10)
+    still = np.zeros((180, 320, 3), dtype=np.uint8)
+    moved = still.copy()
+    moved[:, :160] = 255
+    assert detected_frames(cadence, [still, still, moved, moved]) == [0, 2, 3]
+
+def test_observe_switches_to_active_interval_and_back():
+    cadence = AdaptiveCadence(interval=5, active_interval=1)
+    frame = np.zeros((180, 320, 3), dtype=np.uint8)
+    tracker = Tracker()
+    tracker.assign_ids([vehicle(100.0)], 0)
+    cadence.should_detect(0, frame)
+    cadence.observe(tracker.tracking_data)
+    assert detected_frames(cadence, [frame] * 2, start=1) == []
+    tracker.tracking_data[1]['state'] = 'SLOWING_THROW'
+    cadence.observe(tracker.tracking_data)  # the IDLE count changed too, which forces the next frame
+    assert detected_frames(cadence, [frame] * 3, start=3) == [3, 4, 5]
+    tracker.tracking_data[1]['state'] = 'TRASH_DISPOSED'
+    cadence.observe(tracker.tracking_data)
+    assert detected_frames(cadence, [frame] * 5, start=6) == [10]
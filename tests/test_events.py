@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventAggregator
+
+def trigger(aggregator, incidents, vehicle_id, frame_index, event_type):
+    if aggregator.extend(vehicle_id, frame_index, event_type) is None:
+        event = {"vehicle_id": vehicle_id, "event_type": event_type}
+        aggregator.start(vehicle_id, frame_index, event)
+        incidents.append(event)
+
+def test_triggers_within_cooldown_merge_into_one_incident():
+    aggregator, incidents = EventAggregator(cooldown=90), []
+    trigger(aggregator, incidents, 1, 100, "FLOW_DETECTED_THROW")
+    trigger(aggregator, incidents, 1, 150, "STOPPED_DISPOSAL")
+    trigger(aggregator, incidents, 1, 230, "FLOW_DETECTED_THROW")
+    assert len(incidents) == 1
+    incident = incidents[0]
+    assert (incident["start_frame"], incident["end_frame"], incident["triggers"]) == (100, 230, 3)
+    assert incident["event_types"] == ["FLOW_DETECTED_THROW", "STOPPED_DISPOSAL"]
+
+def test_cooldown_counts_from_the_latest_trigger():
+    aggregator, incidents = EventAggregator(cooldown=90), []
+    trigger(aggregator, incidents, 1, 0, "MOVING_THROW")
+    trigger(aggregator, incidents, 1, 89, "MOVING_THROW")
+    trigger(aggregator, incidents, 1, 179, "MOVING_THROW")
+    assert len(incidents) == 2
+    assert incidents[1]["start_frame"] == 179
+
+def test_vehicles_are_aggregated_separately_and_expire():
+    aggregator, incidents = EventAggregator(cooldown=30), []
+    trigger(aggregator, incidents, 1, 10, "THROW_DETECTED")
+    trigger(aggregator, incidents, 2, 12, "THROW_DETECTED")
+    assert len(incidents) == 2
+    aggregator.expire(41)
+    assert list(aggregator.open) == [2]
+    aggregator.expire(42)
+    assert not aggregator.open
@@ -0,0 +1,33 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kalman import ConstantVelocityKalman, CHI2_GATE_3DOF
+
+def test_predict_moves_by_velocity_and_grows_uncertainty():
+    kalman = ConstantVelocityKalman()
+    mean, cov = kalman.initiate([[100.0, 50.0, 20.0]])
+    mean[:, 3:] = [4.0, -2.0, 0.5]
+    predicted, predicted_cov = kalman.predict(mean, cov, dt=3)
+    np.testing.assert_allclose(predicted[0], [112.0, 44.0, 21.5, 4.0, -2.0, 0.5])
+    assert np.all(np.diag(predicted_cov[0]) > np.diag(cov[0]))
+
+def test_update_converges_on_constant_velocity_track():
+    kalman = ConstantVelocityKalman()
+    mean, cov = kalman.initiate([[0.0, 0.0, 10.0], [500.0, 300.0, 50.0]])
+    for frame in range(1, 30):
+        mean, cov = kalman.predict(mean, cov)
+        measurements = [[5.0 * frame, 0.0, 10.0], [500.0, 300.0 - 3.0 * frame, 50.0]]
+        mean, cov = kalman.update(mean, cov, measurements)
+    np.testing.assert_allclose(mean[:, 3:], [[5.0, 0.0, 0.0], [0.0, -3.0, 0.0]], atol=0.2)
+    assert np.all(np.isfinite(cov))
+    np.testing.assert_allclose(cov, np.transpose(cov, (0, 2, 1)), atol=1e-9)
+
+def test_mahalanobis_gates_far_measurements():
+    kalman = ConstantVelocityKalman()
+    mean, cov = kalman.initiate([[100.0, 100.0, 30.0], [100.0, 100.0, 30.0]])
+    mean, cov = kalman.predict(mean, cov)
+    distances = kalman.mahalanobis(mean, cov, [[102.0, 99.0, 30.0], [400.0, 100.0, 30.0]])
+    assert distances[0] < CHI2_GATE_3DOF < distances[1]
@@ -0,0 +1,85 @@
+import os
+import socket
+import sys
+import textwrap
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+from model_registry import ModelRegistry, local_hub
+
+# Stand-ins for the vendored repos, shaped like the real ones: MiDaS_small builds its backbone with a
+# nested GitHub torch.hub.load that asks for pretrained weights
+MIDAS_HUBCONF = """
+dependencies = ["torch"]
+import torch
+
+def MiDaS_small(pretrained=True, **kwargs):
+    assert not pretrained
+    backbone = torch.hub.load("rwightman/gen-efficientnet-pytorch", "tf_efficientnet_lite3", pretrained=True,
+                              exportable=True)
+    return torch.nn.Sequential(backbone)
+"""
+
+EFFNET_HUBCONF = """
+dependencies = ["torch"]
+import torch
+
+def tf_efficientnet_lite3(pretrained=False, **kwargs):
+    assert not pretrained
+    return torch.nn.Linear(2, 2)
+"""
+
+def write_repo(path, hubconf):
+    os.makedirs(path)
+    with open(os.path.join(path, "hubconf.py"), "w") as f:
+        f.write(textwrap.dedent(hubconf))
+    return str(path)
+
+@pytest.fixture
+def registry(tmp_path):
+    weights = tmp_path / "midas_small.pt"
+    model = torch.nn.Sequential(torch.nn.Linear(2, 2))
+    torch.nn.init.constant_(model[0].weight, 0.5)
+    torch.save(model.state_dict(), weights)
+    registry = ModelRegistry(str(tmp_path / "registry"), warmup=False)
+    registry.add("midas", "v1", "midas", str(weights), {
+        "repo": write_repo(tmp_path / "midas", MIDAS_HUBCONF),
+        "gen-efficientnet": write_repo(tmp_path / "effnet", EFFNET_HUBCONF)
+    })
+    return registry
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("network access attempted")
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setattr(torch.hub, "download_url_to_file", refuse)
+
+def test_midas_loads_offline(registry, no_network):
+    midas = registry.get("midas")
+    assert torch.equal(midas[0].weight, torch.full((2, 2), 0.5))
+    assert torch.hub.load.__module__ == "torch.hub"  # the redirect is undone afterwards
+
+def test_missing_vendored_repo_raises(registry, no_network):
+    manifest = registry.manifest("midas")
+    os.rename(os.path.join(manifest["dir"], "gen-efficientnet"), os.path.join(manifest["dir"], "moved"))
+    with pytest.raises(FileNotFoundError):
+        registry.get("midas")
+
+def test_redirect_only_serves_the_loading_thread(registry, no_network):
+    outcome = {}
+    def load_elsewhere():
+        try:
+            outcome["model"] = torch.hub.load("rwightman/gen-efficientnet-pytorch", "tf_efficientnet_lite3")
+        except Exception as e:
+            outcome["error"] = e
+    with local_hub(registry.manifest("midas")["dir"]):
+        assert isinstance(torch.hub.load("rwightman/gen-efficientnet-pytorch", "tf_efficientnet_lite3"), torch.nn.Linear)
+        thread = threading.Thread(target=load_elsewhere)
+        thread.start()
+        thread.join()
+    assert "model" not in outcome  # the other thread got the real torch.hub.load, which needs the network
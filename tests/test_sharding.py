@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import merge_events, plan_segments, stitch_tracks
+
+def test_segments_own_every_frame_once():
+    segments = plan_segments(1000, 4, 90)
+    assert len(segments) == 4
+    assert segments[0]["start"] == 0 and segments[-1]["end"] == 1000
+    for before, after in zip(segments, segments[1:]):
+        assert before["end"] == after["start"]
+        assert after["read_start"] == after["start"] - 90 and before["read_end"] == before["end"] + 90
+    assert segments[0]["read_start"] == 0 and segments[-1]["read_end"] == 1000
+
+def test_short_videos_get_fewer_segments():
+    assert len(plan_segments(300, 8, 90)) == 1
+    assert len(plan_segments(400, 8, 90)) == 2
+
+def test_unknown_frame_count_reads_one_segment_to_the_end():
+    for total in (0, -1):
+        assert plan_segments(total, 4, 90) == [{"index": 0, "start": 0, "end": None, "read_start": 0,
+                                                "read_end": None}]
+
+def track(frames, x, y, dx=0.0):
+    frames = np.asarray(frames, dtype=float)
+    return np.column_stack([frames, x + dx * (frames - frames[0]), np.full(len(frames), y)])
+
+def segment(positions, events=()):
+    return {"positions": positions, "vehicles": set(positions), "events": list(events)}
+
+def test_stitch_tracks_links_vehicles_across_the_boundary():
+    first = segment({1: track(range(0, 110), 100.0, 200.0, dx=2.0), 2: track(range(50, 110), 900.0, 400.0)})
+    # Local ids restart in each segment; track 7 continues 1, track 5 continues 2, track 9 is new
+    second = segment({5: track(range(90, 200), 900.0, 400.0), 7: track(range(90, 200), 280.0, 200.0, dx=2.0),
+                      9: track(range(150, 200), 500.0, 100.0)})
+    first_map, second_map = stitch_tracks([first, second])
+    assert second_map[7] == first_map[1] and second_map[5] == first_map[2]
+    assert second_map[9] not in first_map.values()
+
+def test_stitch_tracks_rejects_tracks_too_far_apart():
+    first = segment({1: track(range(0, 110), 100.0, 200.0)})
+    second = segment({1: track(range(90, 200), 400.0, 200.0)})
+    first_map, second_map = stitch_tracks([first, second], max_distance=50.0)
+    assert first_map[1] != second_map[1]
+
+def event(vehicle_id, start, end, event_type="FLOW_DETECTED_THROW"):
+    return {"vehicle_id": vehicle_id, "start_frame": start, "end_frame": end, "triggers": 1,
+            "event_type": event_type, "event_types": [event_type]}
+
+def test_merge_events_joins_incidents_split_by_a_boundary():
+    results = [segment({1: track(range(0, 110), 100.0, 200.0)}, [event(1, 95, 100)]),
+               segment({4: track(range(90, 200), 100.0, 200.0)}, [event(4, 120, 140, "MOVING_THROW"),
+                                                                   event(4, 300, 300)])]
+    merged = merge_events(results, [{1: 0}, {4: 0}], cooldown=90)
+    assert [(e["vehicle_id"], e["start_frame"], e["end_frame"]) for e in merged] == [(0, 95, 140), (0, 300, 300)]
+    assert merged[0]["triggers"] == 2 and merged[0]["event_types"] == ["FLOW_DETECTED_THROW", "MOVING_THROW"]
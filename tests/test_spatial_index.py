@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_index import UniformGrid
+
+def brute_force_nearest(points, centers, radii, max_dz=None, owners=None, groups=None):
+    indices = []
+    for q, center in enumerate(centers):
+        best, best_dist = -1, np.inf
+        for p, point in enumerate(points):
+            dist = np.linalg.norm(point - center)
+            if dist >= radii[q] or (max_dz is not None and abs(point[2] - center[2]) >= max_dz):
+                continue
+            if owners is not None and owners[p] >= 0 and owners[p] != groups[q]:
+                continue
+            if dist < best_dist:
+                best, best_dist = p, dist
+        indices.append(best)
+    return np.array(indices)
+
+@pytest.mark.parametrize("dense_pairs", [0, 10 ** 9])
+def test_nearest_within_matches_brute_force(dense_pairs):
+    rng = np.random.default_rng(0)
+    points = rng.uniform([0, 0, 0], [1280, 720, 255], (300, 3))
+    centers = rng.uniform([-50, -50, 0], [1330, 770, 255], (80, 3))
+    radii = rng.uniform(10, 200, len(centers))
+    owners = rng.integers(-1, 5, len(points))
+    groups = rng.integers(0, 5, len(centers))
+    grid = UniformGrid(points, cell_size=120.0, dense_pairs=dense_pairs)
+    indices, distances = grid.nearest_within(centers, radii, max_dz=60, owners=owners, groups=groups)
+    expected = brute_force_nearest(points, centers, radii, 60, owners, groups)
+    np.testing.assert_array_equal(indices, expected)
+    found = indices >= 0
+    np.testing.assert_allclose(distances[found], np.linalg.norm(points[indices[found]] - centers[found], axis=1))
+    assert np.all(np.isinf(distances[~found]))
+
+def test_candidates_cover_every_point_in_range():
+    rng = np.random.default_rng(1)
+    points = rng.uniform(0, 1000, (200, 2))
+    centers = rng.uniform(0, 1000, (40, 2))
+    grid = UniformGrid(points, cell_size=75.0)
+    queries, cand = grid.candidates(centers, 90.0)
+    found = set(zip(queries.tolist(), cand.tolist()))
+    within = np.linalg.norm(points[None, :, :] - centers[:, None, :], axis=2) < 90.0
+    assert {(q, p) for q, p in zip(*np.nonzero(within))} <= found
+
+def test_empty_inputs():
+    indices, distances = UniformGrid(np.zeros((0, 3))).nearest_within(np.ones((2, 3)), 10.0)
+    np.testing.assert_array_equal(indices, [-1, -1])
+    assert np.all(np.isinf(distances))
+    indices, _ = UniformGrid(np.ones((3, 3))).nearest_within(np.zeros((0, 3)), 10.0)
+    assert indices.shape == (0,)
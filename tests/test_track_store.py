@@ -0,0 +1,75 @@
+import os
+import sys
+from collections import deque
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from track_store import RingBuffer, TrackStore, TrackTable
+
+def test_ring_buffer_matches_deque():
+    ring = RingBuffer(4, 3)
+    ring.reset(1)
+    expected = deque(maxlen=3)
+    for value in range(7):
+        ring.append(1, float(value))
+        expected.append(float(value))
+        np.testing.assert_array_equal(ring.ordered(1), list(expected))
+    assert ring.get(1, -1) == 6.0 and ring.get(1, 0) == 4.0
+
+def test_ring_buffer_appends_to_many_slots():
+    ring = RingBuffer(3, 4)
+    for slot in range(3):
+        ring.reset(slot)
+    ring.append(np.array([0, 2]), np.array([1.0, 5.0]))
+    ring.append(np.array([0, 1, 2]), np.array([2.0, 7.0, 6.0]))
+    slots = np.arange(3)
+    np.testing.assert_array_equal(ring.last(slots), [2.0, 7.0, 6.0])
+    np.testing.assert_array_equal(ring.count, [2, 1, 2])
+    np.testing.assert_array_equal(ring.sum(slots), [3.0, 7.0, 11.0])
+    np.testing.assert_array_equal(ring.mean(slots), [1.5, 7.0, 5.5])
+
+def test_ring_buffer_sum_ignores_overwritten_and_unfilled_positions():
+    ring = RingBuffer(2, 3, fill=0)
+    ring.reset(0)
+    ring.reset(1)
+    ring.count[1] = 0
+    for value in [1.0, 2.0, 3.0, 4.0]:
+        ring.append(np.array([0, 1]), value)
+    np.testing.assert_array_equal(ring.valid(np.array([0, 1])), np.ones((2, 3), dtype=bool))
+    np.testing.assert_array_equal(ring.sum(np.array([0, 1])), [9.0, 9.0])
+    empty = RingBuffer(1, 3)
+    empty.reset(0)
+    assert empty.mean(np.array([0]))[0] == 0.0
+
+def test_store_reuses_slots_and_grows():
+    store = TrackStore(capacity=2)
+    store.add_field('score', default=1.0)
+    store.add_ring('history', 2)
+    slots = [store.add(tid) for tid in (10, 11, 12)]
+    assert store.capacity == 4 and len(set(slots)) == 3
+    store.rings['history'].append(slots[0], 3.0)
+    store.fields['score'].data[slots[0]] = 9.0
+    store.remove(10)
+    reused = store.add(13)
+    assert reused == slots[0]
+    assert store.fields['score'].data[reused] == 1.0 and store.rings['history'].count[reused] == 0
+    np.testing.assert_array_equal(store.ids[store.active_slots()], [11, 12, 13])
+
+def test_table_columns_and_views():
+    store = TrackStore()
+    store.add_field('type', categories=['vehicle', 'trash'], default='vehicle')
+    store.add_field('state', categories=['IDLE'], default='IDLE')
+    table = TrackTable(store)
+    for tid, kind in [(1, 'vehicle'), (2, 'trash'), (3, 'vehicle')]:
+        store.fields['type'].encode(store.add(tid), kind)
+    table.add_field('state', categories=['other'])  # already registered: kept as is
+    table.add_ring('proximity', 3, dtype=np.uint8, fill=0)
+    table[3]['state'] = 'MOVING'
+    ids, slots = table.slots('vehicle')
+    np.testing.assert_array_equal(ids, [1, 3])
+    np.testing.assert_array_equal(table.isin('state', ['IDLE'], slots), [True, False])
+    np.testing.assert_array_equal(table.isin('state', ['UNKNOWN'], slots), [False, False])
+    np.testing.assert_array_equal(table.ring('proximity').sum(slots), [0, 0])
+    assert table[2]['type'] == 'trash' and table[3]['state'] == 'MOVING'
+    assert list(table) == [1, 2, 3] and 4 not in table
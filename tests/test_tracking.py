@@ -0,0 +1,48 @@
+import os
+import sys
+from collections import deque
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracking import Tracker
+
+def detection(x, y, depth, kind="vehicle", size=60):
+    det = {'bbox': np.array([x - size, y - size, x + size, y + size], dtype=np.float32),
+           'class_id': 2 if kind == "vehicle" else 1, 'type': kind, 'center': (x, y, depth), 'confidence': 0.9}
+    if kind == "trash":
+        det['depth_history'] = deque(maxlen=10)
+        det['trajectory'] = deque(maxlen=10)
+    return det
+
+def test_ids_follow_moving_objects():
+    tracker = Tracker()
+    for frame in range(10):
+        detections = [detection(100.0 + 5 * frame, 200.0, 80.0), detection(800.0, 500.0 - 4 * frame, 120.0)]
+        tracker.assign_ids(detections, frame)
+        assert [det['id'] for det in detections] == [1, 2]
+    assert len(tracker.tracking_data) == 2
+    assert tracker.tracking_data[1]['smoothed_velocity'] > 0
+
+def test_zero_depth_gives_finite_velocity():
+    tracker = Tracker()
+    for frame in range(5):
+        tracker.assign_ids([detection(300.0 + 3 * frame, 300.0, 0.0, "trash", size=8)], frame)
+    velocity = tracker.tracking_data[1]['smoothed_velocity']
+    assert np.isfinite(velocity)
+
+def test_predicted_detections_stay_in_the_frame():
+    tracker = Tracker()
+    frame_shape = (720, 1280, 3)
+    # Fast toward the right edge: extrapolating 10 frames ahead would leave the frame
+    for frame in range(6):
+        tracker.assign_ids([detection(1000.0 + 40 * frame, 360.0, 90.0)], frame)
+    predicted = tracker.predict_detections(15, frame_shape)
+    assert len(predicted) == 1
+    det = predicted[0]
+    x1, y1, x2, y2 = det['bbox']
+    assert 0 <= det['center'][0] <= 1279 and 0 <= det['center'][1] <= 719
+    assert 0 <= x1 < x2 <= 1280 and 0 <= y1 < y2 <= 720
+    assert det['center'][2] == 90.0
+    tracker.assign_ids(predicted, 15)
+    assert np.isfinite(tracker.tracking_data[1]['smoothed_velocity'])
@@ -0,0 +1,303 @@
+from collections.abc import Mapping
+import numpy as np
+
+class RingBuffer:
+    def __init__(self, capacity, maxlen, shape=(), dtype=np.float64, fill=None):
+        """Fixed-length history per track slot, preallocated as one (capacity, maxlen, *shape) array.
+
+        With fill=None a reset slot starts empty; otherwise it starts full of fill, like deque([fill] * maxlen).
+        """
+        self.maxlen = maxlen
+        self.fill = fill
+        self.data = np.zeros((capacity, maxlen) + tuple(shape), dtype=dtype)
+        self.head = np.zeros(capacity, dtype=np.int64)  # next write position
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def grow(self, capacity):
+        extra = capacity - len(self.head)
+        self.data = np.concatenate([self.data, np.zeros((extra,) + self.data.shape[1:], dtype=self.data.dtype)])
+        self.head = np.concatenate([self.head, np.zeros(extra, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+
+    def reset(self, slot):
+        self.head[slot] = 0
+        if self.fill is None:
+            self.data[slot] = 0
+            self.count[slot] = 0
+        else:
+            self.data[slot] = self.fill
+            self.count[slot] = self.maxlen
+
+    def append(self, slot, value):
+        """Append value to one slot, or one value per slot to an array of distinct slots."""
+        head = self.head[slot]
+        self.data[slot, head] = value
+        self.head[slot] = (head + 1) % self.maxlen
+        self.count[slot] = np.minimum(self.count[slot] + 1, self.maxlen)
+
+    def get(self, slot, i):
+        n = self.count[slot]
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("ring buffer index out of range")
+        value = self.data[slot, (self.head[slot] - n + i) % self.maxlen]
+        return value.copy() if value.ndim else value
+
+    def ordered(self, slot):
+        """Oldest-to-newest copy of one slot's history."""
+        n = self.count[slot]
+        return self.data[slot, (self.head[slot] - n + np.arange(n)) % self.maxlen]
+
+    def last(self, slots):
+        """Newest entry of each slot in slots, as one array."""
+        return self.data[slots, (self.head[slots] - 1) % self.maxlen]
+
+    def valid(self, slots):
+        """(len(slots), maxlen) mask of the positions that hold entries."""
+        offsets = (np.arange(self.maxlen) - self.head[slots, None]) % self.maxlen
+        return offsets >= self.maxlen - self.count[slots, None]
+
+    def sum(self, slots):
+        """Sum of each slot's entries."""
+        return np.where(self.valid(slots), self.data[slots], 0).sum(axis=1)
+
+    def mean(self, slots):
+        """Mean of each slot's entries, 0 for empty slots."""
+        return self.sum(slots) / np.maximum(self.count[slots], 1)
+
+class Field:
+    def __init__(self, capacity, shape=(), dtype=np.float64, default=0, categories=None, optional=False):
+        """One value per track slot. Category fields store string codes; optional fields store None as NaN."""
+        self.shape = tuple(shape)
+        self.default = default
+        self.categories = list(categories) if categories is not None else None
+        self.codes = {name: code for code, name in enumerate(self.categories or [])}
+        self.optional = optional
+        if self.categories is not None:
+            dtype = np.int16
+        self.data = np.zeros((capacity,) + self.shape, dtype=dtype)
+
+    def grow(self, capacity):
+        extra = capacity - len(self.data)
+        self.data = np.concatenate([self.data, np.zeros((extra,) + self.shape, dtype=self.data.dtype)])
+
+    def reset(self, slot):
+        self.encode(slot, self.default)
+
+    def encode(self, slot, value):
+        if self.categories is not None:
+            if value not in self.codes:
+                self.codes[value] = len(self.categories)
+                self.categories.append(value)
+            value = self.codes[value]
+        elif self.optional and value is None:
+            value = np.nan
+        self.data[slot] = value
+
+    def decode(self, slot):
+        value = self.data[slot]
+        if self.categories is not None:
+            return self.categories[value]
+        if self.optional and np.isnan(value).all():
+            return None
+        return value.item() if not self.shape else value.copy()
+
+class TrackStore:
+    def __init__(self, capacity=64):
+        """Struct-of-arrays storage for live tracks; each track owns one slot in every column."""
+        self.capacity = capacity
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.fields = {}
+        self.rings = {}
+        self.objects = {}  # name -> (per-slot list, factory) for values that can't live in arrays
+        self.extras = {}  # slot -> dict of keys no column was registered for
+        self.slots = {}  # track id -> slot, in insertion order
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def add_field(self, name, shape=(), dtype=np.float64, default=0, categories=None, optional=False):
+        self.fields[name] = Field(self.capacity, shape, dtype, default, categories, optional)
+        for slot in self.slots.values():
+            self.fields[name].reset(slot)
+
+    def add_ring(self, name, maxlen, shape=(), dtype=np.float64, fill=None):
+        self.rings[name] = RingBuffer(self.capacity, maxlen, shape, dtype, fill)
+        for slot in self.slots.values():
+            self.rings[name].reset(slot)
+
+    def add_object(self, name, factory):
+        values = [None] * self.capacity
+        for slot in self.slots.values():
+            values[slot] = factory()
+        self.objects[name] = (values, factory)
+
+    def has(self, name):
+        return name in self.fields or name in self.rings or name in self.objects
+
+    def add(self, tid):
+        """Claim a slot for a new track and reset every column to its initial value."""
+        if not self.free:
+            self._grow(2 * self.capacity)
+        slot = self.free.pop()
+        self.ids[slot] = tid
+        self.slots[tid] = slot
+        for field in self.fields.values():
+            field.reset(slot)
+        for ring in self.rings.values():
+            ring.reset(slot)
+        for values, factory in self.objects.values():
+            values[slot] = factory()
+        return slot
+
+    def remove(self, tid):
+        slot = self.slots.pop(tid)
+        self.ids[slot] = -1
+        self.extras.pop(slot, None)
+        for values, _ in self.objects.values():
+            values[slot] = None
+        self.free.append(slot)
+
+    def active_slots(self):
+        """Slots of live tracks, in the order the tracks were created."""
+        return np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+
+    def _grow(self, capacity):
+        for field in self.fields.values():
+            field.grow(capacity)
+        for ring in self.rings.values():
+            ring.grow(capacity)
+        for values, _ in self.objects.values():
+            values.extend([None] * (capacity - self.capacity))
+        self.ids = np.concatenate([self.ids, np.full(capacity - self.capacity, -1, dtype=np.int64)])
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+class RingView:
+    __slots__ = ("ring", "slot")
+
+    def __init__(self, ring, slot):
+        """Deque-like view of one track's ring buffer."""
+        self.ring = ring
+        self.slot = slot
+
+    def __len__(self):
+        return int(self.ring.count[self.slot])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.ring.ordered(self.slot)[i]
+        return self.ring.get(self.slot, i)
+
+    def __iter__(self):
+        return iter(self.ring.ordered(self.slot))
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.ring.ordered(self.slot)
+        return values if dtype is None else values.astype(dtype)
+
+    def append(self, value):
+        self.ring.append(self.slot, value)
+
+class TrackView:
+    __slots__ = ("store", "slot")
+
+    def __init__(self, store, slot):
+        """Dict-like view of one track, so callers can keep using track['key'] access."""
+        self.store = store
+        self.slot = slot
+
+    def __getitem__(self, key):
+        store = self.store
+        if key in store.rings:
+            return RingView(store.rings[key], self.slot)
+        if key in store.fields:
+            return store.fields[key].decode(self.slot)
+        if key in store.objects:
+            return store.objects[key][0][self.slot]
+        extras = store.extras.get(self.slot)
+        if extras is not None and key in extras:
+            return extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        store = self.store
+        if key in store.rings:
+            ring = store.rings[key]
+            ring.count[self.slot] = 0
+            ring.head[self.slot] = 0
+            for item in value:
+                ring.append(self.slot, item)
+        elif key in store.fields:
+            store.fields[key].encode(self.slot, value)
+        elif key in store.objects:
+            store.objects[key][0][self.slot] = value
+        else:
+            store.extras.setdefault(self.slot, {})[key] = value
+
+    def __contains__(self, key):
+        return self.store.has(key) or key in self.store.extras.get(self.slot, ())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self):
+        store = self.store
+        return list(store.fields) + list(store.rings) + list(store.objects) + list(store.extras.get(self.slot, ()))
+
+class TrackTable(Mapping):
+    def __init__(self, store):
+        """Read-only mapping of track id -> TrackView over a TrackStore, replacing the dict of track dicts.
+
+        Per-frame consumers should use the column methods (slots, column, ring, isin) instead of the
+        views, and add_field/add_ring to keep their own per-track state next to the tracker's.
+        """
+        self.store = store
+
+    def add_field(self, name, shape=(), dtype=np.float64, default=0, categories=None, optional=False):
+        """Register a per-track column, unless one with this name exists."""
+        if not self.store.has(name):
+            self.store.add_field(name, shape, dtype, default, categories, optional)
+
+    def add_ring(self, name, maxlen, shape=(), dtype=np.float64, fill=None):
+        """Register a per-track history, unless one with this name exists."""
+        if not self.store.has(name):
+            self.store.add_ring(name, maxlen, shape, dtype, fill)
+
+    def slots(self, type=None):
+        """(ids, slots) of the live tracks, or only those of one type, in the order they were created."""
+        slots = self.store.active_slots()
+        if type is not None:
+            slots = slots[self.isin('type', [type], slots)]
+        return self.store.ids[slots], slots
+
+    def column(self, name):
+        """The array holding a field for every slot; index it with slots. Category fields hold codes."""
+        return self.store.fields[name].data
+
+    def ring(self, name):
+        """The RingBuffer holding a history for every slot."""
+        return self.store.rings[name]
+
+    def isin(self, name, values, slots):
+        """Whether each slot's category field is one of values."""
+        field = self.store.fields[name]
+        return np.isin(field.data[slots], [field.codes[v] for v in values if v in field.codes])
+
+    def __getitem__(self, tid):
+        return TrackView(self.store, self.store.slots[tid])
+
+    def __iter__(self):
+        return iter(self.store.slots)
+
+    def __len__(self):
+        return len(self.store.slots)
+
+    def __contains__(self, tid):
+        return tid in self.store.slots
@@ -1,10 +1,29 @@
-from collections import deque
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+from collections import deque
+from assignment import pairwise_distances, gated_assignment
+from kalman import ConstantVelocityKalman, CHI2_GATE_3DOF
+from track_store import TrackStore, TrackTable
 
 class Tracker:
     def __init__(self, distance_threshold=150, max_inactive=30, frame_rate=30.0, fov_horizontal=60.0, resolution=(1280, 720)):
-        self.tracking_data = {}
+        # Track state lives in preallocated per-slot arrays; tracking_data exposes it as track dicts
+        self.store = TrackStore()
+        self.store.add_field('type', categories=['vehicle', 'trash'], default='vehicle')
+        self.store.add_field('bbox', shape=(4,))
+        self.store.add_field('class_id', dtype=np.int64)
+        self.store.add_field('confidence', default=0.0)
+        self.store.add_field('smoothed_velocity', default=0.0)
+        self.store.add_field('last_seen', dtype=np.int64)
+        self.store.add_field('state', categories=['IDLE'], default='IDLE')
+        self.store.add_ring('center', 30, shape=(3,))
+        self.store.add_ring('area_history', 5)
+        self.store.add_ring('velocity', 5)
+        self.store.add_ring('trajectory', 10, shape=(2,))  # trash only
+        self.store.add_field('kf_mean', shape=(6,))
+        self.store.add_field('kf_cov', shape=(6, 6))
+        self.kalman = ConstantVelocityKalman()
+        self.last_frame = None  # frame every track's Kalman state has been predicted to
+        self.tracking_data = TrackTable(self.store)
         self.next_id = 1
         self.dist_thresh = distance_threshold
         self.max_inactive = max_inactive
@@ -21,105 +40,180 @@ class Tracker:
     def assign_ids(self, detections, current_frame):
         """Assign IDs to detections and update tracking data."""
         self._clean_inactive(current_frame)
+        self._predict(current_frame)
         
-        if not self.tracking_data:
-            for det in detections:
-                tid = self.next_id
-                det['id'] = tid
-                self._init_track(det, current_frame)
-                self.next_id += 1
+        if not self.tracking_data or not detections:
+            self._init_tracks(detections, current_frame)
             return
 
-        cost = np.zeros((len(detections), len(self.tracking_data)))
-        for i, det in enumerate(detections):
-            for j, (tid, track) in enumerate(self.tracking_data.items()):
-                cost[i, j] = self._calc_distance(det['center'], track['center'][-1])
-        
-        row_idx, col_idx = linear_sum_assignment(cost)
+        slots = self.store.active_slots()
+        track_ids = self.store.ids[slots]
+        centers = np.array([det['center'] for det in detections], dtype=float)
+        means = self.store.fields['kf_mean'].data
+        covs = self.store.fields['kf_cov'].data
+        # First match against predicted positions, gated by Mahalanobis distance; only same-type pairs
+        # within distance_threshold of the prediction are scored
+        types = self.store.fields['type']
+        same_type = np.array([types.codes.get(det['type'], -1) for det in detections])[:, None] == types.data[slots][None, :]
+        rows, cols = np.nonzero((pairwise_distances(centers, means[slots, :3]) < self.dist_thresh) & same_type)
+        cost = np.full((len(detections), len(slots)), np.inf)
+        cost[rows, cols] = self.kalman.mahalanobis(means[slots[cols]], covs[slots[cols]], centers[rows])
+        row_idx, col_idx = gated_assignment(cost, CHI2_GATE_3DOF)
+        # Then give what's left the old nearest-last-position matching, so abrupt starts and stops
+        # the motion model didn't expect still keep their IDs
+        rest_rows = np.setdiff1d(np.arange(len(detections)), row_idx)
+        rest_cols = np.setdiff1d(np.arange(len(slots)), col_idx)
+        if rest_rows.size and rest_cols.size:
+            cost = pairwise_distances(centers[rest_rows], self.store.rings['center'].last(slots[rest_cols]))
+            cost[~same_type[np.ix_(rest_rows, rest_cols)]] = np.inf
+            r, c = gated_assignment(cost, self.dist_thresh)
+            row_idx = np.concatenate([row_idx, rest_rows[r]])
+            col_idx = np.concatenate([col_idx, rest_cols[c]])
+
+        # Predicted detections only carry the tracks along; they don't correct the filter
+        observed = np.array([not detections[r].get('predicted', False) for r in row_idx], dtype=bool)
+        if observed.any():
+            matched = slots[col_idx[observed]]
+            means[matched], covs[matched] = self.kalman.update(means[matched], covs[matched], centers[row_idx[observed]])
         
-        assigned_dets = []
         for r, c in zip(row_idx, col_idx):
-            if cost[r, c] < self.dist_thresh:
-                tid = list(self.tracking_data.keys())[c]
-                detections[r]['id'] = tid
-                self._update_track(tid, detections[r], current_frame)
-                assigned_dets.append(r)
+            detections[r]['id'] = int(track_ids[c])
+        self._update_tracks(slots[col_idx], [detections[r] for r in row_idx], current_frame)
+        assigned = np.zeros(len(detections), dtype=bool)
+        assigned[row_idx] = True
+        self._init_tracks([det for i, det in enumerate(detections) if not assigned[i]], current_frame)
+
+    def _predict(self, current_frame):
+        """Advance every track's Kalman state to current_frame, coasting over any skipped or dropped frames."""
+        if self.last_frame is not None and current_frame > self.last_frame and self.store.slots:
+            slots = self.store.active_slots()
+            means = self.store.fields['kf_mean'].data
+            covs = self.store.fields['kf_cov'].data
+            means[slots], covs[slots] = self.kalman.predict(means[slots], covs[slots], current_frame - self.last_frame)
+        self.last_frame = current_frame
+
+    def predict_detections(self, current_frame, frame_shape=None):
+        """Detections for a frame that skipped inference, at the Kalman-predicted positions of the tracks.
+
+        Only tracks matched on the last processed frame are predicted; tracks that went unmatched are
+        left to age out instead of being kept alive by predictions. Depth keeps the last observed
+        value (the filter's depth velocity is too noisy to extrapolate), and with frame_shape the
+        predicted centers and boxes are clipped to the frame.
+        """
+        store = self.store
+        if self.last_frame is None or not store.slots:
+            return []
+        fields = store.fields
+        slots = store.active_slots()
+        slots = slots[fields['last_seen'].data[slots] == self.last_frame]
+        mean, _ = self.kalman.predict(fields['kf_mean'].data[slots], fields['kf_cov'].data[slots],
+                                      current_frame - self.last_frame)
+        last = store.rings['center'].last(slots)
+        centers = np.column_stack([mean[:, :2], last[:, 2]])
+        if frame_shape is not None:
+            height, width = frame_shape[:2]
+            centers[:, :2] = np.clip(centers[:, :2], 0, [width - 1, height - 1])
+        step = centers[:, :2] - last[:, :2]
+        bboxes = fields['bbox'].data[slots] + np.hstack([step, step])
+        if frame_shape is not None:
+            # At least a pixel wide and high, so the area-based distance stays finite
+            bboxes[:, :2] = np.clip(bboxes[:, :2], 0, [width - 1, height - 1])
+            bboxes[:, 2:] = np.clip(bboxes[:, 2:], bboxes[:, :2] + 1, [width, height])
+        types = fields['type']
+        detections = []
+        for slot, center, bbox in zip(slots, centers, bboxes):
+            det = {
+                'bbox': bbox,
+                'class_id': int(fields['class_id'].data[slot]),
+                'type': types.categories[types.data[slot]],
+                'center': tuple(center),
+                'confidence': float(fields['confidence'].data[slot]),
+                'predicted': True
+            }
+            if det['type'] == 'trash':
+                det['depth_history'] = deque(maxlen=10)
+                det['trajectory'] = deque(maxlen=10)
+            detections.append(det)
+        return detections
 
+    def _columns(self, detections):
+        """(centers, bboxes, areas) of detections as arrays."""
+        centers = np.array([det['center'] for det in detections], dtype=float).reshape(-1, 3)
+        bboxes = np.array([det['bbox'] for det in detections], dtype=float).reshape(-1, 4)
+        areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        return centers, bboxes, areas
+
+    def _init_tracks(self, detections, frame):
+        """Start a new track, with a new ID, for each detection."""
+        if not detections:
+            return
+        fields, rings = self.store.fields, self.store.rings
+        slots = np.empty(len(detections), dtype=np.int64)
         for i, det in enumerate(detections):
-            if i not in assigned_dets:
-                tid = self.next_id
-                det['id'] = tid
-                self._init_track(det, current_frame)
-                self.next_id += 1
-
-    def _calc_distance(self, p1, p2):
-        """Calculate 3D Euclidean distance between two points."""
-        return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2 + (p1[2] - p2[2])**2)
-
-    def _init_track(self, det, frame):
-        """Initialize a new track."""
-        area = (det['bbox'][2] - det['bbox'][0]) * (det['bbox'][3] - det['bbox'][1])
-        self.tracking_data[det['id']] = {
-            'type': det['type'],
-            'bbox': det['bbox'],
-            'center': deque([det['center']], maxlen=30),
-            'area_history': deque([area], maxlen=5),
-            'velocity': deque([0.0], maxlen=5),
-            'smoothed_velocity': 0.0,
-            'last_seen': frame,
-            'state': 'IDLE'
-        }
-        if det['type'] == 'trash':
-            self.tracking_data[det['id']]['trajectory'] = deque([det['center'][:2]], maxlen=10)
+            det['id'] = self.next_id
+            self.next_id += 1
+            slots[i] = self.store.add(det['id'])
+            fields['type'].encode(slots[i], det['type'])
+        centers, bboxes, areas = self._columns(detections)
+        fields['kf_mean'].data[slots], fields['kf_cov'].data[slots] = self.kalman.initiate(centers)
+        fields['bbox'].data[slots] = bboxes
+        fields['class_id'].data[slots] = [det['class_id'] for det in detections]
+        fields['confidence'].data[slots] = [det['confidence'] for det in detections]
+        fields['last_seen'].data[slots] = frame
+        rings['center'].append(slots, centers)
+        rings['area_history'].append(slots, areas)
+        rings['velocity'].append(slots, 0.0)
+        trash = fields['type'].data[slots] == fields['type'].codes['trash']
+        rings['trajectory'].append(slots[trash], centers[trash, :2])
 
     def _estimate_distance_from_area(self, depth, area):
         """Estimate distance using depth and area."""
         base_area = 10000
         base_depth = 255.0
+        # Depth normalization can put far regions at exactly 0, and a box can be degenerate
+        depth = np.maximum(depth, 1e-3)
+        area = np.maximum(area, 1.0)
         distance = np.sqrt(base_area * (base_depth / depth) / area)
         return distance * self.pixel_to_meter
 
-    def _triangulate_position(self, center, area):
-        """Triangulate 3D position."""
-        depth = center[2]
-        estimated_distance = self._estimate_distance_from_area(depth, area)
-        x = (center[0] - self.resolution[0] / 2) * estimated_distance / (self.resolution[0] / 2)
-        y = (center[1] - self.resolution[1] / 2) * estimated_distance / (self.resolution[1] / 2)
+    def _triangulate_position(self, centers, areas):
+        """Triangulate the 3D position of each (x, y, depth) center."""
+        depth = centers[:, 2]
+        estimated_distance = self._estimate_distance_from_area(depth, areas)
+        x = (centers[:, 0] - self.resolution[0] / 2) * estimated_distance / (self.resolution[0] / 2)
+        y = (centers[:, 1] - self.resolution[1] / 2) * estimated_distance / (self.resolution[1] / 2)
         z = depth * self.pixel_to_meter
-        return np.array([x, y, z])
+        return np.stack([x, y, z], axis=1)
 
-    def _update_track(self, tid, det, frame):
-        """Update track with refined velocity and smoothing."""
-        track = self.tracking_data[tid]
-        prev_center = track['center'][-1]
-        current_center = det['center']
-        
-        track['bbox'] = det['bbox']
-        track['center'].append(current_center)
-        area = (det['bbox'][2] - det['bbox'][0]) * (det['bbox'][3] - det['bbox'][1])
-        track['area_history'].append(area)
-        track['last_seen'] = frame
-        
-        if track['type'] == 'trash':
-            track['trajectory'].append(current_center[:2])
-        
-        if len(track['center']) > 1:
-            prev_pos = self._triangulate_position(prev_center, track['area_history'][-2])
-            curr_pos = self._triangulate_position(current_center, area)
-            displacement = curr_pos - prev_pos
-            raw_velocity = np.linalg.norm(displacement) * self.frame_rate
-            if np.abs(raw_velocity) < 0.1:
-                velocity = 0.0
-            else:
-                velocity = raw_velocity
-            # Temporal smoothing
-            alpha = 0.3
-            track['smoothed_velocity'] = alpha * velocity + (1 - alpha) * track.get('smoothed_velocity', 0.0)
-            track['velocity'].append(track['smoothed_velocity'])
+    def _update_tracks(self, slots, detections, frame):
+        """Update the tracks in slots with their matched detections, refining and smoothing their velocity."""
+        if not detections:
+            return
+        fields, rings = self.store.fields, self.store.rings
+        centers, bboxes, areas = self._columns(detections)
+        prev_pos = self._triangulate_position(rings['center'].last(slots), rings['area_history'].last(slots))
+
+        fields['bbox'].data[slots] = bboxes
+        fields['class_id'].data[slots] = [det['class_id'] for det in detections]
+        fields['confidence'].data[slots] = [det['confidence'] for det in detections]
+        fields['last_seen'].data[slots] = frame
+        rings['center'].append(slots, centers)
+        rings['area_history'].append(slots, areas)
+        trash = fields['type'].data[slots] == fields['type'].codes['trash']
+        rings['trajectory'].append(slots[trash], centers[trash, :2])
+
+        displacement = self._triangulate_position(centers, areas) - prev_pos
+        velocity = np.linalg.norm(displacement, axis=1) * self.frame_rate
+        velocity[np.abs(velocity) < 0.1] = 0.0
+        # Temporal smoothing
+        alpha = 0.3
+        smoothed = fields['smoothed_velocity'].data
+        smoothed[slots] = alpha * velocity + (1 - alpha) * smoothed[slots]
+        rings['velocity'].append(slots, smoothed[slots])
 
     def _clean_inactive(self, current_frame):
         """Remove inactive tracks."""
-        inactive = [tid for tid, data in self.tracking_data.items()
-                    if current_frame - data['last_seen'] > self.max_inactive]
-        for tid in inactive:
-            del self.tracking_data[tid]
\ No newline at end of file
+        slots = self.store.active_slots()
+        last_seen = self.store.fields['last_seen'].data[slots]
+        for tid in self.store.ids[slots[current_frame - last_seen > self.max_inactive]]:
+            self.store.remove(int(tid))
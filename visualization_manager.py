@@ -1,13 +1,16 @@
 import cv2
 import numpy as np
+from collections import deque
 from depth_visualization import DepthVisualizer 
+from optical_flow import FlowField
+from metrics import METRICS
 
 class VisualizationManager:
     def __init__(self, detector):
         """Initialize with the existing Detector instance."""
         self.detector = detector
         self.current_mode = 'normal'  # Default to existing visualization
-        self.depth_visualizer = DepthVisualizer()  # For depth visualization
+        self.depth_visualizer = DepthVisualizer(detector.depth_estimator)  # Shares the detector's MiDaS
         # Added font definitions for new overlays
         self.font = cv2.FONT_HERSHEY_SIMPLEX
         self.font_size = 0.5
@@ -20,8 +23,13 @@ class VisualizationManager:
         else:
             raise ValueError("Invalid visualization mode")
 
-    def visualize(self, frame, detections, tracking_data, flow=None, potential_areas=None, low_conf_detections=None):
-        """Render the frame based on the current mode with optional overlays."""
+    def visualize(self, frame, detections, tracking_data, flow=None, potential_areas=None, low_conf_detections=None, frame_index=None,
+                  depth=None):
+        """Render the frame based on the current mode with optional overlays; depth is the frame's DepthMap, if known."""
+        with METRICS.time("visualization"):
+            return self._render(frame, detections, tracking_data, flow, potential_areas, low_conf_detections, frame_index, depth)
+
+    def _render(self, frame, detections, tracking_data, flow, potential_areas, low_conf_detections, frame_index, depth):
         if self.current_mode == 'normal':
             vis_frame = self.detector.visualize(frame, detections, tracking_data)
             # Appended overlay for potential disposal areas
@@ -38,17 +46,78 @@ class VisualizationManager:
                     cv2.putText(vis_frame, "Potential Trash", (x1, y1 - 10), self.font, self.font_size, (0, 255, 255), self.font_thickness)
             return vis_frame
         elif self.current_mode == 'depth':
-            return self.depth_visualizer.visualize_depth(frame)
+            return self.depth_visualizer.visualize_depth(frame, frame_index, depth)
         elif self.current_mode == 'optical_flow':
+            # Only the pipeline's flow is drawn; computing flow here would advance the stream's
+            # previous-frame state under the analyze stage. None (first frame) draws as no motion.
             if flow is None:
-                flow = self.detector.compute_optical_flow(frame)
+                flow = FlowField(frame.shape[:2])
             return self._visualize_optical_flow(frame, flow)
 
     def _visualize_optical_flow(self, frame, flow):
         """Render optical flow visualization."""
+        flow = flow.dense()
         hsv = np.zeros_like(frame)
         hsv[..., 1] = 255  # Saturation
         mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
         hsv[..., 0] = ang * 180 / np.pi / 2  # Hue based on direction
         hsv[..., 2] = cv2.normalize(mag, None, 0, 255, cv2.NORM_MINMAX)  # Value based on magnitude
-        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
\ No newline at end of file
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+class RenderSink:
+    def __init__(self, vis_manager, output_path=None, render_every=0, event_window=0, fps=30.0, codec="MJPG"):
+        """Off-screen renderer for headless runs: draws every Nth frame and/or the frames around events.
+
+        render_every=0 disables periodic rendering; event_window is the number of frames rendered before
+        and after each event. Rendered frames are encoded to output_path; with no output path nothing is drawn.
+        """
+        self.vis_manager = vis_manager
+        self.output_path = output_path
+        self.render_every = render_every
+        self.event_window = event_window
+        self.fps = fps
+        self.codec = codec
+        self.writer = None
+        self.pre_roll = deque(maxlen=event_window or 1)
+        self.post_roll = 0
+        self.rendered_frames = 0
+
+    def consume(self, result):
+        """Take one pipeline result and render it only if the policy asks for it."""
+        if self.output_path is None:
+            return
+        render = self.render_every > 0 and result['frame_index'] % self.render_every == 0
+        if self.event_window:
+            if result['events']:
+                # Flush the buffered lead-up so the event is shown in context
+                while self.pre_roll:
+                    self._render(self.pre_roll.popleft())
+                self.post_roll = self.event_window
+                render = True
+            elif self.post_roll > 0:
+                self.post_roll -= 1
+                render = True
+        if render:
+            self.pre_roll.clear()
+            self._render(result)
+        elif self.event_window:
+            self.pre_roll.append(result)
+
+    def _render(self, result):
+        """Draw a result and append it to the output video."""
+        detections = result['detections']
+        low_conf_detections = [det for det in detections if det['type'] == 'trash' and det['confidence'] < 0.5]
+        vis_frame = self.vis_manager.visualize(result['frame'], detections, result['tracks'], result['flow'],
+                                               result['potential_areas'], low_conf_detections, result['frame_index'],
+                                               result['depth'])
+        if self.writer is None:
+            height, width = vis_frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.codec), self.fps, (width, height))
+        self.writer.write(vis_frame)
+        self.rendered_frames += 1
+
+    def close(self):
+        """Finish the output video."""
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None